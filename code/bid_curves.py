@@ -0,0 +1,643 @@
+"""
+Bid Curve Rendering
+===================
+Renders one bid-curve PNG per (DUID, SETTLEMENTDATE, PERIODID): every offer
+version of that period drawn as a price/cumulative-quantity step line,
+coloured by rebid index (viridis).
+
+The offers are grouped once (sort, then split at period boundaries) into
+plain NumPy arrays, and the periods are rendered by a pool of worker
+processes using the non-interactive Agg backend. Each process builds one
+figure per DUID and only swaps the line data, title and legend per period.
+
+Usage:
+    from bid_curves import render_bid_curves
+
+    count = render_bid_curves(duid_df, "HPR1", "RAISEREG", output_dir)
+    count = render_bid_curves(duid_df, "HPR1", "RAISEREG", condensed_dir, bands=7,
+                              title_suffix=" (Bands 1-6)", workers=4)
+
+    # Constant axes position and image size, no tight-layout passes (fastest)
+    count = render_bid_curves(duid_df, "HPR1", "RAISEREG", output_dir, fixed_layout=True)
+
+    # One compact file per DUID/BIDTYPE/day instead of one PNG per period,
+    # viewed in the browser with index.html (bid_curve_viewer.html)
+    paths = export_curve_archive(duid_df, "HPR1", "RAISEREG", archive_dir)
+
+    # Many batches on one shared, bounded pool
+    with render_pool(workers=4) as pool:
+        for day_df in days:
+            render_bid_curves(day_df, "HPR1", "RAISEREG", output_dir, pool=pool)
+
+    # One animation per DUID (frames streamed to disk), DUIDs rendered in parallel
+    render_animations([(duid_df, "HPR1", "RAISEREG", "HPR1_RAISEREG.gif", "period")])
+
+    # Every offer of a date range as one 2-D count image (log colour scale)
+    render_density_heatmap(month_df, "HPR1", "RAISEREG", "HPR1_RAISEREG_density.png")
+
+Archive format (<DUID>_<BIDTYPE>_<YYYYMMDD>.json.gz, gzipped JSON):
+    {"duid", "bidtype", "settlementdate", "bands",
+     "columns": {"PERIODID":  [...],           one entry per offer version
+                 "OFFERDATE": [...],           epoch seconds (market time)
+                 "BANDAVAIL": [...],           rows x bands, row-major
+                 "PRICEBAND": [...]}}          rows x bands, row-major
+Rows are sorted by PERIODID then OFFERDATE; missing values are null.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.animation import AbstractMovieWriter
+
+sys.path.insert(0, str(Path(__file__).parent))
+from figure_cache import input_hash, is_current, record, save_manifest
+from rebids import auction_starts
+
+# Periods sent to a worker at a time (amortises inter-process overhead)
+CHUNK_SIZE = 16
+
+# Print progress every this many figures
+PROGRESS_EVERY = 50
+
+# Axes and colorbar positions [left, bottom, width, height] used by fixed_layout mode
+FIXED_AXES_POSITION = [0.08, 0.09, 0.74, 0.82]
+FIXED_COLORBAR_POSITION = [0.90, 0.09, 0.025, 0.82]  # colorbars keep a 20:1 aspect
+
+# This process's reusable figure (see _get_template)
+_template = None
+
+# Animation frames: one per period, or one per offer version (see animate_bid_curves)
+ANIMATION_MODES = ['period', 'offer']
+
+# Static viewer copied next to exported curve archives
+VIEWER_PATH = Path(__file__).parent / "bid_curve_viewer.html"
+
+
+def split_periods(df: pd.DataFrame, bands: int = 10) -> list:
+    """
+    Split one unit's offers into per-period arrays.
+
+    Returns a list of (settlement_date, period_id, offer_dates, quantities,
+    prices), one per (SETTLEMENTDATE, PERIODID), with each period's offers in
+    OFFERDATE order; quantities/prices are (n_offers x bands) float arrays.
+    """
+    df = df.sort_values(['SETTLEMENTDATE', 'PERIODID', 'OFFERDATE'], kind='stable')
+    starts = np.flatnonzero(auction_starts([df['SETTLEMENTDATE'], df['PERIODID']]))
+    if len(starts) == 0:
+        return []
+
+    settlement_dates = df['SETTLEMENTDATE'].to_numpy()
+    period_ids = df['PERIODID'].to_numpy()
+    offer_dates = np.split(df['OFFERDATE'].to_numpy(), starts[1:])
+    quantities = np.split(
+        df[[f'BANDAVAIL{i}' for i in range(1, bands + 1)]].to_numpy(dtype=float), starts[1:]
+    )
+    prices = np.split(
+        df[[f'PRICEBAND{i}' for i in range(1, bands + 1)]].to_numpy(dtype=float), starts[1:]
+    )
+    return [
+        (pd.Timestamp(settlement_dates[s]), int(period_ids[s]), offer_dates[i], quantities[i], prices[i])
+        for i, s in enumerate(starts)
+    ]
+
+
+def figure_path(output_dir, duid: str, fcas_type: str, settlement_date, period_id) -> str:
+    """PNG path for one period's bid curve."""
+    period_str = pd.to_datetime(settlement_date).strftime('%Y%m%d_%H%M')
+    return f'{output_dir}/{duid}_{fcas_type}_{period_str}_period{period_id}.png'
+
+
+def _build_template(key: tuple) -> dict:
+    """Create the figure, axes and colorbar that every period of one DUID reuses."""
+    import matplotlib.pyplot as plt
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.colors import Normalize
+
+    fixed_layout = key[-1]
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.set_xlabel('Cumulative Quantity (MW)')
+    ax.set_ylabel('Price ($/MWh)')
+    ax.grid(True, alpha=0.3)
+
+    # Viridis colorbar legend in the top left; its range is reset per period
+    sm = ScalarMappable(cmap=plt.cm.viridis, norm=Normalize(vmin=1, vmax=1))
+    sm.set_array([])
+    cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.02)
+    cbar.set_label('Rebid Index', fontsize=9)
+    cbar.ax.yaxis.set_label_position('left')
+    cbar.ax.yaxis.set_ticks_position('left')
+    cbar.ax.yaxis.set_label_coords(-2.5, 0.5)
+    cbar.ax.tick_params(labelsize=8)
+    # tight_layout() places the colorbar next to the axes; fixed_layout pins both
+    if fixed_layout:
+        ax.set_position(FIXED_AXES_POSITION)
+        cbar.ax.set_position(FIXED_COLORBAR_POSITION)
+
+    note = ax.text(0.02, 0.98, '', transform=ax.transAxes, fontsize=10,
+                   verticalalignment='top', visible=False)
+    return {'key': key, 'fig': fig, 'ax': ax, 'sm': sm, 'lines': [], 'note': note}
+
+
+def _get_template(key: tuple) -> dict:
+    """This process's template for key; the previous DUID's figure is closed."""
+    global _template
+    if _template is None or _template['key'] != key:
+        close_template()
+        _template = _build_template(key)
+    return _template
+
+
+def close_template() -> None:
+    """Close this process's reusable figure, if any."""
+    global _template
+    if _template is not None:
+        import matplotlib.pyplot as plt
+        plt.close(_template['fig'])
+        _template = None
+
+
+def draw_bid_curve(duid, fcas_type, settlement_date, period_id, offer_dates, quantities, prices,
+                   title_suffix='', fixed_layout=False, limits=None):
+    """
+    Draw one period's offer versions into this process's template figure
+    and return it. limits=((xmin, xmax), (ymin, ymax)) fixes the axes
+    instead of autoscaling them to the period (used for animations).
+    """
+    import matplotlib.pyplot as plt
+
+    template = _get_template((duid, fcas_type, quantities.shape[1], fixed_layout))
+    fig, ax, lines = template['fig'], template['ax'], template['lines']
+
+    num_rebids = len(offer_dates)
+
+    # Color map for different rebids
+    colors = plt.cm.viridis(np.linspace(0, 1, max(num_rebids, 1)))
+
+    # Line pool: grow when a period has more rebids than any before it
+    while len(lines) < num_rebids:
+        lines.append(ax.plot([], [], drawstyle='steps-post', linewidth=1.5, alpha=0.8)[0])
+
+    for i, line in enumerate(lines):
+        if i >= num_rebids:
+            line.set_visible(False)
+            line.set_label('_hidden')
+            continue
+        # Step function for bid curve: cumulative quantity on x-axis
+        cumulative_qty = np.concatenate([[0.0], np.cumsum(quantities[i])])
+        prices_extended = np.append(prices[i], prices[i][-1])  # Extend for step plot
+
+        offer_date = pd.Timestamp(offer_dates[i])
+        offer_time = offer_date.strftime('%H:%M') if pd.notna(offer_date) else 'Unknown'
+        line.set_data(cumulative_qty, prices_extended)
+        line.set_color(colors[i])
+        line.set_label(f'Rebid {i+1} ({offer_time})')
+        line.set_visible(True)
+
+    if limits is None:
+        ax.relim(visible_only=True)
+        ax.autoscale_view()
+    else:
+        ax.set_xlim(*limits[0])
+        ax.set_ylim(*limits[1])
+    ax.set_title(f'{duid} - {fcas_type}{title_suffix}\nPeriod: {settlement_date} Period {period_id}')
+    template['sm'].set_clim(1, num_rebids)
+
+    # Only show legend if reasonable number of rebids
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.remove()
+    template['note'].set_visible(num_rebids > 10)
+    if num_rebids <= 10:
+        ax.legend(handles=lines[:num_rebids], loc='upper left', fontsize=8)
+    else:
+        template['note'].set_text(f'{num_rebids} bids shown')
+    return fig
+
+
+def plot_bid_curve(duid, fcas_type, settlement_date, period_id, offer_dates, quantities, prices,
+                   output_dir, title_suffix='', fixed_layout=False):
+    """
+    Plot bid curves for all rebids in a given period.
+    Each rebid is a different line on the same plot.
+    X-axis: Cumulative quantity (MW)
+    Y-axis: Price ($/MWh)
+
+    The figure, axes and colorbar are built once per DUID (see _get_template);
+    each period only updates the step lines, colorbar range, title and legend.
+    fixed_layout skips tight_layout and bbox_inches='tight' (constant axes
+    position and image size), which is the fastest mode.
+    """
+    fig = draw_bid_curve(duid, fcas_type, settlement_date, period_id, offer_dates, quantities,
+                         prices, title_suffix=title_suffix, fixed_layout=fixed_layout)
+    filename = figure_path(output_dir, duid, fcas_type, settlement_date, period_id)
+    if fixed_layout:
+        fig.savefig(filename, dpi=100)
+    else:
+        fig.tight_layout()
+        fig.savefig(filename, dpi=100, bbox_inches='tight')
+
+    return filename
+
+
+def _init_worker():
+    """Pin each worker to the non-interactive Agg backend."""
+    matplotlib.use('Agg')
+
+
+def _render_period(task: tuple) -> str:
+    """Render one period (runs in a worker process)."""
+    return plot_bid_curve(*task)
+
+
+def render_pool(workers=None) -> ProcessPoolExecutor:
+    """
+    Agg worker pool that callers rendering many batches can share (pass it
+    as pool= to render_bid_curves / render_animations); shut it down after.
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker)
+
+
+def render_bid_curves(df: pd.DataFrame, duid: str, fcas_type: str, output_dir,
+                      bands: int = 10, title_suffix: str = '', workers=None,
+                      fixed_layout: bool = False, manifest=None, force: bool = False,
+                      pool=None) -> int:
+    """
+    Render one bid-curve figure per period of df (one DUID, one service).
+
+    bands:   number of bands drawn (10 = full curve, 7 = condensed)
+    workers: worker processes; None uses every core, 1 renders in-process.
+    pool:    shared render_pool() to use instead of starting one (workers is ignored)
+    fixed_layout: skip tight_layout / bbox_inches='tight' (see plot_bid_curve)
+    manifest: figure_cache manifest; periods whose offers, parameters and
+             this module's code are unchanged since they were last rendered
+             are skipped (unless force). The manifest is saved on return.
+
+    Returns the number of figures written and prints figures/sec.
+    """
+    periods = split_periods(df, bands)
+    tasks = [
+        (duid, fcas_type, settlement_date, period_id, offer_dates, quantities, prices,
+         str(output_dir), title_suffix, fixed_layout)
+        for settlement_date, period_id, offer_dates, quantities, prices in periods
+    ]
+    if manifest is not None:
+        # Key: the period's arrays + every plotting parameter + this module's source
+        code_key = input_hash(Path(__file__))
+        keys = {figure_path(output_dir, *task[:4]): input_hash(*task, code_key) for task in tasks}
+        pending = [task for task, (path, key) in zip(tasks, keys.items())
+                   if force or not is_current(manifest, path, key)]
+        if len(pending) < len(tasks):
+            print(f"  Skipping {len(tasks) - len(pending)} unchanged figures")
+        tasks = pending
+    if not tasks:
+        return 0
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    start = time.time()
+    own_pool = pool is None and workers > 1
+    if own_pool:
+        pool = render_pool(workers)
+    if pool is None:
+        results = map(_render_period, tasks)
+    else:
+        results = pool.map(_render_period, tasks, chunksize=CHUNK_SIZE)
+    try:
+        count = 0
+        for count, filename in enumerate(results, 1):
+            if manifest is not None:
+                record(manifest, filename, keys[filename])
+            if count % PROGRESS_EVERY == 0:
+                print(f"  Generated {count} figures...")
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+        elif pool is None:
+            close_template()
+        if manifest is not None:
+            save_manifest(manifest)
+
+    elapsed = max(time.time() - start, 1e-9)
+    pool_size = 'shared pool' if pool is not None and not own_pool else f'{workers} worker(s)'
+    print(f"  Rendered {count} figures in {elapsed:.1f}s "
+          f"({count / elapsed:.1f} figures/sec, {pool_size})")
+    return count
+
+
+class StreamingGifWriter(AbstractMovieWriter):
+    """
+    GIF movie writer that encodes and writes each frame as it is grabbed.
+
+    matplotlib's PillowWriter keeps every frame until finish(); this one
+    holds a single frame, so memory does not grow with the animation length.
+    Each frame is quantised to its own 256-colour local palette.
+    """
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi=dpi)
+        self._file = open(outfile, 'wb')
+        self._frame_count = 0
+
+    def grab_frame(self, **savefig_kwargs):
+        from PIL import GifImagePlugin, Image
+
+        buffer = BytesIO()
+        self.fig.savefig(buffer, format='rgba', dpi=self.dpi, **savefig_kwargs)
+        frame = Image.frombuffer('RGBA', self.frame_size, buffer.getbuffer(), 'raw', 'RGBA', 0, 1)
+        frame = frame.convert('RGB').quantize(256)
+        duration = 1000 / self.fps
+        if self._frame_count == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'duration': duration})
+            self._file.writelines(header)
+        self._file.writelines(GifImagePlugin.getdata(frame, duration=duration, include_color_table=True))
+        self._frame_count += 1
+
+    def finish(self):
+        self._file.write(b';')  # GIF trailer
+        self._file.close()
+
+
+def _movie_writer(output_path, fps: int) -> AbstractMovieWriter:
+    """Streaming writer for output_path's format (.gif, or .mp4 through ffmpeg)."""
+    suffix = Path(output_path).suffix.lower()
+    if suffix == '.gif':
+        return StreamingGifWriter(fps=fps)
+    if suffix == '.mp4':
+        from matplotlib.animation import FFMpegWriter
+        if not FFMpegWriter.isAvailable():
+            raise RuntimeError("MP4 output needs ffmpeg on the PATH; write a .gif instead")
+        return FFMpegWriter(fps=fps)
+    raise ValueError(f"Unsupported animation format {suffix!r}; expected .gif or .mp4")
+
+
+def _animation_frames(periods: list, by: str):
+    """draw_bid_curve arguments per frame: each period, or each offer version in turn."""
+    for settlement_date, period_id, offer_dates, quantities, prices in periods:
+        if by == 'period':
+            yield settlement_date, period_id, offer_dates, quantities, prices
+            continue
+        for n in range(1, len(offer_dates) + 1):
+            yield settlement_date, period_id, offer_dates[:n], quantities[:n], prices[:n]
+
+
+def animate_bid_curves(df: pd.DataFrame, duid: str, fcas_type: str, output_path,
+                       by: str = 'period', bands: int = 10, fps: int = 4,
+                       title_suffix: str = '') -> int:
+    """
+    Write df's bid curves (one DUID, one service) as a single animation.
+
+    by='period': one frame per period, as the per-period PNGs.
+    by='offer':  one frame per offer version, adding each rebid to its
+                 period's curves in OFFERDATE order.
+
+    Frames use the fixed layout and common axis limits, and are streamed to
+    the writer (.gif, or .mp4 with ffmpeg) as they are drawn.
+    Returns the number of frames.
+    """
+    if by not in ANIMATION_MODES:
+        raise ValueError(f"Unknown animation mode {by!r}; expected one of {ANIMATION_MODES}")
+    periods = split_periods(df, bands)
+    if not periods:
+        return 0
+    quantities = np.concatenate([period[3] for period in periods])
+    prices = np.concatenate([period[4] for period in periods])
+    price_low, price_high = np.nanmin(prices), np.nanmax(prices)
+    price_pad = max(price_high - price_low, 1.0) * 0.05
+    limits = ((0.0, max(np.nanmax(np.nansum(quantities, axis=1)), 1.0) * 1.05),
+              (price_low - price_pad, price_high + price_pad))
+
+    writer = _movie_writer(output_path, fps)
+    count = 0
+    try:
+        for count, frame in enumerate(_animation_frames(periods, by), 1):
+            fig = draw_bid_curve(duid, fcas_type, *frame, title_suffix=title_suffix,
+                                 fixed_layout=True, limits=limits)
+            if count == 1:
+                writer.setup(fig, output_path, dpi=100)
+            writer.grab_frame()
+    finally:
+        if count:
+            writer.finish()
+    return count
+
+
+def _animate(task: tuple) -> int:
+    """Render one animation (runs in a worker process)."""
+    return animate_bid_curves(*task)
+
+
+def render_animations(tasks: list, workers=None, manifest=None, force: bool = False,
+                      pool=None) -> int:
+    """
+    Render several animations in parallel, one worker process per animation.
+
+    tasks: tuples of animate_bid_curves arguments (df, duid, fcas_type,
+           output_path[, by, bands, fps, title_suffix]), typically one per DUID.
+    manifest/force/pool work as for render_bid_curves.
+    Returns the number of animations written.
+    """
+    if manifest is not None:
+        code_key = input_hash(Path(__file__))
+        keys = {str(task[3]): input_hash(*(str(v) if isinstance(v, Path) else v for v in task), code_key)
+                for task in tasks}
+        pending = [task for task in tasks if force or not is_current(manifest, task[3], keys[str(task[3])])]
+        if len(pending) < len(tasks):
+            print(f"  Skipping {len(tasks) - len(pending)} unchanged animations")
+        tasks = pending
+    if not tasks:
+        return 0
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    start = time.time()
+    own_pool = pool is None and workers > 1
+    if own_pool:
+        pool = render_pool(workers)
+    results = map(_animate, tasks) if pool is None else pool.map(_animate, tasks)
+    try:
+        for task, frames in zip(tasks, results):
+            print(f"  {task[3]}: {frames} frames")
+            if manifest is not None:
+                record(manifest, task[3], keys[str(task[3])])
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+        elif pool is None:
+            close_template()
+        if manifest is not None:
+            save_manifest(manifest)
+    pool_size = 'shared pool' if pool is not None and not own_pool else f'{workers} worker(s)'
+    print(f"  Rendered {len(tasks)} animation(s) in {time.time() - start:.1f}s ({pool_size})")
+    return len(tasks)
+
+
+def _json_values(values: np.ndarray, decimals: int) -> list:
+    """Rounded floats for JSON, with NaN as null."""
+    values = np.round(values.astype(float), decimals).ravel()
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def export_curve_archive(df: pd.DataFrame, duid: str, fcas_type: str, output_dir,
+                         bands: int = 10) -> list:
+    """
+    Write one columnar curve file per market day of df (one DUID, one service)
+    and copy the viewer into output_dir as index.html.
+
+    Returns the paths written.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    df = df.sort_values(['SETTLEMENTDATE', 'PERIODID', 'OFFERDATE'], kind='stable')
+    quantity_columns = [f'BANDAVAIL{i}' for i in range(1, bands + 1)]
+    price_columns = [f'PRICEBAND{i}' for i in range(1, bands + 1)]
+
+    paths = []
+    for settlement_date, day in df.groupby('SETTLEMENTDATE', sort=True):
+        offer_seconds = day['OFFERDATE'].to_numpy().astype('datetime64[s]').astype(np.int64)
+        archive = {
+            'duid': duid,
+            'bidtype': fcas_type,
+            'settlementdate': pd.Timestamp(settlement_date).strftime('%Y-%m-%d'),
+            'bands': bands,
+            'columns': {
+                'PERIODID': day['PERIODID'].astype(int).tolist(),
+                'OFFERDATE': offer_seconds.tolist(),
+                'BANDAVAIL': _json_values(day[quantity_columns].to_numpy(), 3),
+                'PRICEBAND': _json_values(day[price_columns].to_numpy(), 2),
+            },
+        }
+        path = output_dir / f"{duid}_{fcas_type}_{pd.Timestamp(settlement_date):%Y%m%d}.json.gz"
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(archive, f, separators=(',', ':'))
+        paths.append(path)
+
+    shutil.copyfile(VIEWER_PATH, output_dir / 'index.html')
+    return paths
+
+
+def _bin_index(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Bin of each value for bins [edges[i], edges[i+1]), clipped to the grid."""
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def curve_density(quantities: np.ndarray, prices: np.ndarray, mw_edges: np.ndarray,
+                  price_edges: np.ndarray) -> np.ndarray:
+    """
+    Rasterise step curves into a (price bins x MW bins) count grid.
+
+    quantities/prices are (n_curves x bands). Each band's step covers the MW
+    cells [start, end) of its cumulative quantity, and the riser into the
+    next band covers the rows [this price, next price) at the column where
+    that band starts, which is the band's end cell. A band without a priced
+    next band (the last one, or one followed by a missing price) covers its
+    end cell itself. A band narrower than one MW cell is thus still counted
+    in the cell holding it, and a curve whose prices rise with quantity adds
+    exactly one count to every cell it passes through. Bands with a missing
+    price are skipped.
+
+    Segments are written as +1/-1 into difference grids with np.bincount and
+    summed with cumsum, so the cost is O(n_curves x bands + grid size).
+    """
+    n_price, n_mw = len(price_edges) - 1, len(mw_edges) - 1
+    quantities = np.nan_to_num(quantities.astype(float), nan=0.0)
+    prices = prices.astype(float)
+    cumulative = np.cumsum(quantities, axis=1)
+    start_col = _bin_index(mw_edges, np.hstack([np.zeros((len(cumulative), 1)), cumulative[:, :-1]]))
+    end_col = _bin_index(mw_edges, cumulative)
+    # Bands with no priced next band have no riser (or next step) to cover their end cell
+    end_col[:, :-1] += ~np.isfinite(prices[:, 1:])
+    end_col[:, -1] += 1
+    row = _bin_index(price_edges, np.nan_to_num(prices))
+
+    # Steps: +1 at (row, start), -1 at (row, end); cumsum along MW
+    step = np.isfinite(prices) & (end_col > start_col)
+    width = n_mw + 1
+    flat = np.concatenate([row[step] * width + start_col[step], row[step] * width + end_col[step]])
+    weights = np.repeat([1.0, -1.0], step.sum())
+    counts = np.cumsum(np.bincount(flat, weights, minlength=n_price * width)
+                       .reshape(n_price, width), axis=1)[:, :n_mw]
+
+    # Risers: rows [row[b], row[b+1]) going up, (row[b+1], row[b]] going down,
+    # in the column where band b+1 starts; cumsum along price
+    riser = np.isfinite(prices[:, :-1]) & np.isfinite(prices[:, 1:])
+    column = start_col[:, 1:][riser]
+    from_row, to_row = row[:, :-1][riser], row[:, 1:][riser]
+    up, down = to_row > from_row, to_row < from_row
+    lo = np.concatenate([from_row[up], to_row[down] + 1])
+    hi = np.concatenate([to_row[up], from_row[down] + 1])
+    column = np.concatenate([column[up], column[down]])
+    flat = np.concatenate([lo * n_mw + column, hi * n_mw + column])
+    weights = np.repeat([1.0, -1.0], len(lo))
+    counts += np.cumsum(np.bincount(flat, weights, minlength=(n_price + 1) * n_mw)
+                        .reshape(n_price + 1, n_mw), axis=0)[:n_price]
+    return counts
+
+
+def price_bin_edges(low: float, high: float, bins: int) -> np.ndarray:
+    """
+    Price bin edges spaced evenly in asinh(price): fine near $0/MWh, coarse
+    towards the market price cap, and valid for negative prices.
+    """
+    return np.sinh(np.linspace(np.arcsinh(low), np.arcsinh(high), bins + 1))
+
+
+def render_density_heatmap(df: pd.DataFrame, duid: str, fcas_type: str, output_path,
+                           bands: int = 10, mw_bins: int = 400, price_bins: int = 300,
+                           title_suffix: str = '', manifest=None, force: bool = False) -> bool:
+    """
+    Draw every offer curve in df (one DUID, one service, any date range) as
+    a single density image: cumulative MW vs price, log-scaled curve counts.
+
+    The price axis is symlog (see price_bin_edges). manifest/force work as
+    for render_bid_curves. Returns True if the image was written.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    if len(df) == 0:
+        return False
+    quantities = df[[f'BANDAVAIL{i}' for i in range(1, bands + 1)]].to_numpy(dtype=float)
+    prices = df[[f'PRICEBAND{i}' for i in range(1, bands + 1)]].to_numpy(dtype=float)
+    first, last = pd.Timestamp(df['SETTLEMENTDATE'].min()), pd.Timestamp(df['SETTLEMENTDATE'].max())
+    key = input_hash(quantities, prices, Path(__file__), duid=duid, fcas_type=fcas_type,
+                     first=first, last=last, mw_bins=mw_bins, price_bins=price_bins,
+                     title_suffix=title_suffix)
+    if manifest is not None and not force and is_current(manifest, output_path, key):
+        print(f"  Skipping unchanged density image {output_path}")
+        return False
+    start = time.time()
+
+    max_mw = max(float(np.nanmax(np.nansum(quantities, axis=1))), 1.0)
+    mw_edges = np.linspace(0.0, max_mw * 1.02, mw_bins + 1)
+    finite_prices = prices[np.isfinite(prices)]
+    price_edges = price_bin_edges(min(float(finite_prices.min()), 0.0),
+                                  float(finite_prices.max()) * 1.02 + 1.0, price_bins)
+    counts = curve_density(quantities, prices, mw_edges, price_edges)
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    mesh = ax.pcolormesh(mw_edges, price_edges, np.ma.masked_equal(counts, 0),
+                         norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), cmap='viridis')
+    ax.set_yscale('symlog', linthresh=1)
+    ax.set_ylim(price_edges[0], price_edges[-1])
+    fig.colorbar(mesh, ax=ax, pad=0.02).set_label('Offer curves per cell')
+    ax.set_xlabel('Cumulative Quantity (MW)')
+    ax.set_ylabel('Price ($/MWh)')
+    ax.set_title(f'{duid} - {fcas_type}{title_suffix}\n'
+                 f'{len(df):,} offer curves, {first:%Y-%m-%d} to {last:%Y-%m-%d}')
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=150)
+    plt.close(fig)
+
+    if manifest is not None:
+        record(manifest, output_path, key)
+        save_manifest(manifest)
+    print(f"  Rendered {len(df):,} curves into one density image in {time.time() - start:.2f}s")
+    return True
@@ -0,0 +1,144 @@
+"""
+Bidder Classification
+=====================
+Classifies DUIDs into bidder categories with a rules table applied once to
+the DUID participant map, instead of a Python function called per bid row.
+
+Rules are matched top to bottom on (DISPATCHTYPE, TESLA_AUTOBIDDER); None
+matches anything. DUID_OVERRIDES then replaces the result for individual
+units; an override of None excludes the unit from analysis.
+
+DUIDs missing from the participant map are classified as DEFAULT_CATEGORY.
+
+Usage:
+    from bidders import add_bidder_category, register_bidder_categories
+
+    # pandas: one lookup per DUID, result is a categorical column
+    df = add_bidder_category(df)                 # drops excluded DUIDs
+
+    # DuckDB: join against the bidder_category table instead
+    register_bidder_categories(con)
+    con.execute("SELECT b.BIDDER_CATEGORY, count(*) FROM bids JOIN bidder_category b USING (DUID) ...")
+
+    python code/bidders.py                       # print the classification
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import DUID_MAP_PATH
+
+# Category order used in tables and plots
+BIDDER_CATEGORIES = ['Autobidder Battery', 'Non-Autobidder Battery', 'Non-Battery']
+BATTERY_CATEGORIES = ['Autobidder Battery', 'Non-Autobidder Battery']
+
+# (DISPATCHTYPE, TESLA_AUTOBIDDER, BIDDER_CATEGORY); first match wins
+CATEGORY_RULES = [
+    ('BIDIRECTIONAL', True, 'Autobidder Battery'),
+    ('BIDIRECTIONAL', None, 'Non-Autobidder Battery'),
+    (None, None, 'Non-Battery'),
+]
+
+# Per-DUID overrides; None excludes the unit
+DUID_OVERRIDES = {
+    'VSSEL1V1': None,  # VPP bidder: aggregated small batteries, not comparable to battery farms
+}
+
+DEFAULT_CATEGORY = 'Non-Battery'
+
+# TESLA_AUTOBIDDER values read as an autobidder; anything else (False,
+# 'False', blank) is not
+AUTOBIDDER_VALUES = [True, 'True', 'TRUE', 'true']
+
+
+def classify_duids(participant_map: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Apply CATEGORY_RULES and DUID_OVERRIDES to the participant map.
+
+    Returns one row per DUID with BIDDER_CATEGORY (categorical, NaN for
+    excluded units) and EXCLUDED. A DUID listed more than once in the map
+    is classified from its first row.
+    """
+    if participant_map is None:
+        participant_map = pd.read_csv(DUID_MAP_PATH)
+    participant_map = participant_map.drop_duplicates('DUID')
+    dispatch_type = participant_map['DISPATCHTYPE'].to_numpy()
+    # Parsed explicitly: astype(bool) would read the string 'False' as True
+    autobidder = participant_map['TESLA_AUTOBIDDER'].isin(AUTOBIDDER_VALUES).to_numpy()
+
+    conditions = []
+    for rule_dispatch_type, rule_autobidder, _ in CATEGORY_RULES:
+        matches = np.ones(len(participant_map), dtype=bool)
+        if rule_dispatch_type is not None:
+            matches &= dispatch_type == rule_dispatch_type
+        if rule_autobidder is not None:
+            matches &= autobidder == rule_autobidder
+        conditions.append(matches)
+    categories = np.select(conditions, [category for _, _, category in CATEGORY_RULES],
+                           default=DEFAULT_CATEGORY).astype(object)
+
+    duids = participant_map['DUID'].to_numpy()
+    for duid, category in DUID_OVERRIDES.items():
+        categories[duids == duid] = category
+
+    return pd.DataFrame({
+        'DUID': duids,
+        'BIDDER_CATEGORY': pd.Categorical(categories, categories=BIDDER_CATEGORIES),
+        'EXCLUDED': pd.isna(categories),
+    })
+
+
+def bidder_categories(participant_map: pd.DataFrame = None) -> pd.Series:
+    """Series DUID -> BIDDER_CATEGORY (categorical) for every non-excluded DUID."""
+    classified = classify_duids(participant_map)
+    return classified.loc[~classified['EXCLUDED']].set_index('DUID')['BIDDER_CATEGORY']
+
+
+def excluded_duids() -> list:
+    """DUIDs excluded by DUID_OVERRIDES."""
+    return sorted(duid for duid, category in DUID_OVERRIDES.items() if category is None)
+
+
+def add_bidder_category(df: pd.DataFrame, duid_column: str = 'DUID',
+                        participant_map: pd.DataFrame = None,
+                        drop_excluded: bool = True) -> pd.DataFrame:
+    """
+    Add a categorical BIDDER_CATEGORY column to df.
+
+    The rules are evaluated once per distinct DUID and taken onto the rows
+    by category code, so the cost is O(#DUIDs) plus one integer gather (no
+    per-row Python objects; a categorical DUID column is not re-factorised).
+    """
+    if drop_excluded:
+        df = df[~df[duid_column].isin(excluded_duids())]
+    duids = pd.Categorical(df[duid_column])
+    per_duid = (bidder_categories(participant_map).reindex(duids.categories)
+                .astype(object).fillna(DEFAULT_CATEGORY))
+    # One code per DUID category plus DEFAULT_CATEGORY last, which the
+    # code -1 of a missing DUID picks up
+    category_codes = np.append(
+        pd.Categorical(per_duid, categories=BIDDER_CATEGORIES).codes,
+        BIDDER_CATEGORIES.index(DEFAULT_CATEGORY),
+    )
+    return df.assign(BIDDER_CATEGORY=pd.Categorical.from_codes(
+        category_codes[duids.codes], categories=BIDDER_CATEGORIES
+    ))
+
+
+def register_bidder_categories(con, name: str = 'bidder_category',
+                               participant_map: pd.DataFrame = None) -> None:
+    """Register the per-DUID classification as a DuckDB table (DUID, BIDDER_CATEGORY, EXCLUDED)."""
+    classified = classify_duids(participant_map)
+    classified['BIDDER_CATEGORY'] = classified['BIDDER_CATEGORY'].astype(object)
+    con.register(name, classified)
+
+
+if __name__ == "__main__":
+    classified = classify_duids()
+    print(classified.to_string(index=False))
+    print()
+    print(classified['BIDDER_CATEGORY'].value_counts(dropna=False).to_string())
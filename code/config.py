@@ -4,11 +4,13 @@ Path Configuration for NEM Auto Project
 Centralizes all file paths for portability across different machines.
 
 Usage:
-    from config import DATA_DIR, OUTPUT_DIR, FIGURES_DIR, DUID_MAP_PATH, get_data_file
+    from config import DATA_DIR, OUTPUT_DIR, FIGURES_DIR, CACHE_DIR, DUID_MAP_PATH, get_data_file
 
 Environment Variables:
     NEM_DATA_PATH: Path to the external data folder (e.g., Box sync folder)
                    If not set, defaults to local data/samples directory
+    NEM_CACHE_PATH: Path to the Parquet cache folder (see nem_cache.py)
+                    If not set, defaults to local data/cache directory
 """
 
 import os
@@ -46,6 +48,17 @@ FIGURES_DIR = PROJECT_ROOT / "figures"
 OUTPUT_DIR.mkdir(exist_ok=True)
 FIGURES_DIR.mkdir(exist_ok=True)
 
+# Persistent DuckDB database with pre-joined analysis tables (see nem_db.py)
+ANALYTICS_DB_PATH = OUTPUT_DIR / "nem_analytics.duckdb"
+
+# =============================================================================
+# PARQUET CACHE DIRECTORY
+# =============================================================================
+# Typed Parquet copies of the raw AEMO CSVs (built by nem_cache.py).
+# Kept out of the Box folder by default so the cache isn't synced; override
+# with NEM_CACHE_PATH to put it on a faster/larger local disk.
+CACHE_DIR = Path(os.environ.get("NEM_CACHE_PATH", PROJECT_ROOT / "data" / "cache"))
+
 # =============================================================================
 # DATA FILES
 # =============================================================================
@@ -54,7 +67,8 @@ DUID_MAP_FILENAME = "nem_duid_participant_map_2025-10-15.csv"
 # Note: DUID map is in parent of DATA_DIR (nem_auto folder, not samples subfolder)
 DUID_MAP_PATH = DATA_DIR.parent / DUID_MAP_FILENAME
 
-# Large data files (in external Box folder)
+# Large data files (in external Box folder). These are the FILE01 parts only;
+# the Parquet cache picks up every part/month via nem_catalog.find_table_files().
 BIDDAYOFFER_FILENAME = "PUBLIC_ARCHIVE#BIDDAYOFFER#FILE01#202510010000.csv"
 BIDOFFERPERIOD_FILENAME = "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE01#202510010000.CSV"
 DISPATCHOFFERTRK_FILENAME = "PUBLIC_ARCHIVE#DISPATCHOFFERTRK#FILE01#202510010000.CSV"
@@ -104,6 +118,8 @@ if __name__ == "__main__":
     print(f"DATA_DIR: {DATA_DIR}")
     print(f"OUTPUT_DIR: {OUTPUT_DIR}")
     print(f"FIGURES_DIR: {FIGURES_DIR}")
+    print(f"CACHE_DIR: {CACHE_DIR}")
+    print(f"ANALYTICS_DB_PATH: {ANALYTICS_DB_PATH}")
     print(f"DUID_MAP_PATH: {DUID_MAP_PATH}")
     print()
     validate_data_paths()
@@ -0,0 +1,273 @@
+"""
+Counterfactual FCAS Clearing
+============================
+What-if runs of the FCAS clearing simulator (fcas_clearing.py): re-clear a
+period with a chosen set of DUIDs taken out of the supply stacks, or with
+their rebids undone so that every interval is offered at the day's DAILY
+bid instead of the version dispatch applied.
+
+How it works:
+    1. The baseline is cleared once per service from the cached stacks
+       (supply_stack.load_supply_stacks).
+    2. A scenario only touches the services its DUIDs offered and the
+       regions they sit in: supply_stack.restack() re-sorts those regions'
+       slices and carries every other region over unchanged, and only the
+       affected region-services are cleared again. All other results are
+       the baseline's by construction.
+    3. (scenario, service) tasks run in a process pool. Each worker keeps a
+       read-only connection to the analytics database and loads a service's
+       cached stacks the first time one of its tasks needs them.
+
+Scenario modes:
+    remove   the DUIDs' steps are taken out of the stacks
+    daily    each applied offer of the DUIDs is replaced by the same
+             period of the market day's DAILY bid (its latest ENTRYTYPE =
+             'DAILY' version); intervals without a DAILY bid keep the
+             applied offer
+
+Usage:
+    from counterfactual import make_scenarios, run_scenarios
+
+    scenarios = make_scenarios(["HPR1", "HBESS1"], label="Autobidder Battery", each=True)
+    summary = run_scenarios(scenarios, ["RAISEREG", "LOWERREG"], start="2025-10-01", end="2025-10-31")
+
+    python code/counterfactual.py --category "Autobidder Battery" --each --start 2025-10-01 --end 2025-10-31
+    python code/counterfactual.py --duids HPR1 HBESS1 --modes remove --bidtypes RAISEREG LOWERREG
+
+Summary columns (one row per scenario x affected service x region):
+    SCENARIO, MODE, BIDTYPE, REGIONID,
+    intervals                         intervals the baseline cleared
+    short                             of those, intervals the scenario can no
+                                      longer cover (STATUS short or no offers)
+    and over the remaining intervals, which both sides priced:
+    baseline_price / scenario_price   mean cleared price ($/MWh)
+    price_change                      mean scenario - baseline price
+    changed                           share of intervals whose price changed
+    baseline_cost / scenario_cost     sum of price x requirement / 12 ($)
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from bidders import BIDDER_CATEGORIES, bidder_categories
+from config import ANALYTICS_DB_PATH, OUTPUT_DIR
+from fcas_clearing import clear_stacks, load_requirements
+from nem_db import BAND_RANGE, connect
+from nem_reader import FCAS_BIDTYPES, where_sql
+from supply_stack import load_supply_stacks, restack, unit_regions
+
+SCENARIO_MODES = ["remove", "daily"]
+
+COUNTERFACTUAL_OUTPUT_DIR = OUTPUT_DIR / "counterfactual"
+
+# Dispatch intervals per hour, to turn $/MWh x MW into $ per interval
+INTERVALS_PER_HOUR = 12
+
+OFFER_COLUMNS = ["MAXAVAIL"] + [f"BANDAVAIL{i}" for i in BAND_RANGE] + [f"PRICEBAND{i}" for i in BAND_RANGE]
+
+
+# =============================================================================
+# SCENARIOS
+# =============================================================================
+
+def make_scenarios(duids, label: str = None, modes=SCENARIO_MODES, each: bool = False) -> list:
+    """
+    Scenario dicts (name, mode, duids): the whole DUID set per mode and, with
+    each=True, every DUID on its own as well.
+    """
+    duids = sorted(duids)
+    label = label or "+".join(duids)
+    sets = [(label, duids)] + ([(duid, [duid]) for duid in duids] if each and len(duids) > 1 else [])
+    return [{"name": f"{mode}:{name}", "mode": mode, "duids": members}
+            for mode in modes for name, members in sets]
+
+
+def daily_offers_query(bidtype: str, duids, start=None, end=None) -> str:
+    """
+    The DUIDs' applied offers for one service with the bands swapped for
+    the same period of the day's DAILY bid (columns as for
+    supply_stack.build_supply_stacks, plus HAS_DAILY).
+    """
+    where = {"BIDTYPE": bidtype, "DUID": list(duids)}
+    days = {"BIDSETTLEMENTDATE": (start, end)} if start is not None or end is not None else {}
+    version_days = {"SETTLEMENTDATE": (start, end)} if days else {}
+    return f"""
+    WITH applied AS (
+        SELECT SETTLEMENTDATE, DUID, DIRECTION, BIDSETTLEMENTDATE, PERIODID, {', '.join(OFFER_COLUMNS)}
+        FROM applied_offer
+        {where_sql({**where, **days})}
+    ),
+    daily AS (
+        SELECT DUID, SETTLEMENTDATE, DIRECTION, PERIODID, {', '.join(OFFER_COLUMNS)}
+        FROM offer_version_period
+        {where_sql({**where, **version_days, "ENTRYTYPE": "DAILY"})}
+        QUALIFY row_number() OVER (
+            PARTITION BY DUID, SETTLEMENTDATE, DIRECTION, PERIODID ORDER BY OFFERDATE DESC
+        ) = 1
+    )
+    SELECT a.SETTLEMENTDATE, a.DUID, d.DUID IS NOT NULL AS HAS_DAILY,
+           {', '.join(f'CASE WHEN d.DUID IS NULL THEN a.{c} ELSE d.{c} END AS {c}' for c in OFFER_COLUMNS)}
+    FROM applied a
+    LEFT JOIN daily d
+        ON a.DUID = d.DUID
+        AND a.BIDSETTLEMENTDATE = d.SETTLEMENTDATE
+        AND a.DIRECTION = d.DIRECTION
+        AND a.PERIODID = d.PERIODID
+    """
+
+
+def scenario_stacks(stacks: dict, scenario: dict, con, start=None, end=None, regions=None) -> tuple:
+    """Restacked stacks for one scenario and the regions it touched (see supply_stack.restack)."""
+    replacement = None
+    if scenario["mode"] == "daily":
+        replacement = con.execute(daily_offers_query(str(stacks["bidtype"]), scenario["duids"], start, end)).fetchdf()
+    elif scenario["mode"] != "remove":
+        raise ValueError(f"Unknown scenario mode {scenario['mode']!r}; expected one of {SCENARIO_MODES}")
+    return restack(stacks, scenario["duids"], replacement, regions)
+
+
+# =============================================================================
+# PARALLEL RUNS
+# =============================================================================
+
+_worker = {}
+
+
+def _init_worker(requirements: pd.DataFrame, start, end) -> None:
+    """Per-process state: requirements, region map, read-only database connection, stack cache."""
+    _worker.update(
+        requirements=requirements,
+        start=start,
+        end=end,
+        regions=unit_regions(),
+        con=duckdb.connect(str(ANALYTICS_DB_PATH), read_only=True),
+        stacks={},
+    )
+
+
+def _run_task(scenario: dict, bidtype: str) -> pd.DataFrame:
+    """Re-clear the region-services one scenario touches in one service (runs in a worker)."""
+    if bidtype not in _worker["stacks"]:
+        _worker["stacks"][bidtype] = load_supply_stacks(bidtype, _worker["start"], _worker["end"],
+                                                        con=_worker["con"])
+    stacks, affected = scenario_stacks(_worker["stacks"][bidtype], scenario, _worker["con"],
+                                       _worker["start"], _worker["end"], _worker["regions"])
+    requirements = _worker["requirements"]
+    requirements = requirements[(requirements["BIDTYPE"] == bidtype) & requirements["REGIONID"].isin(affected)]
+    return clear_stacks(stacks, requirements).assign(SCENARIO=scenario["name"], MODE=scenario["mode"])
+
+
+def summarize_scenario(baseline: pd.DataFrame, cleared: pd.DataFrame) -> pd.DataFrame:
+    """Scenario vs baseline per service and region (see module docstring)."""
+    keys = ["SETTLEMENTDATE", "REGIONID", "BIDTYPE"]
+    both = baseline[keys + ["REQUIREMENT_MW", "CLEARED_PRICE"]].merge(
+        cleared[keys + ["SCENARIO", "MODE", "CLEARED_PRICE", "STATUS"]],
+        on=keys, suffixes=("_BASE", "_SCENARIO"))
+    both = both[both["CLEARED_PRICE_BASE"].notna()]
+    both["SHORT"] = both["STATUS"] != "cleared"
+
+    # Prices, changes and costs are compared over the intervals both sides
+    # priced; intervals the scenario cannot cover only count towards short
+    priced = ~both["SHORT"]
+    both["PRICE_BASE"] = both["CLEARED_PRICE_BASE"].where(priced)
+    both["PRICE_SCENARIO"] = both["CLEARED_PRICE_SCENARIO"].where(priced)
+    both["CHANGED"] = both["PRICE_SCENARIO"].ne(both["PRICE_BASE"]).astype(float).where(priced)
+    both["PRICE_CHANGE"] = both["PRICE_SCENARIO"] - both["PRICE_BASE"]
+    energy = both["REQUIREMENT_MW"] / INTERVALS_PER_HOUR
+    both["COST_BASE"] = both["PRICE_BASE"] * energy
+    both["COST_SCENARIO"] = both["PRICE_SCENARIO"] * energy
+    return both.groupby(["SCENARIO", "MODE", "BIDTYPE", "REGIONID"]).agg(
+        intervals=("SHORT", "size"),
+        short=("SHORT", "sum"),
+        baseline_price=("PRICE_BASE", "mean"),
+        scenario_price=("PRICE_SCENARIO", "mean"),
+        price_change=("PRICE_CHANGE", "mean"),
+        changed=("CHANGED", "mean"),
+        baseline_cost=("COST_BASE", "sum"),
+        scenario_cost=("COST_SCENARIO", "sum"),
+    ).reset_index()
+
+
+def run_scenarios(scenarios: list, bidtypes=None, start=None, end=None, workers=None) -> pd.DataFrame:
+    """
+    Clear the baseline, then every scenario in a process pool; returns the
+    summary (one row per scenario x affected service x region).
+    """
+    bidtypes = list(bidtypes or FCAS_BIDTYPES)
+    regions = unit_regions()
+    requirements = load_requirements(bidtypes, start, end)
+
+    # Baseline, and which DUIDs each service's stacks hold. Builds (and
+    # caches) any missing stacks before the workers start reading them.
+    con = connect(tables=["applied_offer"])
+    baseline, offered = [], {}
+    for bidtype in bidtypes:
+        stacks = load_supply_stacks(bidtype, start, end, con=con)
+        baseline.append(clear_stacks(stacks, requirements[requirements["BIDTYPE"] == bidtype]))
+        offered[bidtype] = set(stacks["duids"]) & set(regions.index)
+    con.close()
+    baseline = pd.concat(baseline, ignore_index=True)
+
+    tasks = [(scenario, bidtype) for scenario in scenarios for bidtype in bidtypes
+             if offered[bidtype] & set(scenario["duids"])]
+    print(f"Running {len(scenarios)} scenario(s) as {len(tasks)} scenario-service task(s)...")
+    begin = time.time()
+    cleared = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(requirements, start, end)) as pool:
+        futures = [pool.submit(_run_task, scenario, bidtype) for scenario, bidtype in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            cleared.append(future.result())
+            if done % 10 == 0 or done == len(futures):
+                print(f"  [{done}/{len(futures)}] {time.time() - begin:.1f}s")
+    if not cleared:
+        print("  none of the scenarios' DUIDs offered these services")
+        return pd.DataFrame()
+    return summarize_scenario(baseline, pd.concat(cleared, ignore_index=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-clear FCAS with DUIDs removed or held to their DAILY bid.")
+    chosen = parser.add_mutually_exclusive_group()
+    chosen.add_argument("--duids", nargs="+", help="DUIDs to change")
+    chosen.add_argument("--category", choices=BIDDER_CATEGORIES, default="Autobidder Battery",
+                        help="bidder category from bidders.py (default: Autobidder Battery)")
+    parser.add_argument("--each", action="store_true", help="also run every DUID of the set on its own")
+    parser.add_argument("--modes", nargs="+", choices=SCENARIO_MODES, default=SCENARIO_MODES,
+                        help="scenario modes (default: both)")
+    parser.add_argument("--bidtypes", nargs="+", choices=FCAS_BIDTYPES, default=FCAS_BIDTYPES,
+                        help="FCAS services (default: all)")
+    parser.add_argument("--start", help="first market day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last market day (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    if args.duids:
+        duids, label = args.duids, None
+    else:
+        categories = bidder_categories()
+        duids, label = list(categories.index[categories == args.category]), args.category
+        if not duids:
+            parser.error(f"no DUIDs in category {args.category!r}")
+    scenarios = make_scenarios(duids, label, args.modes, args.each)
+
+    summary = run_scenarios(scenarios, args.bidtypes, args.start, args.end, args.workers)
+    if summary.empty:
+        return
+    print(summary.to_string(index=False, float_format="%.2f"))
+
+    COUNTERFACTUAL_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    path = COUNTERFACTUAL_OUTPUT_DIR / f"scenarios_{args.start or 'first'}_{args.end or 'last'}.csv"
+    summary.to_csv(path, index=False)
+    print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,9 @@ Output:
     - output/daily_price_band_stats.csv
         Detailed statistics table for each price band by group
 
+    Reruns skip figures whose input data and plotting code are unchanged
+    (see figure_cache.py); pass --force to re-render them anyway.
+
 Hypothesis:
     Autobidder batteries may set more varied initial price bands since they rely
     more heavily on quantity rebids (shifting MW between bands) rather than price
@@ -49,6 +52,7 @@ Key Finding:
     individual unit is more consistent.
 """
 
+import argparse
 import duckdb
 import pandas as pd
 import numpy as np
@@ -58,7 +62,9 @@ from pathlib import Path
 
 # Add parent directory to path for config import
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import DATA_DIR, OUTPUT_DIR, FIGURES_DIR, DUID_MAP_PATH, BIDDAYOFFER_PATH
+from config import DATA_DIR, OUTPUT_DIR, FIGURES_DIR, DUID_MAP_PATH
+from figure_cache import input_hash, is_current, load_manifest, save_figure, save_manifest
+from nem_reader import FCAS_BIDTYPES, table_query
 
 # Create subdirectory for daily price band figures
 DAILY_PB_FIGURES_DIR = FIGURES_DIR / "daily_price_bands"
@@ -68,22 +74,6 @@ con = duckdb.connect()
 con.execute("SET memory_limit='8GB'")
 
 
-def aemo_csv_query(filepath):
-    return f"""
-    SELECT *
-    FROM read_csv(
-        '{filepath}',
-        header=true,
-        skip=1,
-        delim=',',
-        quote='"',
-        strict_mode=false,
-        ignore_errors=true
-    )
-    WHERE "I" = 'D'
-    """
-
-
 def load_daily_bids():
     """Load only DAILY bids for batteries in FCAS services."""
     print("Loading data...")
@@ -93,29 +83,15 @@ def load_daily_bids():
     duid_map['IS_BATTERY'] = duid_map['DISPATCHTYPE'] == 'BIDIRECTIONAL'
     con.register("duid_map", duid_map)
 
-    # FCAS services
-    fcas_services = [
-        'RAISE6SEC', 'RAISE60SEC', 'RAISE5MIN', 'RAISE1SEC', 'RAISEREG',
-        'LOWER6SEC', 'LOWER60SEC', 'LOWER5MIN', 'LOWER1SEC', 'LOWERREG'
-    ]
-    fcas_filter = "'" + "','".join(fcas_services) + "'"
+    # DAILY bids in FCAS services only (filters pushed down to the scan)
+    bid_columns = ['DUID', 'BIDTYPE', 'SETTLEMENTDATE', 'OFFERDATE', 'ENTRYTYPE'] + \
+        [f'PRICEBAND{i}' for i in range(1, 11)]
+    daily_fcas = {'BIDTYPE': FCAS_BIDTYPES, 'ENTRYTYPE': 'DAILY'}
 
     # Query for DAILY bids only, for batteries, in FCAS services
     query = f"""
     WITH bdo AS (
-        SELECT
-            DUID, BIDTYPE, SETTLEMENTDATE, OFFERDATE, ENTRYTYPE,
-            TRY_CAST(PRICEBAND1 AS DOUBLE) as PRICEBAND1,
-            TRY_CAST(PRICEBAND2 AS DOUBLE) as PRICEBAND2,
-            TRY_CAST(PRICEBAND3 AS DOUBLE) as PRICEBAND3,
-            TRY_CAST(PRICEBAND4 AS DOUBLE) as PRICEBAND4,
-            TRY_CAST(PRICEBAND5 AS DOUBLE) as PRICEBAND5,
-            TRY_CAST(PRICEBAND6 AS DOUBLE) as PRICEBAND6,
-            TRY_CAST(PRICEBAND7 AS DOUBLE) as PRICEBAND7,
-            TRY_CAST(PRICEBAND8 AS DOUBLE) as PRICEBAND8,
-            TRY_CAST(PRICEBAND9 AS DOUBLE) as PRICEBAND9,
-            TRY_CAST(PRICEBAND10 AS DOUBLE) as PRICEBAND10
-        FROM ({aemo_csv_query(BIDDAYOFFER_PATH)})
+        {table_query('BIDDAYOFFER', columns=bid_columns, where=daily_fcas)}
     )
     SELECT
         bdo.*,
@@ -124,8 +100,6 @@ def load_daily_bids():
     FROM bdo
     JOIN duid_map dm ON bdo.DUID = dm.DUID
     WHERE dm.IS_BATTERY = TRUE
-      AND bdo.BIDTYPE IN ({fcas_filter})
-      AND bdo.ENTRYTYPE = 'DAILY'
     """
 
     df = con.execute(query).fetchdf()
@@ -138,7 +112,7 @@ def load_daily_bids():
     return df
 
 
-def create_boxplot_comparison(df):
+def create_boxplot_comparison(df, manifest, force=False):
     """Create side-by-side box plots for each price band."""
     print("\nCreating box plot figure...")
 
@@ -152,62 +126,62 @@ def create_boxplot_comparison(df):
     # Price band columns
     price_bands = [f'PRICEBAND{i}' for i in range(1, 11)]
 
-    # Create figure with subplots - 2 rows x 5 columns
-    fig, axes = plt.subplots(2, 5, figsize=(20, 10))
-    fig.suptitle('Distribution of DAILY (Initial) Price Bands: Autobidder vs Non-Autobidder Batteries\n(FCAS Services, October 2025)',
-                 fontsize=14, fontweight='bold')
-
-    axes = axes.flatten()
-
-    # Collect stats for table
+    # Collect stats for titles and table
     stats_for_title = []
-
     for i, band in enumerate(price_bands):
-        ax = axes[i]
-
-        # Get data for this price band
         auto_data = autobidder[band].dropna()
         non_auto_data = non_autobidder[band].dropna()
-
-        # Create box plot
-        bp = ax.boxplot([auto_data, non_auto_data],
-                        labels=['Autobidder', 'Non-Auto'],
-                        patch_artist=True,
-                        showfliers=True,
-                        flierprops={'marker': 'o', 'markersize': 3, 'alpha': 0.5})
-
-        # Color the boxes
-        bp['boxes'][0].set_facecolor('#3498db')  # Blue for autobidder
-        bp['boxes'][1].set_facecolor('#e74c3c')  # Red for non-autobidder
-
-        # Set title with stats
-        auto_std = auto_data.std()
-        non_auto_std = non_auto_data.std()
-        title = f'Band {i+1}\nAuto σ={auto_std:.1f}, Non-Auto σ={non_auto_std:.1f}'
-        ax.set_title(title, fontsize=10)
-        ax.set_ylabel('Price ($/MWh)')
-
         stats_for_title.append({
             'band': i+1,
             'auto_mean': auto_data.mean(),
-            'auto_std': auto_std,
+            'auto_std': auto_data.std(),
             'auto_n_distinct': auto_data.nunique(),
             'non_auto_mean': non_auto_data.mean(),
-            'non_auto_std': non_auto_std,
+            'non_auto_std': non_auto_data.std(),
             'non_auto_n_distinct': non_auto_data.nunique()
         })
 
-        # Use log scale for higher bands where values span orders of magnitude
-        if i >= 4:  # Bands 5-10 typically have much larger values
-            ax.set_yscale('log')
+    output_path = DAILY_PB_FIGURES_DIR / "daily_price_band_boxplots.png"
+    key = input_hash(df, Path(__file__), dpi=150)
+    fig = None
+    if not force and is_current(manifest, output_path, key):
+        print(f"\nUnchanged figure: {output_path}")
+    else:
+        # Create figure with subplots - 2 rows x 5 columns
+        fig, axes = plt.subplots(2, 5, figsize=(20, 10))
+        fig.suptitle('Distribution of DAILY (Initial) Price Bands: Autobidder vs Non-Autobidder Batteries\n(FCAS Services, October 2025)',
+                     fontsize=14, fontweight='bold')
 
-    plt.tight_layout()
-    plt.subplots_adjust(top=0.88)
+        axes = axes.flatten()
 
-    # Save figure
-    output_path = DAILY_PB_FIGURES_DIR / "daily_price_band_boxplots.png"
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    print(f"\nSaved figure: {output_path}")
+        for i, (band, stats) in enumerate(zip(price_bands, stats_for_title)):
+            ax = axes[i]
+
+            # Create box plot
+            bp = ax.boxplot([autobidder[band].dropna(), non_autobidder[band].dropna()],
+                            labels=['Autobidder', 'Non-Auto'],
+                            patch_artist=True,
+                            showfliers=True,
+                            flierprops={'marker': 'o', 'markersize': 3, 'alpha': 0.5})
+
+            # Color the boxes
+            bp['boxes'][0].set_facecolor('#3498db')  # Blue for autobidder
+            bp['boxes'][1].set_facecolor('#e74c3c')  # Red for non-autobidder
+
+            # Set title with stats
+            title = f"Band {i+1}\nAuto σ={stats['auto_std']:.1f}, Non-Auto σ={stats['non_auto_std']:.1f}"
+            ax.set_title(title, fontsize=10)
+            ax.set_ylabel('Price ($/MWh)')
+
+            # Use log scale for higher bands where values span orders of magnitude
+            if i >= 4:  # Bands 5-10 typically have much larger values
+                ax.set_yscale('log')
+
+        plt.tight_layout()
+        plt.subplots_adjust(top=0.88)
+
+        save_figure(fig, output_path, key, manifest, force, dpi=150, bbox_inches='tight')
+        print(f"\nSaved figure: {output_path}")
 
     # Print stats table
     print("\nPrice Band Statistics (DAILY bids):")
@@ -255,7 +229,7 @@ def create_detailed_stats_table(df):
     return stats_df
 
 
-def create_per_unit_variation_plot(df):
+def create_per_unit_variation_plot(df, manifest, force=False):
     """Show how much each unit varies its price bands across days."""
     print("\nAnalyzing per-unit variation...")
 
@@ -281,43 +255,47 @@ def create_per_unit_variation_plot(df):
 
     var_df = pd.DataFrame(variation_data)
 
-    # Create figure showing coefficient of variation by price band
-    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-
-    # Plot 1: Average Std Dev by price band
-    ax1 = axes[0]
-    auto_std = var_df[var_df['IS_AUTOBIDDER']].groupby('Price Band')['Std Dev'].mean()
-    non_auto_std = var_df[~var_df['IS_AUTOBIDDER']].groupby('Price Band')['Std Dev'].mean()
-
-    x = np.arange(1, 11)
-    width = 0.35
-    ax1.bar(x - width/2, auto_std, width, label='Autobidder (4 units)', color='#3498db')
-    ax1.bar(x + width/2, non_auto_std, width, label='Non-Autobidder (29 units)', color='#e74c3c')
-    ax1.set_xlabel('Price Band')
-    ax1.set_ylabel('Average Std Dev of Price ($/MWh)')
-    ax1.set_title('Average Price Band Variation Within Units\n(Std Dev across DAILY bids)', fontweight='bold')
-    ax1.set_xticks(x)
-    ax1.legend()
-    ax1.set_yscale('log')
-
-    # Plot 2: Number of distinct values by price band
-    ax2 = axes[1]
-    auto_distinct = var_df[var_df['IS_AUTOBIDDER']].groupby('Price Band')['N Distinct'].mean()
-    non_auto_distinct = var_df[~var_df['IS_AUTOBIDDER']].groupby('Price Band')['N Distinct'].mean()
-
-    ax2.bar(x - width/2, auto_distinct, width, label='Autobidder (4 units)', color='#3498db')
-    ax2.bar(x + width/2, non_auto_distinct, width, label='Non-Autobidder (29 units)', color='#e74c3c')
-    ax2.set_xlabel('Price Band')
-    ax2.set_ylabel('Average N Distinct Values')
-    ax2.set_title('Average Number of Distinct Price Band Values\n(Across DAILY bids per unit)', fontweight='bold')
-    ax2.set_xticks(x)
-    ax2.legend()
-
-    plt.tight_layout()
-
     output_path = DAILY_PB_FIGURES_DIR / "daily_price_band_variation_by_unit.png"
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    print(f"Saved: {output_path}")
+    key = input_hash(var_df, Path(__file__), dpi=150)
+    if not force and is_current(manifest, output_path, key):
+        print(f"Unchanged: {output_path}")
+    else:
+        # Create figure showing coefficient of variation by price band
+        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+
+        # Plot 1: Average Std Dev by price band
+        ax1 = axes[0]
+        auto_std = var_df[var_df['IS_AUTOBIDDER']].groupby('Price Band')['Std Dev'].mean()
+        non_auto_std = var_df[~var_df['IS_AUTOBIDDER']].groupby('Price Band')['Std Dev'].mean()
+
+        x = np.arange(1, 11)
+        width = 0.35
+        ax1.bar(x - width/2, auto_std, width, label='Autobidder (4 units)', color='#3498db')
+        ax1.bar(x + width/2, non_auto_std, width, label='Non-Autobidder (29 units)', color='#e74c3c')
+        ax1.set_xlabel('Price Band')
+        ax1.set_ylabel('Average Std Dev of Price ($/MWh)')
+        ax1.set_title('Average Price Band Variation Within Units\n(Std Dev across DAILY bids)', fontweight='bold')
+        ax1.set_xticks(x)
+        ax1.legend()
+        ax1.set_yscale('log')
+
+        # Plot 2: Number of distinct values by price band
+        ax2 = axes[1]
+        auto_distinct = var_df[var_df['IS_AUTOBIDDER']].groupby('Price Band')['N Distinct'].mean()
+        non_auto_distinct = var_df[~var_df['IS_AUTOBIDDER']].groupby('Price Band')['N Distinct'].mean()
+
+        ax2.bar(x - width/2, auto_distinct, width, label='Autobidder (4 units)', color='#3498db')
+        ax2.bar(x + width/2, non_auto_distinct, width, label='Non-Autobidder (29 units)', color='#e74c3c')
+        ax2.set_xlabel('Price Band')
+        ax2.set_ylabel('Average N Distinct Values')
+        ax2.set_title('Average Number of Distinct Price Band Values\n(Across DAILY bids per unit)', fontweight='bold')
+        ax2.set_xticks(x)
+        ax2.legend()
+
+        plt.tight_layout()
+
+        save_figure(fig, output_path, key, manifest, force, dpi=150, bbox_inches='tight')
+        print(f"Saved: {output_path}")
 
     # Summary table
     summary = var_df.groupby('IS_AUTOBIDDER').agg({
@@ -337,58 +315,37 @@ def show_example_price_bands():
     print("EXAMPLE PRICE BANDS FOR SPECIFIC UNITS")
     print("=" * 80)
 
-    # Load full data (not just DAILY) to show examples
-    duid_map = pd.read_csv(DUID_MAP_PATH)
-    duid_map['IS_BATTERY'] = duid_map['DISPATCHTYPE'] == 'BIDIRECTIONAL'
-    con.register("duid_map", duid_map)
+    example_columns = ['SETTLEMENTDATE', 'OFFERDATE', 'ENTRYTYPE'] + \
+        [f'PRICEBAND{i}' for i in range(1, 11)]
 
-    # Create view for examples
-    con.execute(f"""
-        CREATE OR REPLACE VIEW biddayoffer_example AS
-        SELECT
-            bdo.DUID, bdo.BIDTYPE, bdo.SETTLEMENTDATE, bdo.OFFERDATE, bdo.ENTRYTYPE,
-            TRY_CAST(bdo.PRICEBAND1 AS DOUBLE) as PRICEBAND1,
-            TRY_CAST(bdo.PRICEBAND2 AS DOUBLE) as PRICEBAND2,
-            TRY_CAST(bdo.PRICEBAND3 AS DOUBLE) as PRICEBAND3,
-            TRY_CAST(bdo.PRICEBAND4 AS DOUBLE) as PRICEBAND4,
-            TRY_CAST(bdo.PRICEBAND5 AS DOUBLE) as PRICEBAND5,
-            TRY_CAST(bdo.PRICEBAND6 AS DOUBLE) as PRICEBAND6,
-            TRY_CAST(bdo.PRICEBAND7 AS DOUBLE) as PRICEBAND7,
-            TRY_CAST(bdo.PRICEBAND8 AS DOUBLE) as PRICEBAND8,
-            TRY_CAST(bdo.PRICEBAND9 AS DOUBLE) as PRICEBAND9,
-            TRY_CAST(bdo.PRICEBAND10 AS DOUBLE) as PRICEBAND10
-        FROM ({aemo_csv_query(BIDDAYOFFER_PATH)}) bdo
-    """)
+    def example_query(duid):
+        # Only this unit's RAISE6SEC DAILY rows are read from the cache
+        example_filter = {'DUID': duid, 'BIDTYPE': 'RAISE6SEC', 'ENTRYTYPE': 'DAILY'}
+        return f"""
+        {table_query('BIDDAYOFFER', columns=example_columns, where=example_filter)}
+        ORDER BY OFFERDATE
+        LIMIT 10
+        """
 
     # Show HPR1 (autobidder) vs BALB1 (non-autobidder) for RAISE6SEC
     print("\n--- HPR1 (Hornsdale, Autobidder) - RAISE6SEC DAILY price bands ---")
-    hpr1 = con.execute("""
-        SELECT SETTLEMENTDATE, OFFERDATE, ENTRYTYPE,
-               PRICEBAND1, PRICEBAND2, PRICEBAND3, PRICEBAND4, PRICEBAND5,
-               PRICEBAND6, PRICEBAND7, PRICEBAND8, PRICEBAND9, PRICEBAND10
-        FROM biddayoffer_example
-        WHERE DUID = 'HPR1' AND BIDTYPE = 'RAISE6SEC' AND ENTRYTYPE = 'DAILY'
-        ORDER BY OFFERDATE
-        LIMIT 10
-    """).fetchdf()
+    hpr1 = con.execute(example_query('HPR1')).fetchdf()
     print(hpr1.to_string())
 
     print("\n--- BALB1 (Ballarat Battery, Non-Autobidder) - RAISE6SEC DAILY price bands ---")
-    balb1 = con.execute("""
-        SELECT SETTLEMENTDATE, OFFERDATE, ENTRYTYPE,
-               PRICEBAND1, PRICEBAND2, PRICEBAND3, PRICEBAND4, PRICEBAND5,
-               PRICEBAND6, PRICEBAND7, PRICEBAND8, PRICEBAND9, PRICEBAND10
-        FROM biddayoffer_example
-        WHERE DUID = 'BALB1' AND BIDTYPE = 'RAISE6SEC' AND ENTRYTYPE = 'DAILY'
-        ORDER BY OFFERDATE
-        LIMIT 10
-    """).fetchdf()
+    balb1 = con.execute(example_query('BALB1')).fetchdf()
     print(balb1.to_string())
 
     print("\nNote: HPR1 uses identical price bands across all days, while BALB1 shows some variation.")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="DAILY price band distribution analysis.")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render figures even if their inputs are unchanged")
+    args = parser.parse_args()
+    manifest = load_manifest()
+
     print("=" * 80)
     print("DAILY Price Band Distribution Analysis")
     print("=" * 80)
@@ -399,13 +356,14 @@ def main():
     df = load_daily_bids()
 
     # Create main comparison box plots
-    create_boxplot_comparison(df)
+    create_boxplot_comparison(df, manifest, force=args.force)
 
     # Create detailed stats
     stats_df = create_detailed_stats_table(df)
 
     # Create per-unit variation analysis
-    var_df = create_per_unit_variation_plot(df)
+    var_df = create_per_unit_variation_plot(df, manifest, force=args.force)
+    save_manifest(manifest)
 
     # Show example price bands for specific units
     show_example_price_bands()
@@ -10,11 +10,14 @@ Purpose:
 Data:
     - BIDDAYOFFER: Contains price bands (PRICEBAND1-10) set at the day level
     - BIDOFFERPERIOD: Contains quantity bands (BANDAVAIL1-10) for each 5-minute period
-    - Joined on DUID, BIDTYPE, SETTLEMENTDATE, OFFERDATE
+    - Joined on DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION, OFFERDATE
+    - Read from the pre-joined offer_version_period view in the analytics
+      database (nem_db.py), which is built once from the Parquet cache
 
 Output:
     - output/price_and_quantity_ex.csv
-        Merged dataset with both price and quantity bands for each bid
+        Merged dataset with both price and quantity bands for each bid, plus
+        its offered MW and MW-weighted offer price (OFFER_MW, OFFER_PRICE)
 
 Configuration:
     - SELECTED_DUID: Which battery to export (default: HBESS1)
@@ -22,14 +25,13 @@ Configuration:
     - MAX_ROWS: Limit output size (default: None for all rows)
 """
 
-import duckdb
-import pandas as pd
 import sys
 from pathlib import Path
 
 # Add parent directory to path for config import
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import BIDDAYOFFER_PATH, BIDOFFERPERIOD_PATH, DUID_MAP_PATH, OUTPUT_DIR
+from config import OUTPUT_DIR
+from nem_db import connect as connect_analytics_db, offer_version_query
 
 # =============================================================================
 # CONFIGURATION
@@ -41,27 +43,10 @@ MAX_ROWS = None  # Set to integer to limit output, None for all rows
 # =============================================================================
 # SETUP
 # =============================================================================
-con = duckdb.connect()
+con = connect_analytics_db(tables=["offer_version_range"])
 con.execute("SET memory_limit='8GB'")
 
 
-def aemo_csv_query(filepath):
-    """Query template for AEMO CSV format (skip metadata row, filter to data rows)."""
-    return f"""
-    SELECT *
-    FROM read_csv(
-        '{filepath}',
-        header=true,
-        skip=1,
-        delim=',',
-        quote='"',
-        strict_mode=false,
-        ignore_errors=true
-    )
-    WHERE "I" = 'D'
-    """
-
-
 def export_price_quantity_data():
     """Export merged price and quantity band data for selected DUID/BIDTYPE."""
     print("=" * 80)
@@ -71,74 +56,31 @@ def export_price_quantity_data():
     print(f"BIDTYPE: {SELECTED_BIDTYPE}")
     print()
 
-    # Load DUID map for DIRECTION info
-    duid_map = pd.read_csv(DUID_MAP_PATH)
-    con.register("duid_map", duid_map)
-
     # Build the merged query
     limit_clause = f"LIMIT {MAX_ROWS}" if MAX_ROWS else ""
 
+    # offer_version_period (nem_db.py) already joins quantity and price bands
+    # and is sorted by DUID/BIDTYPE, so only this unit/service's rows are read
+    unit_filter = {'DUID': SELECTED_DUID, 'BIDTYPE': SELECTED_BIDTYPE}
+
     query = f"""
-    WITH price_bands AS (
-        SELECT
-            DUID,
-            BIDTYPE,
-            SETTLEMENTDATE,
-            OFFERDATE,
-            TRY_CAST(PRICEBAND1 AS DOUBLE) as PRICEBAND1,
-            TRY_CAST(PRICEBAND2 AS DOUBLE) as PRICEBAND2,
-            TRY_CAST(PRICEBAND3 AS DOUBLE) as PRICEBAND3,
-            TRY_CAST(PRICEBAND4 AS DOUBLE) as PRICEBAND4,
-            TRY_CAST(PRICEBAND5 AS DOUBLE) as PRICEBAND5,
-            TRY_CAST(PRICEBAND6 AS DOUBLE) as PRICEBAND6,
-            TRY_CAST(PRICEBAND7 AS DOUBLE) as PRICEBAND7,
-            TRY_CAST(PRICEBAND8 AS DOUBLE) as PRICEBAND8,
-            TRY_CAST(PRICEBAND9 AS DOUBLE) as PRICEBAND9,
-            TRY_CAST(PRICEBAND10 AS DOUBLE) as PRICEBAND10
-        FROM ({aemo_csv_query(BIDDAYOFFER_PATH)})
-        WHERE DUID = '{SELECTED_DUID}'
-          AND BIDTYPE = '{SELECTED_BIDTYPE}'
-    ),
-    quantity_bands AS (
-        SELECT
-            DUID,
-            BIDTYPE,
-            TRADINGDATE AS SETTLEMENTDATE,
-            PERIODID,
-            OFFERDATETIME AS OFFERDATE,
-            TRY_CAST(BANDAVAIL1 AS DOUBLE) as BANDAVAIL1,
-            TRY_CAST(BANDAVAIL2 AS DOUBLE) as BANDAVAIL2,
-            TRY_CAST(BANDAVAIL3 AS DOUBLE) as BANDAVAIL3,
-            TRY_CAST(BANDAVAIL4 AS DOUBLE) as BANDAVAIL4,
-            TRY_CAST(BANDAVAIL5 AS DOUBLE) as BANDAVAIL5,
-            TRY_CAST(BANDAVAIL6 AS DOUBLE) as BANDAVAIL6,
-            TRY_CAST(BANDAVAIL7 AS DOUBLE) as BANDAVAIL7,
-            TRY_CAST(BANDAVAIL8 AS DOUBLE) as BANDAVAIL8,
-            TRY_CAST(BANDAVAIL9 AS DOUBLE) as BANDAVAIL9,
-            TRY_CAST(BANDAVAIL10 AS DOUBLE) as BANDAVAIL10
-        FROM ({aemo_csv_query(BIDOFFERPERIOD_PATH)})
-        WHERE DUID = '{SELECTED_DUID}'
-          AND BIDTYPE = '{SELECTED_BIDTYPE}'
+    WITH offers AS (
+        {offer_version_query(where=unit_filter)}
     )
     SELECT
-        q.DUID,
-        q.BIDTYPE,
-        q.SETTLEMENTDATE,
-        q.PERIODID,
-        q.OFFERDATE,
-        dm.DISPATCHTYPE as DIRECTION,
-        q.BANDAVAIL1, q.BANDAVAIL2, q.BANDAVAIL3, q.BANDAVAIL4, q.BANDAVAIL5,
-        q.BANDAVAIL6, q.BANDAVAIL7, q.BANDAVAIL8, q.BANDAVAIL9, q.BANDAVAIL10,
-        p.PRICEBAND1, p.PRICEBAND2, p.PRICEBAND3, p.PRICEBAND4, p.PRICEBAND5,
-        p.PRICEBAND6, p.PRICEBAND7, p.PRICEBAND8, p.PRICEBAND9, p.PRICEBAND10
-    FROM quantity_bands q
-    INNER JOIN price_bands p
-        ON q.DUID = p.DUID
-        AND q.BIDTYPE = p.BIDTYPE
-        AND q.SETTLEMENTDATE = p.SETTLEMENTDATE
-        AND q.OFFERDATE = p.OFFERDATE
-    LEFT JOIN duid_map dm ON q.DUID = dm.DUID
-    ORDER BY q.DUID, q.SETTLEMENTDATE, q.PERIODID, q.OFFERDATE
+        o.DUID,
+        o.BIDTYPE,
+        o.SETTLEMENTDATE,
+        o.PERIODID,
+        o.OFFERDATE,
+        o.DIRECTION,
+        o.BANDAVAIL1, o.BANDAVAIL2, o.BANDAVAIL3, o.BANDAVAIL4, o.BANDAVAIL5,
+        o.BANDAVAIL6, o.BANDAVAIL7, o.BANDAVAIL8, o.BANDAVAIL9, o.BANDAVAIL10,
+        o.PRICEBAND1, o.PRICEBAND2, o.PRICEBAND3, o.PRICEBAND4, o.PRICEBAND5,
+        o.PRICEBAND6, o.PRICEBAND7, o.PRICEBAND8, o.PRICEBAND9, o.PRICEBAND10,
+        o.OFFER_MW, o.OFFER_PRICE
+    FROM offers o
+    ORDER BY o.DUID, o.SETTLEMENTDATE, o.DIRECTION, o.PERIODID, o.OFFERDATE
     {limit_clause}
     """
 
@@ -1,12 +1,15 @@
 import pandas as pd
-import duckdb
 import sys
 from pathlib import Path
 
+# Add parent directory to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import BIDDAYOFFER_PATH, BIDOFFERPERIOD_PATH, FIGURES_DIR
+from bidders import add_bidder_category
+from nem_reader import read_table
 
-
-bidofferperiod = '/Volumes/Rich drive/ai_bidders/data/samples/PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE01#202510010000.csv'
-biddayofferperiod = '/Volumes/Rich drive/ai_bidders/data/samples/PUBLIC_ARCHIVE#BIDDAYOFFER#FILE01#202510010000.csv'
+bidofferperiod = str(BIDOFFERPERIOD_PATH)
+biddayofferperiod = str(BIDDAYOFFER_PATH)
 # Read first 10 rows of the CSV file
 
 bidoffer_df = pd.read_csv(bidofferperiod, nrows=10, skiprows=1)
@@ -27,17 +30,10 @@ bidday_df.to_csv("price_band_ex.csv")
 
 
 
-con = duckdb.connect()
-query = f"""
-SELECT ENTRYTYPE, BIDTYPE, SETTLEMENTDATE, DUID, DIRECTION, REBID_EVENT_TIME, OFFERDATE, PRICEBAND1, PRICEBAND2, PRICEBAND3, PRICEBAND4, PRICEBAND5, PRICEBAND6, PRICEBAND7, PRICEBAND8, PRICEBAND9, PRICEBAND10 FROM read_csv_auto('{biddayofferperiod}', 
-	header=true, 
-	skip=1, 
-	delim=',', 
-	strict_mode=false, 
-	ignore_errors=true
-)
-"""
-large_bd_df = con.execute(query).fetchdf()
+large_bd_df = read_table('BIDDAYOFFER', columns=[
+    'ENTRYTYPE', 'BIDTYPE', 'SETTLEMENTDATE', 'DUID', 'DIRECTION', 'REBID_EVENT_TIME', 'OFFERDATE',
+    'PRICEBAND1', 'PRICEBAND2', 'PRICEBAND3', 'PRICEBAND4', 'PRICEBAND5',
+    'PRICEBAND6', 'PRICEBAND7', 'PRICEBAND8', 'PRICEBAND9', 'PRICEBAND10'])
 # Group by BIDTYPE, SETTLEMENTDATE, DUID, DIRECTION and order by REBID_EVENT_TIME
 
 
@@ -51,42 +47,22 @@ large_bd_df = con.execute(query).fetchdf()
 # and places RAISEREG bids in 60 of them, their RAISEREG participation rate is 60%. This is not the same as counting how many
 # observations they have since they can rebid for a single auction multiple times. Each rebid should not count as a separate auction participation.
 
-# Load the participant map
-participant_map = pd.read_csv(DUID_MAP_PATH)
-
-# Merge bid data with participant map on DUID
-merged_df = large_bd_df.merge(participant_map[['DUID', 'DISPATCHTYPE', 'TESLA_AUTOBIDDER', 'PARTICIPANT_NAME']],
-                               on='DUID', how='left')
-
-# Exclude VPP bidder (VSSEL1V1)
-merged_df = merged_df[merged_df['DUID'] != 'VSSEL1V1']
-
-# Create bidder category based on DISPATCHTYPE and TESLA_AUTOBIDDER
-def categorize_bidder(row):
-    is_battery = row['DISPATCHTYPE'] == 'BIDIRECTIONAL'
-    is_autobidder = row['TESLA_AUTOBIDDER'] == True
-
-    if is_battery and is_autobidder:
-        return 'Autobidder Battery'
-    elif is_battery and not is_autobidder:
-        return 'Non-Autobidder Battery'
-    else:
-        return 'Non-Battery'
-
-merged_df['BIDDER_CATEGORY'] = merged_df.apply(categorize_bidder, axis=1)
+# Categorize bidders from DISPATCHTYPE and TESLA_AUTOBIDDER (excluding the VPP
+# bidder); the rules are evaluated once per DUID, see code/bidders.py
+merged_df = add_bidder_category(large_bd_df)
 
 # Calculate percentage breakdown of BIDTYPE participation for each bidder category
 # An auction participation is a unique (SETTLEMENTDATE, DUID, BIDTYPE) combination
 # For each category, the percentages across all BIDTYPEs should sum to 100%
 
 # Get unique auction participations per BIDTYPE (SETTLEMENTDATE, DUID, BIDTYPE combinations)
-bidtype_participations = merged_df.groupby(['BIDDER_CATEGORY', 'SETTLEMENTDATE', 'DUID', 'BIDTYPE']).size().reset_index(name='count')
+bidtype_participations = merged_df.groupby(['BIDDER_CATEGORY', 'SETTLEMENTDATE', 'DUID', 'BIDTYPE'], observed=True).size().reset_index(name='count')
 test_df = bidtype_participations.reset_index()
 # Count total participations per BIDTYPE per category
-bidtype_counts = bidtype_participations.groupby(['BIDDER_CATEGORY', 'BIDTYPE']).size().reset_index(name='auction_count')
+bidtype_counts = bidtype_participations.groupby(['BIDDER_CATEGORY', 'BIDTYPE'], observed=True).size().reset_index(name='auction_count')
 
 # Calculate total participations per category (sum across all BIDTYPEs)
-total_per_category = bidtype_counts.groupby('BIDDER_CATEGORY')['auction_count'].sum().reset_index(name='total_participations')
+total_per_category = bidtype_counts.groupby('BIDDER_CATEGORY', observed=True)['auction_count'].sum().reset_index(name='total_participations')
 
 # Merge to calculate percentages
 bidtype_percentages = bidtype_counts.merge(total_per_category, on='BIDDER_CATEGORY')
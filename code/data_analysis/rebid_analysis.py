@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import duckdb
 import matplotlib.pyplot as plt
@@ -8,7 +9,29 @@ from pathlib import Path
 
 # Add parent directory to path for config import
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import BIDDAYOFFER_PATH, BIDOFFERPERIOD_PATH, DUID_MAP_PATH, FIGURES_DIR
+from config import DUID_MAP_PATH, FIGURES_DIR
+from nem_reader import FCAS_BIDTYPES, read_table, where_sql
+from bidders import BATTERY_CATEGORIES, BIDDER_CATEGORIES, add_bidder_category
+from nem_db import connect as connect_analytics_db
+from figure_cache import input_hash, is_current, load_manifest, save_figure, save_manifest
+from rebids import scan_true_rebids
+
+parser = argparse.ArgumentParser(description="Rebid counts by bidder category and FCAS service.")
+parser.add_argument("--force", action="store_true",
+                    help="re-render figures even if their inputs are unchanged")
+args = parser.parse_args()
+
+# Figures are only re-rendered when their input data or this script changed
+figure_manifest = load_manifest()
+
+
+def figure_is_stale(path, key):
+    """True if a figure has to be drawn: its inputs changed, it is missing, or --force."""
+    if args.force or not is_current(figure_manifest, path, key):
+        return True
+    print(f"Skipping unchanged figure {path.name}")
+    return False
+
 
 # Create output directory if it doesn't exist
 rebids_dir = FIGURES_DIR / 'rebids'
@@ -18,46 +41,18 @@ rebids_dir.mkdir(exist_ok=True)
 # LOAD DATA
 # =============================================================================
 
-biddayofferperiod = str(BIDDAYOFFER_PATH)
-
 con = duckdb.connect()
-query = f"""
-SELECT BIDTYPE, SETTLEMENTDATE, DUID, OFFERDATE FROM read_csv_auto('{biddayofferperiod}',
-	header=true,
-	skip=1,
-	delim=',',
-	strict_mode=false,
-	ignore_errors=true
-)
-"""
-large_bd_df = con.execute(query).fetchdf()
+large_bd_df = read_table('BIDDAYOFFER', columns=['BIDTYPE', 'SETTLEMENTDATE', 'DUID', 'OFFERDATE'], con=con)
 
 # =============================================================================
 # MERGE WITH PARTICIPANT MAP AND CATEGORIZE BIDDERS
 # =============================================================================
 
+# Categorize bidders (Autobidder Battery, Non-Autobidder Battery, Non-Battery)
+# from DISPATCHTYPE and TESLA_AUTOBIDDER; the VPP bidder (VSSEL1V1) is excluded.
+# The rules are evaluated once per DUID, see code/bidders.py
 participant_map = pd.read_csv(DUID_MAP_PATH)
-
-# Merge bid data with participant map on DUID
-merged_df = large_bd_df.merge(participant_map[['DUID', 'DISPATCHTYPE', 'TESLA_AUTOBIDDER', 'PARTICIPANT_NAME']],
-                               on='DUID', how='left')
-
-# Exclude VPP bidder (VSSEL1V1)
-merged_df = merged_df[merged_df['DUID'] != 'VSSEL1V1']
-
-# Create bidder category based on DISPATCHTYPE and TESLA_AUTOBIDDER
-def categorize_bidder(row):
-    is_battery = row['DISPATCHTYPE'] == 'BIDIRECTIONAL'
-    is_autobidder = row['TESLA_AUTOBIDDER'] == True
-
-    if is_battery and is_autobidder:
-        return 'Autobidder Battery'
-    elif is_battery and not is_autobidder:
-        return 'Non-Autobidder Battery'
-    else:
-        return 'Non-Battery'
-
-merged_df['BIDDER_CATEGORY'] = merged_df.apply(categorize_bidder, axis=1)
+merged_df = add_bidder_category(large_bd_df, participant_map=participant_map)
 
 # =============================================================================
 # COUNT REBIDS PER AUCTION
@@ -68,14 +63,15 @@ fcas_df = merged_df[merged_df['BIDTYPE'] != 'ENERGY'].copy()
 
 # Count number of bids per auction (SETTLEMENTDATE, DUID, BIDTYPE)
 # Number of rebids = total bids - 1 (first bid is not a rebid)
-bid_counts = fcas_df.groupby(['BIDDER_CATEGORY', 'BIDTYPE', 'SETTLEMENTDATE', 'DUID']).size().reset_index(name='num_bids')
+bid_counts = fcas_df.groupby(['BIDDER_CATEGORY', 'BIDTYPE', 'SETTLEMENTDATE', 'DUID'], observed=True).size().reset_index(name='num_bids')
 bid_counts['num_rebids'] = bid_counts['num_bids'] - 1
+rebids_key = input_hash(bid_counts, Path(__file__))
 
 # Get unique FCAS types and categories
 fcas_types = sorted(bid_counts['BIDTYPE'].unique())
-all_categories = ['Autobidder Battery', 'Non-Autobidder Battery', 'Non-Battery']
+all_categories = BIDDER_CATEGORIES
 category_colors = ['#1f77b4', '#ff7f0e', '#2ca02c']  # Blue, Orange, Green
-battery_categories = ['Autobidder Battery', 'Non-Autobidder Battery']
+battery_categories = BATTERY_CATEGORIES
 battery_colors = ['#1f77b4', '#ff7f0e']  # Blue, Orange
 
 # =============================================================================
@@ -103,194 +99,200 @@ for cat in all_categories:
 # BOX PLOTS: REBID DISTRIBUTION BY CATEGORY (ALL FCAS)
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(10, 6))
+figure_path = rebids_dir / 'rebids_boxplot_all_fcas.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, ax = plt.subplots(figsize=(10, 6))
 
-plot_data = [bid_counts[bid_counts['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in all_categories]
-bp = ax.boxplot(plot_data, labels=all_categories, patch_artist=True)
+    plot_data = [bid_counts[bid_counts['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in all_categories]
+    bp = ax.boxplot(plot_data, labels=all_categories, patch_artist=True)
 
-for patch, color in zip(bp['boxes'], category_colors):
-    patch.set_facecolor(color)
-    patch.set_alpha(0.7)
+    for patch, color in zip(bp['boxes'], category_colors):
+        patch.set_facecolor(color)
+        patch.set_alpha(0.7)
 
-ax.set_title('Distribution of Rebids per Auction by Bidder Category (All FCAS)')
-ax.set_ylabel('Number of Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Distribution of Rebids per Auction by Bidder Category (All FCAS)')
+    ax.set_ylabel('Number of Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_boxplot_all_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("\nBox plot saved to 'figures/rebids/rebids_boxplot_all_fcas.png'")
+    print("\nBox plot saved to 'figures/rebids/rebids_boxplot_all_fcas.png'")
 
 # =============================================================================
 # BOX PLOTS: REBID DISTRIBUTION BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, axes = plt.subplots(2, 5, figsize=(18, 10))
-axes = axes.flatten()
+figure_path = rebids_dir / 'rebids_boxplot_by_fcas.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, axes = plt.subplots(2, 5, figsize=(18, 10))
+    axes = axes.flatten()
 
-for i, fcas_type in enumerate(fcas_types):
-    ax = axes[i]
-    fcas_data = bid_counts[bid_counts['BIDTYPE'] == fcas_type]
+    for i, fcas_type in enumerate(fcas_types):
+        ax = axes[i]
+        fcas_data = bid_counts[bid_counts['BIDTYPE'] == fcas_type]
 
-    plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in all_categories]
+        plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in all_categories]
 
-    # Filter out empty data
-    plot_data_filtered = []
-    labels_filtered = []
-    colors_filtered = []
-    for j, data in enumerate(plot_data):
-        if len(data) > 0:
-            plot_data_filtered.append(data)
-            labels_filtered.append(all_categories[j][:12])
-            colors_filtered.append(category_colors[j])
+        # Filter out empty data
+        plot_data_filtered = []
+        labels_filtered = []
+        colors_filtered = []
+        for j, data in enumerate(plot_data):
+            if len(data) > 0:
+                plot_data_filtered.append(data)
+                labels_filtered.append(all_categories[j][:12])
+                colors_filtered.append(category_colors[j])
 
-    if plot_data_filtered:
-        bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
-        for patch, color in zip(bp['boxes'], colors_filtered):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
+        if plot_data_filtered:
+            bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
+            for patch, color in zip(bp['boxes'], colors_filtered):
+                patch.set_facecolor(color)
+                patch.set_alpha(0.7)
 
-    ax.set_title(fcas_type, fontsize=10)
-    ax.tick_params(axis='x', rotation=45, labelsize=7)
-    ax.grid(axis='y', alpha=0.3)
+        ax.set_title(fcas_type, fontsize=10)
+        ax.tick_params(axis='x', rotation=45, labelsize=7)
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of Rebids per Auction by FCAS Type', fontsize=12)
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_boxplot_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of Rebids per Auction by FCAS Type', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("Box plots by FCAS type saved to 'figures/rebids/rebids_boxplot_by_fcas.png'")
+    print("Box plots by FCAS type saved to 'figures/rebids/rebids_boxplot_by_fcas.png'")
 
 # =============================================================================
 # BAR CHART: MEDIAN REBIDS BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(14, 6))
+figure_path = rebids_dir / 'rebids_median_bar_by_fcas.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, ax = plt.subplots(figsize=(14, 6))
 
-x = np.arange(len(fcas_types))
-width = 0.25
+    x = np.arange(len(fcas_types))
+    width = 0.25
 
-for j, cat in enumerate(all_categories):
-    medians = []
-    for fcas_type in fcas_types:
-        fcas_cat_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
-                                    (bid_counts['BIDDER_CATEGORY'] == cat)]['num_rebids']
-        medians.append(fcas_cat_data.median() if len(fcas_cat_data) > 0 else 0)
+    for j, cat in enumerate(all_categories):
+        medians = []
+        for fcas_type in fcas_types:
+            fcas_cat_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
+                                        (bid_counts['BIDDER_CATEGORY'] == cat)]['num_rebids']
+            medians.append(fcas_cat_data.median() if len(fcas_cat_data) > 0 else 0)
 
-    ax.bar(x + j * width, medians, width, label=cat, color=category_colors[j], alpha=0.7)
+        ax.bar(x + j * width, medians, width, label=cat, color=category_colors[j], alpha=0.7)
 
-ax.set_xticks(x + width)
-ax.set_xticklabels(fcas_types, rotation=45, ha='right')
-ax.legend(loc='upper right')
+    ax.set_xticks(x + width)
+    ax.set_xticklabels(fcas_types, rotation=45, ha='right')
+    ax.legend(loc='upper right')
 
-ax.set_title('Median Number of Rebids per Auction by FCAS Type')
-ax.set_xlabel('FCAS Type')
-ax.set_ylabel('Median Number of Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Median Number of Rebids per Auction by FCAS Type')
+    ax.set_xlabel('FCAS Type')
+    ax.set_ylabel('Median Number of Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_median_bar_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("Median rebids bar chart saved to 'figures/rebids/rebids_median_bar_by_fcas.png'")
+    print("Median rebids bar chart saved to 'figures/rebids/rebids_median_bar_by_fcas.png'")
 
 # =============================================================================
 # BAR CHART: MEAN REBIDS BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(14, 6))
+figure_path = rebids_dir / 'rebids_mean_bar_by_fcas.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, ax = plt.subplots(figsize=(14, 6))
 
-x = np.arange(len(fcas_types))
-width = 0.25
+    x = np.arange(len(fcas_types))
+    width = 0.25
 
-for j, cat in enumerate(all_categories):
-    means = []
-    for fcas_type in fcas_types:
-        fcas_cat_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
-                                    (bid_counts['BIDDER_CATEGORY'] == cat)]['num_rebids']
-        means.append(fcas_cat_data.mean() if len(fcas_cat_data) > 0 else 0)
+    for j, cat in enumerate(all_categories):
+        means = []
+        for fcas_type in fcas_types:
+            fcas_cat_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
+                                        (bid_counts['BIDDER_CATEGORY'] == cat)]['num_rebids']
+            means.append(fcas_cat_data.mean() if len(fcas_cat_data) > 0 else 0)
 
-    ax.bar(x + j * width, means, width, label=cat, color=category_colors[j], alpha=0.7)
+        ax.bar(x + j * width, means, width, label=cat, color=category_colors[j], alpha=0.7)
 
-ax.set_xticks(x + width)
-ax.set_xticklabels(fcas_types, rotation=45, ha='right')
-ax.legend(loc='upper right')
+    ax.set_xticks(x + width)
+    ax.set_xticklabels(fcas_types, rotation=45, ha='right')
+    ax.legend(loc='upper right')
 
-ax.set_title('Mean Number of Rebids per Auction by FCAS Type')
-ax.set_xlabel('FCAS Type')
-ax.set_ylabel('Mean Number of Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Mean Number of Rebids per Auction by FCAS Type')
+    ax.set_xlabel('FCAS Type')
+    ax.set_ylabel('Mean Number of Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_mean_bar_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("Mean rebids bar chart saved to 'figures/rebids/rebids_mean_bar_by_fcas.png'")
+    print("Mean rebids bar chart saved to 'figures/rebids/rebids_mean_bar_by_fcas.png'")
 
 # =============================================================================
 # HISTOGRAMS: REBID DISTRIBUTION BY CATEGORY
 # =============================================================================
 
-fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+figure_path = rebids_dir / 'rebids_histogram_by_category.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
 
-for i, cat in enumerate(all_categories):
-    ax = axes[i]
-    cat_data = bid_counts[bid_counts['BIDDER_CATEGORY'] == cat]['num_rebids']
+    for i, cat in enumerate(all_categories):
+        ax = axes[i]
+        cat_data = bid_counts[bid_counts['BIDDER_CATEGORY'] == cat]['num_rebids']
 
-    ax.hist(cat_data, bins=range(0, int(cat_data.max()) + 2), color=category_colors[i],
-            alpha=0.7, edgecolor='black')
-    ax.set_title(f'{cat}\n(n={len(cat_data)}, median={cat_data.median():.0f})')
-    ax.set_xlabel('Number of Rebids')
-    ax.set_ylabel('Frequency')
-    ax.grid(axis='y', alpha=0.3)
+        ax.hist(cat_data, bins=range(0, int(cat_data.max()) + 2), color=category_colors[i],
+                alpha=0.7, edgecolor='black')
+        ax.set_title(f'{cat}\n(n={len(cat_data)}, median={cat_data.median():.0f})')
+        ax.set_xlabel('Number of Rebids')
+        ax.set_ylabel('Frequency')
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of Rebids per Auction (All FCAS)', fontsize=12)
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_histogram_by_category.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of Rebids per Auction (All FCAS)', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("Histograms saved to 'figures/rebids/rebids_histogram_by_category.png'")
+    print("Histograms saved to 'figures/rebids/rebids_histogram_by_category.png'")
 
 # =============================================================================
 # BATTERIES ONLY: BOX PLOTS BY FCAS TYPE
 # =============================================================================
 
-fig, axes = plt.subplots(2, 5, figsize=(18, 10))
-axes = axes.flatten()
+figure_path = rebids_dir / 'rebids_boxplot_batteries_by_fcas.png'
+if figure_is_stale(figure_path, rebids_key):
+    fig, axes = plt.subplots(2, 5, figsize=(18, 10))
+    axes = axes.flatten()
 
-for i, fcas_type in enumerate(fcas_types):
-    ax = axes[i]
-    fcas_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
-                            (bid_counts['BIDDER_CATEGORY'].isin(battery_categories))]
+    for i, fcas_type in enumerate(fcas_types):
+        ax = axes[i]
+        fcas_data = bid_counts[(bid_counts['BIDTYPE'] == fcas_type) &
+                                (bid_counts['BIDDER_CATEGORY'].isin(battery_categories))]
 
-    plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in battery_categories]
+        plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_rebids'] for cat in battery_categories]
 
-    plot_data_filtered = []
-    labels_filtered = []
-    colors_filtered = []
-    for j, data in enumerate(plot_data):
-        if len(data) > 0:
-            plot_data_filtered.append(data)
-            labels_filtered.append(battery_categories[j][:12])
-            colors_filtered.append(battery_colors[j])
+        plot_data_filtered = []
+        labels_filtered = []
+        colors_filtered = []
+        for j, data in enumerate(plot_data):
+            if len(data) > 0:
+                plot_data_filtered.append(data)
+                labels_filtered.append(battery_categories[j][:12])
+                colors_filtered.append(battery_colors[j])
 
-    if plot_data_filtered:
-        bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
-        for patch, color in zip(bp['boxes'], colors_filtered):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
+        if plot_data_filtered:
+            bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
+            for patch, color in zip(bp['boxes'], colors_filtered):
+                patch.set_facecolor(color)
+                patch.set_alpha(0.7)
 
-    ax.set_title(fcas_type, fontsize=10)
-    ax.tick_params(axis='x', rotation=45, labelsize=7)
-    ax.grid(axis='y', alpha=0.3)
+        ax.set_title(fcas_type, fontsize=10)
+        ax.tick_params(axis='x', rotation=45, labelsize=7)
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of Rebids per Auction - Batteries Only', fontsize=12)
-plt.tight_layout()
-plt.savefig(rebids_dir / 'rebids_boxplot_batteries_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of Rebids per Auction - Batteries Only', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("Battery-only box plots saved to 'figures/rebids/rebids_boxplot_batteries_by_fcas.png'")
+    print("Battery-only box plots saved to 'figures/rebids/rebids_boxplot_batteries_by_fcas.png'")
 
 # =============================================================================
 # SUMMARY TABLES
@@ -363,87 +365,22 @@ print("=" * 100)
 true_rebids_dir = rebids_dir / 'true_rebids'
 true_rebids_dir.mkdir(exist_ok=True)
 
-# Load quantity bands from BIDOFFERPERIOD
-bidofferperiod = str(BIDOFFERPERIOD_PATH)
-
-print("\nLoading quantity bands data...")
-quantity_query = f"""
-SELECT BIDTYPE, TRADINGDATE AS SETTLEMENTDATE, DUID, OFFERDATETIME AS OFFERDATE,
-       PERIODID,
-       BANDAVAIL1, BANDAVAIL2, BANDAVAIL3, BANDAVAIL4, BANDAVAIL5,
-       BANDAVAIL6, BANDAVAIL7, BANDAVAIL8, BANDAVAIL9, BANDAVAIL10
-FROM read_csv_auto('{bidofferperiod}',
-    header=true,
-    skip=1,
-    delim=',',
-    strict_mode=false,
-    ignore_errors=true
-)
-WHERE BIDTYPE != 'ENERGY'
-"""
-quantity_df = con.execute(quantity_query).fetchdf()
+# Flag true rebids straight from BIDOFFERPERIOD: a true rebid is an offer
+# whose quantity bands changed from the previous offer for the same auction
+# (DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION, PERIODID). Bands are hashed as
+# they stream out of DuckDB, so the band matrix is never held in memory.
+print("\nCounting true rebids (where quantity bands changed)...")
+quantity_df, true_rebid_counts = scan_true_rebids(where={'BIDTYPE': FCAS_BIDTYPES}, con=con)
 print(f"Loaded {len(quantity_df)} quantity band records")
+del quantity_df
 
-# Merge with participant map
-quantity_df = quantity_df.merge(
-    participant_map[['DUID', 'DISPATCHTYPE', 'TESLA_AUTOBIDDER']],
-    on='DUID', how='left'
-)
-
-# Exclude VPP bidder
-quantity_df = quantity_df[quantity_df['DUID'] != 'VSSEL1V1']
-
-# Add bidder category
-quantity_df['BIDDER_CATEGORY'] = quantity_df.apply(categorize_bidder, axis=1)
-
-# Define quantity bands
-quantity_bands = ['BANDAVAIL1', 'BANDAVAIL2', 'BANDAVAIL3', 'BANDAVAIL4', 'BANDAVAIL5',
-                  'BANDAVAIL6', 'BANDAVAIL7', 'BANDAVAIL8', 'BANDAVAIL9', 'BANDAVAIL10']
-
-# Sort by auction identifiers and OFFERDATE
-quantity_df = quantity_df.sort_values(['DUID', 'SETTLEMENTDATE', 'BIDTYPE', 'OFFERDATE', 'PERIODID']).reset_index(drop=True)
-
-# For each auction (DUID, SETTLEMENTDATE, BIDTYPE), count true rebids
-# A true rebid is when at least one quantity band changed from the previous offer
-# Using vectorized operations for efficiency
+for col in ['BIDTYPE', 'DUID', 'DIRECTION']:
+    true_rebid_counts[col] = true_rebid_counts[col].astype(str)
+true_rebid_counts['SETTLEMENTDATE'] = pd.to_datetime(true_rebid_counts['SETTLEMENTDATE'], unit='s')
 
-print("Counting true rebids (where quantity bands changed)...")
-
-# Create group identifier
-quantity_df['auction_id'] = (
-    quantity_df['DUID'].astype(str) + '_' +
-    quantity_df['SETTLEMENTDATE'].astype(str) + '_' +
-    quantity_df['BIDTYPE'].astype(str) + '_' +
-    quantity_df['PERIODID'].astype(str)
-)
-
-# For each quantity band, check if it changed from the previous row within the same auction
-# First, shift all bands within each auction group
-for band in quantity_bands:
-    print(band)
-    quantity_df[f'{band}_prev'] = quantity_df.groupby('auction_id')[band].shift(1)
-
-# Check if any band changed (comparing current to previous)
-# A row is a true rebid if it's not the first in its group AND at least one band changed
-quantity_df['is_same_auction'] = quantity_df['auction_id'] == quantity_df['auction_id'].shift(1)
-
-# Check if any band changed
-band_changed_cols = []
-for band in quantity_bands:
-    col_name = f'{band}_changed'
-    quantity_df[col_name] = (quantity_df[band] != quantity_df[f'{band}_prev'])
-    band_changed_cols.append(col_name)
-
-# A true rebid occurs when: same auction as previous row AND at least one band changed
-quantity_df['is_true_rebid'] = quantity_df['is_same_auction'] & quantity_df[band_changed_cols].any(axis=1)
-
-# Count true rebids per auction
-true_rebid_counts = quantity_df.groupby(['BIDDER_CATEGORY', 'BIDTYPE', 'SETTLEMENTDATE', 'DUID', 'PERIODID'])['is_true_rebid'].sum().reset_index(name='num_true_rebids')
-
-# Clean up temporary columns
-quantity_df = quantity_df.drop(columns=['auction_id', 'is_same_auction', 'is_true_rebid'] +
-                                        [f'{band}_prev' for band in quantity_bands] +
-                                        band_changed_cols)
+# Add bidder category (excluding the VPP bidder)
+true_rebid_counts = add_bidder_category(true_rebid_counts, participant_map=participant_map)
+true_rebids_key = input_hash(true_rebid_counts, Path(__file__))
 
 print(f"Processed {len(true_rebid_counts)} auctions")
 
@@ -474,7 +411,7 @@ print("(For each unit in each FCAS market, what's their average true rebids per
 print("=" * 100)
 
 # First, calculate average true rebids per unit per market (across all settlement dates)
-unit_market_avg = true_rebid_counts.groupby(['BIDDER_CATEGORY', 'BIDTYPE', 'DUID']).agg({
+unit_market_avg = true_rebid_counts.groupby(['BIDDER_CATEGORY', 'BIDTYPE', 'DUID'], observed=True).agg({
     'num_true_rebids': ['mean', 'median', 'std', 'count']
 }).reset_index()
 unit_market_avg.columns = ['BIDDER_CATEGORY', 'BIDTYPE', 'DUID', 'mean_rebids', 'median_rebids', 'std_rebids', 'num_auctions']
@@ -523,194 +460,200 @@ for cat in battery_categories:
 # TRUE REBIDS: BOX PLOTS BY CATEGORY (ALL FCAS)
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(10, 6))
+figure_path = true_rebids_dir / 'true_rebids_boxplot_all_fcas.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, ax = plt.subplots(figsize=(10, 6))
 
-plot_data = [true_rebid_counts[true_rebid_counts['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in all_categories]
-bp = ax.boxplot(plot_data, labels=all_categories, patch_artist=True)
+    plot_data = [true_rebid_counts[true_rebid_counts['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in all_categories]
+    bp = ax.boxplot(plot_data, labels=all_categories, patch_artist=True)
 
-for patch, color in zip(bp['boxes'], category_colors):
-    patch.set_facecolor(color)
-    patch.set_alpha(0.7)
+    for patch, color in zip(bp['boxes'], category_colors):
+        patch.set_facecolor(color)
+        patch.set_alpha(0.7)
 
-ax.set_title('Distribution of TRUE Rebids per Auction by Bidder Category (All FCAS)')
-ax.set_ylabel('Number of True Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Distribution of TRUE Rebids per Auction by Bidder Category (All FCAS)')
+    ax.set_ylabel('Number of True Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_boxplot_all_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("\nTrue rebids box plot saved to 'figures/rebids/true_rebids/true_rebids_boxplot_all_fcas.png'")
+    print("\nTrue rebids box plot saved to 'figures/rebids/true_rebids/true_rebids_boxplot_all_fcas.png'")
 
 # =============================================================================
 # TRUE REBIDS: BOX PLOTS BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, axes = plt.subplots(2, 5, figsize=(18, 10))
-axes = axes.flatten()
+figure_path = true_rebids_dir / 'true_rebids_boxplot_by_fcas.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, axes = plt.subplots(2, 5, figsize=(18, 10))
+    axes = axes.flatten()
 
-for i, fcas_type in enumerate(fcas_types):
-    ax = axes[i]
-    fcas_data = true_rebid_counts[true_rebid_counts['BIDTYPE'] == fcas_type]
+    for i, fcas_type in enumerate(fcas_types):
+        ax = axes[i]
+        fcas_data = true_rebid_counts[true_rebid_counts['BIDTYPE'] == fcas_type]
 
-    plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in all_categories]
+        plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in all_categories]
 
-    plot_data_filtered = []
-    labels_filtered = []
-    colors_filtered = []
-    for j, data in enumerate(plot_data):
-        if len(data) > 0:
-            plot_data_filtered.append(data)
-            labels_filtered.append(all_categories[j][:12])
-            colors_filtered.append(category_colors[j])
+        plot_data_filtered = []
+        labels_filtered = []
+        colors_filtered = []
+        for j, data in enumerate(plot_data):
+            if len(data) > 0:
+                plot_data_filtered.append(data)
+                labels_filtered.append(all_categories[j][:12])
+                colors_filtered.append(category_colors[j])
 
-    if plot_data_filtered:
-        bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
-        for patch, color in zip(bp['boxes'], colors_filtered):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
+        if plot_data_filtered:
+            bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
+            for patch, color in zip(bp['boxes'], colors_filtered):
+                patch.set_facecolor(color)
+                patch.set_alpha(0.7)
 
-    ax.set_title(fcas_type, fontsize=10)
-    ax.tick_params(axis='x', rotation=45, labelsize=7)
-    ax.grid(axis='y', alpha=0.3)
+        ax.set_title(fcas_type, fontsize=10)
+        ax.tick_params(axis='x', rotation=45, labelsize=7)
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of TRUE Rebids per Auction by FCAS Type', fontsize=12)
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_boxplot_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of TRUE Rebids per Auction by FCAS Type', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("True rebids box plots by FCAS type saved to 'figures/rebids/true_rebids/true_rebids_boxplot_by_fcas.png'")
+    print("True rebids box plots by FCAS type saved to 'figures/rebids/true_rebids/true_rebids_boxplot_by_fcas.png'")
 
 # =============================================================================
 # TRUE REBIDS: BAR CHART - MEDIAN BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(14, 6))
+figure_path = true_rebids_dir / 'true_rebids_median_bar_by_fcas.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, ax = plt.subplots(figsize=(14, 6))
 
-x = np.arange(len(fcas_types))
-width = 0.25
+    x = np.arange(len(fcas_types))
+    width = 0.25
 
-for j, cat in enumerate(all_categories):
-    medians = []
-    for fcas_type in fcas_types:
-        fcas_cat_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
-                                           (true_rebid_counts['BIDDER_CATEGORY'] == cat)]['num_true_rebids']
-        medians.append(fcas_cat_data.median() if len(fcas_cat_data) > 0 else 0)
+    for j, cat in enumerate(all_categories):
+        medians = []
+        for fcas_type in fcas_types:
+            fcas_cat_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
+                                               (true_rebid_counts['BIDDER_CATEGORY'] == cat)]['num_true_rebids']
+            medians.append(fcas_cat_data.median() if len(fcas_cat_data) > 0 else 0)
 
-    ax.bar(x + j * width, medians, width, label=cat, color=category_colors[j], alpha=0.7)
+        ax.bar(x + j * width, medians, width, label=cat, color=category_colors[j], alpha=0.7)
 
-ax.set_xticks(x + width)
-ax.set_xticklabels(fcas_types, rotation=45, ha='right')
-ax.legend(loc='upper right')
+    ax.set_xticks(x + width)
+    ax.set_xticklabels(fcas_types, rotation=45, ha='right')
+    ax.legend(loc='upper right')
 
-ax.set_title('Median Number of TRUE Rebids per Auction by FCAS Type')
-ax.set_xlabel('FCAS Type')
-ax.set_ylabel('Median Number of True Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Median Number of TRUE Rebids per Auction by FCAS Type')
+    ax.set_xlabel('FCAS Type')
+    ax.set_ylabel('Median Number of True Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_median_bar_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("True rebids median bar chart saved to 'figures/rebids/true_rebids/true_rebids_median_bar_by_fcas.png'")
+    print("True rebids median bar chart saved to 'figures/rebids/true_rebids/true_rebids_median_bar_by_fcas.png'")
 
 # =============================================================================
 # TRUE REBIDS: BAR CHART - MEAN BY CATEGORY AND FCAS TYPE
 # =============================================================================
 
-fig, ax = plt.subplots(figsize=(14, 6))
+figure_path = true_rebids_dir / 'true_rebids_mean_bar_by_fcas.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, ax = plt.subplots(figsize=(14, 6))
 
-x = np.arange(len(fcas_types))
-width = 0.25
+    x = np.arange(len(fcas_types))
+    width = 0.25
 
-for j, cat in enumerate(all_categories):
-    means = []
-    for fcas_type in fcas_types:
-        fcas_cat_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
-                                           (true_rebid_counts['BIDDER_CATEGORY'] == cat)]['num_true_rebids']
-        means.append(fcas_cat_data.mean() if len(fcas_cat_data) > 0 else 0)
+    for j, cat in enumerate(all_categories):
+        means = []
+        for fcas_type in fcas_types:
+            fcas_cat_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
+                                               (true_rebid_counts['BIDDER_CATEGORY'] == cat)]['num_true_rebids']
+            means.append(fcas_cat_data.mean() if len(fcas_cat_data) > 0 else 0)
 
-    ax.bar(x + j * width, means, width, label=cat, color=category_colors[j], alpha=0.7)
+        ax.bar(x + j * width, means, width, label=cat, color=category_colors[j], alpha=0.7)
 
-ax.set_xticks(x + width)
-ax.set_xticklabels(fcas_types, rotation=45, ha='right')
-ax.legend(loc='upper right')
+    ax.set_xticks(x + width)
+    ax.set_xticklabels(fcas_types, rotation=45, ha='right')
+    ax.legend(loc='upper right')
 
-ax.set_title('Mean Number of TRUE Rebids per Auction by FCAS Type')
-ax.set_xlabel('FCAS Type')
-ax.set_ylabel('Mean Number of True Rebids')
-ax.grid(axis='y', alpha=0.3)
+    ax.set_title('Mean Number of TRUE Rebids per Auction by FCAS Type')
+    ax.set_xlabel('FCAS Type')
+    ax.set_ylabel('Mean Number of True Rebids')
+    ax.grid(axis='y', alpha=0.3)
 
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_mean_bar_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("True rebids mean bar chart saved to 'figures/rebids/true_rebids/true_rebids_mean_bar_by_fcas.png'")
+    print("True rebids mean bar chart saved to 'figures/rebids/true_rebids/true_rebids_mean_bar_by_fcas.png'")
 
 # =============================================================================
 # TRUE REBIDS: HISTOGRAMS BY CATEGORY
 # =============================================================================
 
-fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+figure_path = true_rebids_dir / 'true_rebids_histogram_by_category.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
 
-for i, cat in enumerate(all_categories):
-    ax = axes[i]
-    cat_data = true_rebid_counts[true_rebid_counts['BIDDER_CATEGORY'] == cat]['num_true_rebids']
+    for i, cat in enumerate(all_categories):
+        ax = axes[i]
+        cat_data = true_rebid_counts[true_rebid_counts['BIDDER_CATEGORY'] == cat]['num_true_rebids']
 
-    max_val = int(cat_data.max()) if len(cat_data) > 0 and cat_data.max() > 0 else 1
-    ax.hist(cat_data, bins=range(0, max_val + 2), color=category_colors[i],
-            alpha=0.7, edgecolor='black')
-    ax.set_title(f'{cat}\n(n={len(cat_data)}, median={cat_data.median():.0f})')
-    ax.set_xlabel('Number of True Rebids')
-    ax.set_ylabel('Frequency')
-    ax.grid(axis='y', alpha=0.3)
+        max_val = int(cat_data.max()) if len(cat_data) > 0 and cat_data.max() > 0 else 1
+        ax.hist(cat_data, bins=range(0, max_val + 2), color=category_colors[i],
+                alpha=0.7, edgecolor='black')
+        ax.set_title(f'{cat}\n(n={len(cat_data)}, median={cat_data.median():.0f})')
+        ax.set_xlabel('Number of True Rebids')
+        ax.set_ylabel('Frequency')
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of TRUE Rebids per Auction (All FCAS)', fontsize=12)
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_histogram_by_category.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of TRUE Rebids per Auction (All FCAS)', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("True rebids histograms saved to 'figures/rebids/true_rebids/true_rebids_histogram_by_category.png'")
+    print("True rebids histograms saved to 'figures/rebids/true_rebids/true_rebids_histogram_by_category.png'")
 
 # =============================================================================
 # TRUE REBIDS: BATTERIES ONLY BOX PLOTS BY FCAS TYPE
 # =============================================================================
 
-fig, axes = plt.subplots(2, 5, figsize=(18, 10))
-axes = axes.flatten()
+figure_path = true_rebids_dir / 'true_rebids_boxplot_batteries_by_fcas.png'
+if figure_is_stale(figure_path, true_rebids_key):
+    fig, axes = plt.subplots(2, 5, figsize=(18, 10))
+    axes = axes.flatten()
 
-for i, fcas_type in enumerate(fcas_types):
-    ax = axes[i]
-    fcas_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
-                                   (true_rebid_counts['BIDDER_CATEGORY'].isin(battery_categories))]
+    for i, fcas_type in enumerate(fcas_types):
+        ax = axes[i]
+        fcas_data = true_rebid_counts[(true_rebid_counts['BIDTYPE'] == fcas_type) &
+                                       (true_rebid_counts['BIDDER_CATEGORY'].isin(battery_categories))]
 
-    plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in battery_categories]
+        plot_data = [fcas_data[fcas_data['BIDDER_CATEGORY'] == cat]['num_true_rebids'] for cat in battery_categories]
 
-    plot_data_filtered = []
-    labels_filtered = []
-    colors_filtered = []
-    for j, data in enumerate(plot_data):
-        if len(data) > 0:
-            plot_data_filtered.append(data)
-            labels_filtered.append(battery_categories[j][:12])
-            colors_filtered.append(battery_colors[j])
+        plot_data_filtered = []
+        labels_filtered = []
+        colors_filtered = []
+        for j, data in enumerate(plot_data):
+            if len(data) > 0:
+                plot_data_filtered.append(data)
+                labels_filtered.append(battery_categories[j][:12])
+                colors_filtered.append(battery_colors[j])
 
-    if plot_data_filtered:
-        bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
-        for patch, color in zip(bp['boxes'], colors_filtered):
-            patch.set_facecolor(color)
-            patch.set_alpha(0.7)
+        if plot_data_filtered:
+            bp = ax.boxplot(plot_data_filtered, labels=labels_filtered, patch_artist=True)
+            for patch, color in zip(bp['boxes'], colors_filtered):
+                patch.set_facecolor(color)
+                patch.set_alpha(0.7)
 
-    ax.set_title(fcas_type, fontsize=10)
-    ax.tick_params(axis='x', rotation=45, labelsize=7)
-    ax.grid(axis='y', alpha=0.3)
+        ax.set_title(fcas_type, fontsize=10)
+        ax.tick_params(axis='x', rotation=45, labelsize=7)
+        ax.grid(axis='y', alpha=0.3)
 
-plt.suptitle('Distribution of TRUE Rebids per Auction - Batteries Only', fontsize=12)
-plt.tight_layout()
-plt.savefig(true_rebids_dir / 'true_rebids_boxplot_batteries_by_fcas.png', dpi=150, bbox_inches='tight')
-plt.close()
+    plt.suptitle('Distribution of TRUE Rebids per Auction - Batteries Only', fontsize=12)
+    plt.tight_layout()
+    save_figure(fig, figure_path, true_rebids_key, figure_manifest, args.force, dpi=150, bbox_inches='tight')
 
-print("True rebids battery-only box plots saved to 'figures/rebids/true_rebids/true_rebids_boxplot_batteries_by_fcas.png'")
+    print("True rebids battery-only box plots saved to 'figures/rebids/true_rebids/true_rebids_boxplot_batteries_by_fcas.png'")
 
 # =============================================================================
 # TRUE REBIDS: SUMMARY TABLES
@@ -793,3 +736,49 @@ for cat in all_categories:
     if len(cat_with_rebids) > 0:
         avg_pct = cat_with_rebids['pct_true'].mean()
         print(f"  {cat}: {avg_pct:.1f}% of rebids are true rebids")
+
+# =============================================================================
+# TRUE REBIDS: BAND CHANGE ATTRIBUTION
+# =============================================================================
+
+print("\n\n" + "=" * 100)
+print("TRUE REBIDS: Which bands changed and where the MW went")
+print("(MW moved between bands, and whether it moved to dearer or cheaper price bands)")
+print("=" * 100)
+
+# Per-band attribution is precomputed in the analytics database
+# (nem_db.rebid_band_change), so only one row per DUID and service comes back
+db_con = connect_analytics_db(tables=["rebid_band_change"])
+band_change_df = db_con.execute(f"""
+SELECT DUID, BIDTYPE,
+    count(*) AS num_true_rebids,
+    sum(bit_count(CHANGED_BANDS)) AS bands_changed,
+    sum(MW_MOVED) AS mw_moved,
+    count(*) FILTER (WHERE SHIFT_DIRECTION = 1) AS to_dearer,
+    count(*) FILTER (WHERE SHIFT_DIRECTION = -1) AS to_cheaper,
+    sum(greatest(BANDDELTA10, 0)) AS mw_to_top_band
+FROM rebid_band_change
+{where_sql({'BIDTYPE': FCAS_BIDTYPES})}
+GROUP BY DUID, BIDTYPE
+""").fetchdf()
+db_con.close()
+
+band_change_df = add_bidder_category(band_change_df, participant_map=participant_map)
+band_change_summary = band_change_df.groupby('BIDDER_CATEGORY', observed=True)[
+    ['num_true_rebids', 'bands_changed', 'mw_moved', 'to_dearer', 'to_cheaper', 'mw_to_top_band']
+].sum()
+
+for cat in all_categories:
+    if cat not in band_change_summary.index:
+        continue
+    row = band_change_summary.loc[cat]
+    n = max(row['num_true_rebids'], 1)
+    print(f"\n{cat}:")
+    print(f"  True rebids: {row['num_true_rebids']:.0f}")
+    print(f"  Mean bands changed per rebid: {row['bands_changed'] / n:.2f}")
+    print(f"  Mean MW moved between bands per rebid: {row['mw_moved'] / n:.2f}")
+    print(f"  Moved MW to dearer bands: {row['to_dearer'] / n * 100:.1f}% of rebids")
+    print(f"  Moved MW to cheaper bands: {row['to_cheaper'] / n * 100:.1f}% of rebids")
+    print(f"  MW added to the top (price cap) band: {row['mw_to_top_band']:.0f}")
+
+save_manifest(figure_manifest)
@@ -1,436 +1,380 @@
-'''  Purpose: Visualizes how battery bidders change their FCAS bid curves over time through rebids.                                                              
-                                                                                                                                                              
-  What it does:                                                                                                                                               
-  1. Loads bid data from BIDDAYOFFER (prices) and BIDOFFERPERIOD (quantities) for two selected batteries:                                                     
-    - HPR1 (Hornsdale Power Reserve) - an autobidder battery                                                                                                  
-    - HVWWBA1 (Hazelwood BESS) - a non-autobidder battery                                                                                                     
-  2. Filters to "true rebids" - only keeps bids where quantity bands actually changed from the previous bid (not just resubmissions with identical values)    
-  3. Generates bid curve plots for each 5-minute dispatch period showing:                                                                                     
-    - X-axis: Cumulative quantity (MW)                                                                                                                        
-    - Y-axis: Price ($/MWh)                                                                                                                                   
-    - Each rebid within a period is a different colored line (using viridis colormap)                                                                         
-    - Shows how the bid curve shifts throughout the period                                                                                                    
-  4. Creates two versions of plots:                                                                                                                           
-    - Full (all 10 price bands)                                                                                                                               
-    - Condensed (bands 1-7 only, for clearer visualization)                                                                                                   
-                                                                                                                                                              
-  Output: Saves PNG figures to figures/bid_curves/{DUID}/ and figures/bid_curves/{DUID}_condensed/                                                            
-                                                                                                                                                              
-  Selected FCAS market: RAISEREG (raise regulation service)  
+'''  Purpose: Visualizes how battery bidders change their FCAS bid curves over time through rebids.
+
+  What it does:
+  1. Plans the work as (DUID, BIDTYPE, day) tasks from lists or globs of DUIDs,
+     BIDTYPEs and dates (default: the two reference batteries, RAISEREG, every day):
+    - HPR1 (Hornsdale Power Reserve) - an autobidder battery
+    - HVWWBA1 (Hazelwood BESS) - a non-autobidder battery
+  2. Loads bid data (BIDDAYOFFER prices joined to BIDOFFERPERIOD quantities, pre-joined in the
+     analytics database, see nem_db.py) once per DUID/BIDTYPE for all of its planned days.
+  3. Filters to "true rebids" - only keeps bids where quantity bands actually changed from the previous bid (not just resubmissions with identical values)
+  4. Generates bid curve plots for each 5-minute dispatch period showing:
+    - X-axis: Cumulative quantity (MW)
+    - Y-axis: Price ($/MWh)
+    - Each rebid within a period is a different colored line (using viridis colormap)
+    - Shows how the bid curve shifts throughout the period
+     Every task's periods are rendered on one shared, bounded pool of Agg
+     worker processes (see bid_curves.py); the figures/sec rate is printed for each batch.
+  5. Creates two versions of plots:
+    - Full (all 10 price bands)
+    - Condensed (bands 1-7 only, for clearer visualization)
+
+  Output: Saves PNG figures to figures/bid_curves/{DUID}/ and figures/bid_curves/{DUID}_condensed/
+     With --archive, writes one {DUID}_{BIDTYPE}_{YYYYMMDD}.json.gz per day to
+     figures/bid_curves/archive/ instead, plus index.html to browse them.
+     With --density, draws every offer curve of each DUID/BIDTYPE as one log-scaled
+     density image in figures/bid_curves/density/ instead.
+     With --animate, streams each DUID/BIDTYPE's curves into one GIF (or MP4) in
+     figures/bid_curves/animations/ instead, one frame per period or offer.
+
+  Finished tasks are appended to figures/bid_curves/_checkpoint.jsonl; --resume
+  skips them, so an interrupted run picks up where it stopped.
+
+  Usage:
+    python code/data_analysis/viz_bids.py              # one worker per core
+    python code/data_analysis/viz_bids.py --duids 'HPR*' HVWWBA1 --bidtypes 'RAISE*' \\
+        --dates 2025-10-01:2025-10-07 2025-10-15      # globs, ranges and single days
+    python code/data_analysis/viz_bids.py --plan       # list the planned tasks only
+    python code/data_analysis/viz_bids.py --resume     # skip tasks finished by an earlier run
+    python code/data_analysis/viz_bids.py --workers 4  # 1 renders in-process
+    python code/data_analysis/viz_bids.py --fixed-layout  # fixed axes, no tight layout (fastest)
+    python code/data_analysis/viz_bids.py --force      # re-render unchanged figures too
+    python code/data_analysis/viz_bids.py --archive    # curve archives + viewer, no PNGs
+    python code/data_analysis/viz_bids.py --density --dates 2025-10-01:2025-10-31
+    python code/data_analysis/viz_bids.py --animate period --dates 2025-10-01
+    python code/data_analysis/viz_bids.py --animate offer --animation-format mp4  # needs ffmpeg
+
+  Reruns only render periods whose offers (or the plotting code) changed.
   '''
-import pandas as pd
-import duckdb
-import matplotlib.pyplot as plt
-import numpy as np
-import os
+import argparse
+import json
 import sys
+import time
+from fnmatch import fnmatchcase
 from pathlib import Path
-from matplotlib.cm import ScalarMappable
-from matplotlib.colors import Normalize
+
+import pandas as pd
 
 # Add parent directory to path for config import
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import BIDDAYOFFER_PATH, BIDOFFERPERIOD_PATH, DUID_MAP_PATH, FIGURES_DIR
+from config import FIGURES_DIR
+from bid_curves import (ANIMATION_MODES, export_curve_archive, render_animations,
+                        render_bid_curves, render_density_heatmap, render_pool)
+from figure_cache import load_manifest, save_manifest
+from nem_db import connect as connect_analytics_db, read_offer_versions
+from rebids import AUCTION_KEY, band_hash, flag_true_rebids
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
-# File paths (from config)
-biddayofferperiod = str(BIDDAYOFFER_PATH)
-bidofferperiod = str(BIDOFFERPERIOD_PATH)
-
-# Selected batteries for analysis
-selected_autobidder = 'HPR1'  # Hornsdale Power Reserve
-selected_non_autobidder = 'HVWWBA1'  # Hazelwood BESS
-selected_duids = [selected_autobidder, selected_non_autobidder]
-
-# Selected FCAS type
-selected_fcas = 'RAISEREG'
+# Default batteries for analysis
+DEFAULT_DUIDS = [
+    'HPR1',  # Hornsdale Power Reserve (autobidder)
+    'HVWWBA1',  # Hazelwood BESS (non-autobidder)
+]
 
-print(f"Selected autobidder: {selected_autobidder}")
-print(f"Selected non-autobidder: {selected_non_autobidder}")
-print(f"Selected FCAS: {selected_fcas}")
-
-# =============================================================================
-# USE DUCKDB FOR EFFICIENT MERGE AND FILTERING
-# =============================================================================
-
-con = duckdb.connect()
-
-# Create a single efficient query that:
-# 1. Reads both CSVs
-# 2. Filters for selected DUIDs and FCAS type early
-# 3. Joins price and quantity bands
-# 4. Returns only the data we need
-
-duids_str = ", ".join([f"'{d}'" for d in selected_duids])
-
-merged_query = f"""
-WITH price_bands AS (
-    SELECT
-        BIDTYPE, SETTLEMENTDATE, DUID, DIRECTION, OFFERDATE,
-        PRICEBAND1, PRICEBAND2, PRICEBAND3, PRICEBAND4, PRICEBAND5,
-        PRICEBAND6, PRICEBAND7, PRICEBAND8, PRICEBAND9, PRICEBAND10
-    FROM read_csv_auto('{biddayofferperiod}',
-        header=true,
-        skip=1,
-        delim=',',
-        strict_mode=false,
-        ignore_errors=true
-    )
-    WHERE DUID IN ({duids_str})
-    AND BIDTYPE = '{selected_fcas}'
-),
-quantity_bands AS (
-    SELECT
-        BIDTYPE, TRADINGDATE AS SETTLEMENTDATE, DUID, DIRECTION, OFFERDATETIME AS OFFERDATE, PERIODID,
-        BANDAVAIL1, BANDAVAIL2, BANDAVAIL3, BANDAVAIL4, BANDAVAIL5,
-        BANDAVAIL6, BANDAVAIL7, BANDAVAIL8, BANDAVAIL9, BANDAVAIL10
-    FROM read_csv_auto('{bidofferperiod}',
-        header=true,
-        skip=1,
-        delim=',',
-        strict_mode=false,
-        ignore_errors=true
-    )
-    WHERE DUID IN ({duids_str})
-    AND BIDTYPE = '{selected_fcas}'
-)
-SELECT
-    q.DUID,
-    q.BIDTYPE,
-    q.SETTLEMENTDATE,
-    q.PERIODID,
-    q.OFFERDATE,
-    q.DIRECTION,
-    q.BANDAVAIL1, q.BANDAVAIL2, q.BANDAVAIL3, q.BANDAVAIL4, q.BANDAVAIL5,
-    q.BANDAVAIL6, q.BANDAVAIL7, q.BANDAVAIL8, q.BANDAVAIL9, q.BANDAVAIL10,
-    p.PRICEBAND1, p.PRICEBAND2, p.PRICEBAND3, p.PRICEBAND4, p.PRICEBAND5,
-    p.PRICEBAND6, p.PRICEBAND7, p.PRICEBAND8, p.PRICEBAND9, p.PRICEBAND10
-FROM quantity_bands q
-INNER JOIN price_bands p
-    ON q.DUID = p.DUID
-    AND q.SETTLEMENTDATE = p.SETTLEMENTDATE
-    AND q.DIRECTION = p.DIRECTION
-    AND q.BIDTYPE = p.BIDTYPE
-    AND q.OFFERDATE = p.OFFERDATE
-ORDER BY q.DUID, q.SETTLEMENTDATE, q.PERIODID, q.OFFERDATE
-"""
-
-print("\nExecuting merged query (this may take a moment)...")
-merged_df = con.execute(merged_query).fetchdf()
-print(f"Merged dataset has {len(merged_df)} records")
-
-# =============================================================================
-# FILTER TO ONLY KEEP TRUE REBIDS (where quantity bands actually change)
-# =============================================================================
+# Default FCAS type
+DEFAULT_BIDTYPES = ['RAISEREG']
 
 quantity_bands = ['BANDAVAIL1', 'BANDAVAIL2', 'BANDAVAIL3', 'BANDAVAIL4', 'BANDAVAIL5',
                   'BANDAVAIL6', 'BANDAVAIL7', 'BANDAVAIL8', 'BANDAVAIL9', 'BANDAVAIL10']
 
-# Sort by auction identifiers and OFFERDATE
-merged_df = merged_df.sort_values(['DUID', 'SETTLEMENTDATE', 'PERIODID', 'OFFERDATE'])
-
-# For each auction (DUID, SETTLEMENTDATE, PERIODID), check if quantity bands changed from previous row
-# Keep the first row (initial bid) and any row where at least one BANDAVAIL changed
+# Condensed plots draw bands 1-7 only
+condensed_bands = 7
 
-def filter_true_rebids(group):
-    """Keep only rows where quantity bands changed from the previous row (or first row)."""
-    if len(group) <= 1:
-        return group
+# Finished tasks, one JSON object per line (see --resume)
+CHECKPOINT_PATH = FIGURES_DIR / 'bid_curves' / '_checkpoint.jsonl'
 
-    # Always keep the first row (initial bid)
-    keep_mask = [True]
-
-    # Compare each subsequent row to the previous one
-    for i in range(1, len(group)):
-        prev_row = group.iloc[i-1]
-        curr_row = group.iloc[i]
+# =============================================================================
+# PLAN (DUID, BIDTYPE, DAY) TASKS
+# =============================================================================
 
-        # Check if any quantity band changed
-        changed = False
-        for band in quantity_bands:
-            if prev_row[band] != curr_row[band]:
-                changed = True
-                break
+def available_days(con):
+    """Every (DUID, BIDTYPE, SETTLEMENTDATE) with offers in the analytics database."""
+    return con.execute("""
+        SELECT DISTINCT DUID, BIDTYPE, SETTLEMENTDATE
+        FROM offer_version
+        ORDER BY DUID, BIDTYPE, SETTLEMENTDATE
+    """).fetchdf()
 
-        keep_mask.append(changed)
 
-    return group[keep_mask]
+def _matches(value, patterns):
+    """True if value matches any of the glob patterns."""
+    return any(fnmatchcase(value, pattern) for pattern in patterns)
 
-print("Filtering to keep only true rebids (where quantity bands changed)...")
-original_count = len(merged_df)
-merged_df = merged_df.groupby(['DUID', 'SETTLEMENTDATE', 'PERIODID'], group_keys=False).apply(filter_true_rebids)
-merged_df = merged_df.reset_index(drop=True)
-filtered_count = len(merged_df)
-print(f"Filtered from {original_count} to {filtered_count} records ({original_count - filtered_count} non-changing rebids removed)")
 
-# Get FCAS types available (for reference)
-print(f"\nFCAS type: {selected_fcas}")
+def _day_matches(day, patterns):
+    """True if day matches any date pattern: YYYY-MM-DD glob or FIRST:LAST range (inclusive)."""
+    day_str = f'{day:%Y-%m-%d}'
+    for pattern in patterns:
+        if ':' in pattern:
+            first, last = pattern.split(':', 1)
+            if (not first or day >= pd.Timestamp(first)) and (not last or day <= pd.Timestamp(last)):
+                return True
+        elif fnmatchcase(day_str, pattern):
+            return True
+    return False
 
-# =============================================================================
-# CREATE BID CURVE PLOTTING FUNCTION
-# =============================================================================
 
-def plot_bid_curve(data, duid, fcas_type, settlement_date, period_id, output_dir):
+def plan_tasks(available, duids, bidtypes, dates=None):
     """
-    Plot bid curves for all rebids in a given period.
-    Each rebid is a different line on the same plot.
-    X-axis: Cumulative quantity (MW)
-    Y-axis: Price ($/MWh)
+    (DUID, BIDTYPE, day) tasks for the available days matching the patterns,
+    in DUID/BIDTYPE/day order. dates=None selects every day.
     """
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Get all rebids for this period (different OFFERDATEs)
-    rebids = data.sort_values('OFFERDATE')
-    num_rebids = len(rebids)
-
-    # Color map for different rebids
-    colors = plt.cm.viridis(np.linspace(0, 1, max(num_rebids, 1)))
-
-    price_bands = ['PRICEBAND1', 'PRICEBAND2', 'PRICEBAND3', 'PRICEBAND4', 'PRICEBAND5',
-                   'PRICEBAND6', 'PRICEBAND7', 'PRICEBAND8', 'PRICEBAND9', 'PRICEBAND10']
-    # quantity_bands is defined globally above
-
-    for i, (idx, row) in enumerate(rebids.iterrows()):
-        prices = [row[pb] for pb in price_bands]
-        quantities = [row[qb] for qb in quantity_bands]
-
-        # Create step function for bid curve
-        # Cumulative quantity on x-axis
-        cumulative_qty = np.cumsum([0] + quantities)
-        prices_extended = prices + [prices[-1]]  # Extend for step plot
-
-        # Plot as step function
-        offer_time = row['OFFERDATE'].strftime('%H:%M') if pd.notna(row['OFFERDATE']) else 'Unknown'
-        ax.step(cumulative_qty, prices_extended, where='post', color=colors[i],
-                label=f'Rebid {i+1} ({offer_time})', linewidth=1.5, alpha=0.8)
-
-    ax.set_xlabel('Cumulative Quantity (MW)')
-    ax.set_ylabel('Price ($/MWh)')
-    ax.set_title(f'{duid} - {fcas_type}\nPeriod: {settlement_date} Period {period_id}')
-    ax.grid(True, alpha=0.3)
-
-
-    # Add Viridis colorbar legend in the top left
-    sm = ScalarMappable(cmap=plt.cm.viridis, norm=Normalize(vmin=1, vmax=num_rebids))
-    sm.set_array([])
-    cbar = plt.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.02)
-    cbar.set_label('Rebid Index', fontsize=9)
-    cbar.ax.yaxis.set_label_position('left')
-    cbar.ax.yaxis.set_ticks_position('left')
-    cbar.ax.yaxis.set_label_coords(-2.5, 0.5)
-    cbar.ax.tick_params(labelsize=8)
-    cbar.ax.set_position([0.02, 0.55, 0.02, 0.35])  # [left, bottom, width, height] in figure coordinates
-
-    # Only show legend if reasonable number of rebids
-    if num_rebids <= 10:
-        ax.legend(loc='upper left', fontsize=8)
-    else:
-        ax.text(0.02, 0.98, f'{num_rebids} bids shown', transform=ax.transAxes,
-                fontsize=10, verticalalignment='top')
-
-    plt.tight_layout()
-
-    # Create filename from settlement_date and period_id
-    period_str = pd.to_datetime(settlement_date).strftime('%Y%m%d_%H%M')
-    filename = f'{output_dir}/{duid}_{fcas_type}_{period_str}_period{period_id}.png'
-    plt.savefig(filename, dpi=100, bbox_inches='tight')
-    plt.close()
-
-    return filename
+    tasks = []
+    for duid, bidtype, day in available.itertuples(index=False):
+        day = pd.Timestamp(day)
+        if not _matches(duid, duids) or not _matches(bidtype, bidtypes):
+            continue
+        if dates is not None and not _day_matches(day, dates):
+            continue
+        tasks.append((duid, bidtype, day))
+    return tasks
+
+
+def group_units(tasks):
+    """{(DUID, BIDTYPE): [days]} in task order."""
+    units = {}
+    for duid, bidtype, day in tasks:
+        units.setdefault((duid, bidtype), []).append(day)
+    return units
 
 # =============================================================================
-# GENERATE BID CURVES FOR SELECTED BATTERIES
+# CHECKPOINT / RESUME
 # =============================================================================
 
-for duid in selected_duids:
-    print(f"\n{'='*60}")
-    print(f"Generating bid curves for {duid}")
-    print('='*60)
-
-    # Create output directory
-    output_dir = FIGURES_DIR / 'bid_curves' / duid
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_dir = str(output_dir)  # Convert to string for f-string compatibility
-
-    # Filter for this DUID (already filtered by FCAS in query)
-    duid_data = merged_df[merged_df['DUID'] == duid]
-
-    if len(duid_data) == 0:
-        print(f"No data found for {duid} - {selected_fcas}")
-        continue
-
-    # Get unique periods (SETTLEMENTDATE + PERIODID combinations)
-    # PERIODID identifies the 5-minute interval within a day (1-288)
-    periods = duid_data[['SETTLEMENTDATE', 'PERIODID']].drop_duplicates()
+def checkpoint_key(mode, duid, bidtype, days):
+    """Checkpoint entry for one task: a single day, or FIRST:LAST for whole-range outputs."""
+    days = f'{days[0]:%Y-%m-%d}:{days[-1]:%Y-%m-%d}' if isinstance(days, list) else f'{days:%Y-%m-%d}'
+    return f'{mode} {duid} {bidtype} {days}'
 
-    print(f"Found {len(periods)} unique periods for {selected_fcas}")
 
-    # Generate bid curves for each period
-    count = 0
-    for _, period_row in periods.iterrows():
-        settlement_date = period_row['SETTLEMENTDATE']
-        period_id = period_row['PERIODID']
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """Keys of the tasks finished by earlier runs (empty if there is no checkpoint)."""
+    if not path.exists():
+        return set()
+    with open(path) as f:
+        return {json.loads(line)['task'] for line in f if line.strip()}
 
-        period_data = duid_data[
-            (duid_data['SETTLEMENTDATE'] == settlement_date) &
-            (duid_data['PERIODID'] == period_id)
-        ]
 
-        if len(period_data) > 0:
-            filename = plot_bid_curve(period_data, duid, selected_fcas, settlement_date, period_id, output_dir)
-            count += 1
-
-            if count % 50 == 0:
-                print(f"  Generated {count} figures...")
-
-    print(f"Generated {count} bid curve figures for {duid}")
-    print(f"Saved to: {output_dir}/")
+def mark_done(key, path=CHECKPOINT_PATH):
+    """Append a finished task to the checkpoint (one line, so an interrupted run loses nothing)."""
+    with open(path, 'a') as f:
+        f.write(json.dumps({'task': key, 'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}) + '\n')
 
 # =============================================================================
-# GENERATE CONDENSED BID CURVES (BANDS 1-6 ONLY)
+# LOAD PRE-JOINED OFFERS FROM THE ANALYTICS DATABASE
 # =============================================================================
 
-# Define condensed bands (1-6 only)
-quantity_bands_condensed = ['BANDAVAIL1', 'BANDAVAIL2', 'BANDAVAIL3', 'BANDAVAIL4', 'BANDAVAIL5', 'BANDAVAIL6', 'BANDAVAIL7']
-price_bands_condensed = ['PRICEBAND1', 'PRICEBAND2', 'PRICEBAND3', 'PRICEBAND4', 'PRICEBAND5', 'PRICEBAND6', 'PRICEBAND7']
-
-def plot_bid_curve_condensed(data, duid, fcas_type, settlement_date, period_id, output_dir):
-    """
-    Plot bid curves for all rebids in a given period (bands 1-7 only).
-    Each rebid is a different line on the same plot.
-    X-axis: Cumulative quantity (MW)
-    Y-axis: Price ($/MWh)
+def load_true_rebids(con, duid, bidtype, days):
     """
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Get all rebids for this period (different OFFERDATEs)
-    rebids = data.sort_values('OFFERDATE')
-    num_rebids = len(rebids)
-
-    # Color map for different rebids
-    colors = plt.cm.viridis(np.linspace(0, 1, max(num_rebids, 1)))
-
-    for i, (idx, row) in enumerate(rebids.iterrows()):
-        prices = [row[pb] for pb in price_bands_condensed]
-        quantities = [row[qb] for qb in quantity_bands_condensed]
-
-        # Create step function for bid curve
-        # Cumulative quantity on x-axis
-        cumulative_qty = np.cumsum([0] + quantities)
-        prices_extended = prices + [prices[-1]]  # Extend for step plot
-
-        # Plot as step function
-        offer_time = row['OFFERDATE'].strftime('%H:%M') if pd.notna(row['OFFERDATE']) else 'Unknown'
-        ax.step(cumulative_qty, prices_extended, where='post', color=colors[i],
-                label=f'Rebid {i+1} ({offer_time})', linewidth=1.5, alpha=0.8)
-
-    ax.set_xlabel('Cumulative Quantity (MW)')
-    ax.set_ylabel('Price ($/MWh)')
-    ax.set_title(f'{duid} - {fcas_type} (Bands 1-6)\nPeriod: {settlement_date} Period {period_id}')
-    ax.grid(True, alpha=0.3)
+    Load one unit's offers for the given days and keep only true rebids.
 
+    offer_version_period (nem_db.py) already joins BIDOFFERPERIOD quantity bands
+    to BIDDAYOFFER price bands and is sorted by DUID/BIDTYPE, so this reads only
+    the unit's row groups, once for all of its planned days.
+    """
+    unit_filter = {'DUID': duid, 'BIDTYPE': bidtype, 'SETTLEMENTDATE': list(days)}
 
+    merged_columns = ['DUID', 'BIDTYPE', 'SETTLEMENTDATE', 'PERIODID', 'OFFERDATE', 'DIRECTION'] + \
+        [f'BANDAVAIL{i}' for i in range(1, 11)] + [f'PRICEBAND{i}' for i in range(1, 11)]
 
-    # Add Viridis colorbar legend in the top left
-    sm = ScalarMappable(cmap=plt.cm.viridis, norm=Normalize(vmin=1, vmax=num_rebids))
-    sm.set_array([])
-    cbar = plt.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.02)
-    cbar.set_label('Rebid Index', fontsize=9)
-    cbar.ax.yaxis.set_label_position('left')
-    cbar.ax.yaxis.set_ticks_position('left')
-    cbar.ax.yaxis.set_label_coords(-2.5, 0.5)
-    cbar.ax.tick_params(labelsize=8)
-    cbar.ax.set_position([0.02, 0.55, 0.02, 0.35])  # [left, bottom, width, height] in figure coordinates
+    print(f"\nLoading offer versions for {duid} {bidtype} ({len(days)} day(s))...")
+    merged_df = read_offer_versions(columns=merged_columns, where=unit_filter, con=con)
+    print(f"Merged dataset has {len(merged_df)} records")
 
+    # Sort by auction identifiers and OFFERDATE
+    merged_df = merged_df.sort_values(AUCTION_KEY + ['OFFERDATE'])
 
-    # Only show legend if reasonable number of rebids
-    if num_rebids <= 10:
-        ax.legend(loc='upper left', fontsize=8)
-    else:
-        ax.text(0.02, 0.98, f'{num_rebids} bids shown', transform=ax.transAxes,
-                fontsize=10, verticalalignment='top')
+    # For each auction (AUCTION_KEY, including DIRECTION), check if quantity bands changed from previous row
+    # Keep the first row (initial bid) and any row where at least one BANDAVAIL changed
+    print("Filtering to keep only true rebids (where quantity bands changed)...")
+    original_count = len(merged_df)
+    is_true_rebid, is_initial_bid = flag_true_rebids(
+        [merged_df[c] for c in AUCTION_KEY],
+        band_hash(merged_df[quantity_bands].to_numpy()),
+    )
+    merged_df = merged_df[is_true_rebid | is_initial_bid]
+    merged_df = merged_df.reset_index(drop=True)
+    filtered_count = len(merged_df)
+    print(f"Filtered from {original_count} to {filtered_count} records ({original_count - filtered_count} non-changing rebids removed)")
+    return merged_df
 
-    plt.tight_layout()
+# =============================================================================
+# RENDER ONE TASK
+# =============================================================================
 
-    # Create filename from settlement_date and period_id
-    period_str = pd.to_datetime(settlement_date).strftime('%Y%m%d_%H%M')
-    filename = f'{output_dir}/{duid}_{fcas_type}_{period_str}_period{period_id}.png'
-    plt.savefig(filename, dpi=100, bbox_inches='tight')
-    plt.close()
+def generate_bid_curves(day_df, duid, bidtype, manifest, pool=None, workers=None,
+                        fixed_layout=False, force=False):
+    """
+    Render full (bands 1-10) and condensed (bands 1-7) bid curves for one unit/day.
 
-    return filename
+    Periods whose offers and plotting parameters are unchanged since the last
+    run are skipped (see figure_cache.py) unless force is set.
+    """
+    render_options = dict(workers=workers, fixed_layout=fixed_layout, manifest=manifest,
+                          force=force, pool=pool)
+    for condensed in (False, True):
+        output_dir = FIGURES_DIR / 'bid_curves' / (f'{duid}_condensed' if condensed else duid)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if condensed:
+            count = render_bid_curves(day_df, duid, bidtype, output_dir,
+                                      bands=condensed_bands, title_suffix=' (Bands 1-6)',
+                                      **render_options)
+            print(f"Generated {count} condensed bid curve figures for {duid} {bidtype}")
+        else:
+            count = render_bid_curves(day_df, duid, bidtype, output_dir, **render_options)
+            print(f"Generated {count} bid curve figures for {duid} {bidtype}")
+        print(f"Saved to: {output_dir}/")
+
+
+def export_bid_curves(day_df, duid, bidtype):
+    """
+    Write one unit/day as a curve archive (all 10 bands; the viewer can
+    condense to bands 1-7) to figures/bid_curves/archive/.
+    """
+    output_dir = FIGURES_DIR / 'bid_curves' / 'archive'
+    paths = export_curve_archive(day_df, duid, bidtype, output_dir)
+    size_kb = sum(path.stat().st_size for path in paths) / 1024
+    print(f"Exported {len(paths)} curve archive(s) for {duid} {bidtype} ({size_kb:.0f} KB) to {output_dir}/")
 
-# Generate condensed bid curves for each DUID
-for duid in selected_duids:
-    print(f"\n{'='*60}")
-    print(f"Generating CONDENSED bid curves for {duid} (bands 1-7)")
-    print('='*60)
 
-    # Create condensed output directory
-    output_dir = FIGURES_DIR / 'bid_curves' / f'{duid}_condensed'
+def range_output_path(kind, duid, bidtype, days, suffix):
+    """Output path for a density image or animation covering days."""
+    output_dir = FIGURES_DIR / 'bid_curves' / kind
     output_dir.mkdir(parents=True, exist_ok=True)
-    output_dir = str(output_dir)  # Convert to string for f-string compatibility
-
-    # Filter for this DUID (already filtered by FCAS in query)
-    duid_data = merged_df[merged_df['DUID'] == duid]
-
-    if len(duid_data) == 0:
-        print(f"No data found for {duid} - {selected_fcas}")
-        continue
-
-    # Get unique periods (SETTLEMENTDATE + PERIODID combinations)
-    periods = duid_data[['SETTLEMENTDATE', 'PERIODID']].drop_duplicates()
-
-    print(f"Found {len(periods)} unique periods for {selected_fcas}")
-
-    # Generate condensed bid curves for each period
-    count = 0
-    for _, period_row in periods.iterrows():
-        settlement_date = period_row['SETTLEMENTDATE']
-        period_id = period_row['PERIODID']
-
-        period_data = duid_data[
-            (duid_data['SETTLEMENTDATE'] == settlement_date) &
-            (duid_data['PERIODID'] == period_id)
-        ]
-
-        if len(period_data) > 0:
-            filename = plot_bid_curve_condensed(period_data, duid, selected_fcas, settlement_date, period_id, output_dir)
-            count += 1
-
-            if count % 50 == 0:
-                print(f"  Generated {count} figures...")
-
-    print(f"Generated {count} condensed bid curve figures for {duid}")
-    print(f"Saved to: {output_dir}/")
+    return output_dir / f'{duid}_{bidtype}_{days[0]:%Y%m%d}_{days[-1]:%Y%m%d}_{suffix}'
 
 # =============================================================================
 # SUMMARY STATISTICS (TRUE REBIDS ONLY)
 # =============================================================================
 
-print("\n" + "="*80)
-print("SUMMARY (True Rebids Only - where quantity bands changed)")
-print("="*80)
-
-for duid in selected_duids:
-    duid_data = merged_df[merged_df['DUID'] == duid]
-
-    if len(duid_data) == 0:
-        continue
+def print_summary(unit_df, duid, bidtype):
+    """True-rebid statistics for one unit over its loaded days."""
+    if len(unit_df) == 0:
+        return
 
     # Count true rebids per period (number of rows - 1, since first row is initial bid)
-    bid_counts = duid_data.groupby(['SETTLEMENTDATE', 'PERIODID']).size()
+    bid_counts = unit_df.groupby(['SETTLEMENTDATE', 'PERIODID']).size()
     true_rebid_counts = bid_counts - 1  # Subtract 1 for initial bid
 
-    print(f"\n{duid} ({selected_fcas}):")
+    print(f"\n{duid} ({bidtype}):")
     print(f"  Total periods: {len(bid_counts)}")
     print(f"  Mean true rebids per period: {true_rebid_counts.mean():.2f}")
     print(f"  Max true rebids in a period: {true_rebid_counts.max()}")
     print(f"  Periods with zero true rebids: {(true_rebid_counts == 0).sum()}")
     print(f"  Periods with 1+ true rebids: {(true_rebid_counts >= 1).sum()}")
 
-# Close DuckDB connection
-con.close()
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Render bid curves for any DUID x BIDTYPE x date range.")
+    parser.add_argument("--duids", nargs="+", default=DEFAULT_DUIDS,
+                        help="DUIDs or glob patterns (default: %(default)s)")
+    parser.add_argument("--bidtypes", nargs="+", default=DEFAULT_BIDTYPES,
+                        help="BIDTYPEs or glob patterns (default: %(default)s)")
+    parser.add_argument("--dates", nargs="+", default=None,
+                        help="market days: YYYY-MM-DD, globs (2025-10-*) or FIRST:LAST ranges (default: all)")
+    parser.add_argument("--plan", action="store_true", help="print the planned tasks and exit")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip tasks recorded in the checkpoint by an earlier run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="rendering processes (default: one per core; 1 = in-process)")
+    parser.add_argument("--fixed-layout", action="store_true",
+                        help="fixed axes position and image size (skips tight layout; fastest)")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render every figure, even if its inputs are unchanged")
+    parser.add_argument("--archive", action="store_true",
+                        help="export daily curve archives and the HTML viewer instead of PNGs")
+    parser.add_argument("--density", action="store_true",
+                        help="one density heatmap of all offer curves per DUID/BIDTYPE instead of per-period PNGs")
+    parser.add_argument("--animate", choices=ANIMATION_MODES,
+                        help="one animation per DUID/BIDTYPE, with a frame per period or per offer version")
+    parser.add_argument("--animation-format", choices=["gif", "mp4"], default="gif",
+                        help="animation file format (mp4 needs ffmpeg)")
+    args = parser.parse_args()
+
+    if args.archive:
+        mode = 'archive'
+    elif args.density:
+        mode = 'density'
+    elif args.animate:
+        mode = f'animate-{args.animate}.{args.animation_format}'
+    else:
+        mode = 'png-fixed' if args.fixed_layout else 'png'
+    # Density images and animations cover a unit's whole date range; the rest are per day
+    per_day = mode in ('archive', 'png', 'png-fixed')
+
+    con = connect_analytics_db(tables=["offer_version_range", "offer_delta"])
+    tasks = plan_tasks(available_days(con), args.duids, args.bidtypes, args.dates)
+    units = group_units(tasks)
+    print(f"Planned {len(tasks)} (DUID, BIDTYPE, day) task(s) over {len(units)} DUID/BIDTYPE pair(s)")
+    if args.plan:
+        for (duid, bidtype), days in units.items():
+            print(f"  {duid} {bidtype}: {len(days)} day(s), {days[0]:%Y-%m-%d} to {days[-1]:%Y-%m-%d}")
+        con.close()
+        return
+
+    CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if args.resume:
+        done = load_checkpoint()
+    else:
+        CHECKPOINT_PATH.unlink(missing_ok=True)
+        done = set()
+    if per_day:
+        units = {unit: [day for day in days if checkpoint_key(mode, *unit, day) not in done]
+                 for unit, days in units.items()}
+    else:
+        units = {unit: days for unit, days in units.items()
+                 if checkpoint_key(mode, *unit, days) not in done}
+    units = {unit: days for unit, days in units.items() if days}
+    skipped = len(tasks) - sum(len(days) for days in units.values())
+    if skipped:
+        print(f"Resuming: {skipped} task(s) already finished")
+
+    manifest = load_manifest()
+    pool = render_pool(args.workers) if args.workers != 1 else None
+    try:
+        for (duid, bidtype), days in units.items():
+            unit_df = load_true_rebids(con, duid, bidtype, days)
+
+            if mode == 'density':
+                output_path = range_output_path('density', duid, bidtype, days, 'density.png')
+                print(f"\nDensity heatmap for {duid} {bidtype}:")
+                render_density_heatmap(unit_df, duid, bidtype, output_path,
+                                       manifest=manifest, force=args.force)
+                mark_done(checkpoint_key(mode, duid, bidtype, days))
+            elif args.animate:
+                output_path = range_output_path('animations', duid, bidtype, days,
+                                                f'{args.animate}.{args.animation_format}')
+                print(f"\nAnimating {duid} {bidtype} (one frame per {args.animate}):")
+                render_animations([(unit_df, duid, bidtype, output_path, args.animate)],
+                                  workers=args.workers, manifest=manifest, force=args.force, pool=pool)
+                mark_done(checkpoint_key(mode, duid, bidtype, days))
+            else:
+                for day, day_df in unit_df.groupby('SETTLEMENTDATE', sort=True):
+                    print(f"\n{'='*60}\n{duid} {bidtype} {day:%Y-%m-%d}: "
+                          f"{day_df['PERIODID'].nunique()} periods\n{'='*60}")
+                    if mode == 'archive':
+                        export_bid_curves(day_df, duid, bidtype)
+                    else:
+                        generate_bid_curves(day_df, duid, bidtype, manifest, pool=pool,
+                                            workers=args.workers, fixed_layout=args.fixed_layout,
+                                            force=args.force)
+                    mark_done(checkpoint_key(mode, duid, bidtype, day))
+                # Planned days without any offer rows have nothing to render
+                for day in sorted(set(days) - set(unit_df['SETTLEMENTDATE'])):
+                    mark_done(checkpoint_key(mode, duid, bidtype, day))
+            print_summary(unit_df, duid, bidtype)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        save_manifest(manifest)
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
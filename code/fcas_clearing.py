@@ -0,0 +1,256 @@
+"""
+FCAS Clearing Simulator
+=======================
+Clears the per-region supply stacks from supply_stack.py at the FCAS volume
+each region actually enabled, and compares the resulting price with the
+published DISPATCHPRICE.
+
+The model, per region, service and dispatch interval:
+    requirement    DISPATCHREGIONSUM <SERVICE>LOCALDISPATCH (MW enabled in the region)
+    cleared price  price of the first stack step at which cumulative MW
+                   reaches the requirement
+    marginal unit  the DUID and band of that step
+
+Every (region, interval) of a service is cleared in one call:
+grouped_searchsorted() on the stacks' cumulative MW, so a month of 5-minute
+intervals takes well under a second per service.
+
+What the simplified model leaves out:
+    - co-optimisation with energy (FCAS trapezium, enablement limits),
+      so a unit's whole offer counts as available;
+    - cross-region requirements: the NEM buys most FCAS against global or
+      mainland requirement constraints that several regions meet at one
+      price. DISPATCH_FCAS_REQ lists the requirement constraints binding in
+      each interval; their count is carried as BINDING_CONSTRAINTS so the
+      comparison can be split by it.
+Only the pricing run (INTERVENTION = 0) of the DISPATCH tables is used.
+
+Usage:
+    from fcas_clearing import simulate_clearing, accuracy_summary
+
+    results = simulate_clearing(["RAISEREG", "LOWERREG"], start="2025-10-01", end="2025-10-31")
+    print(accuracy_summary(results))
+
+    python code/fcas_clearing.py --bidtypes RAISEREG LOWERREG --start 2025-10-01 --end 2025-10-31 --save
+
+Result columns:
+    SETTLEMENTDATE, REGIONID, BIDTYPE, REQUIREMENT_MW, OFFERED_MW,
+    CLEARED_PRICE, MARGINAL_DUID, MARGINAL_BAND, STATUS,
+    DISPATCH_PRICE, PRICE_ERROR (CLEARED_PRICE - DISPATCH_PRICE), BINDING_CONSTRAINTS
+
+STATUS:
+    cleared         the stack covers the requirement
+    short           the requirement exceeds everything offered in the region
+    zero            nothing was enabled in the region (its price is set elsewhere)
+    no offers       no unit of the region offered the service in that interval
+    no requirement  the requirement is missing (NULL in DISPATCHREGIONSUM)
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import OUTPUT_DIR
+from nem_db import INTERVAL_SECONDS, MARKET_DAY_START_SECONDS
+from nem_reader import FCAS_BIDTYPES, read_table
+from supply_stack import grouped_searchsorted, load_supply_stacks
+
+CLEARING_OUTPUT_DIR = OUTPUT_DIR / "fcas_clearing"
+
+# Slack when comparing cumulative MW with the requirement, so float sums
+# that land a hair under an exact band boundary still clear on that band
+CLEARING_TOLERANCE_MW = 1e-6
+
+RESULT_KEYS = ["SETTLEMENTDATE", "REGIONID", "BIDTYPE"]
+
+
+# =============================================================================
+# DISPATCH INPUTS
+# =============================================================================
+
+def dispatch_window(start=None, end=None) -> tuple:
+    """
+    SETTLEMENTDATE bounds of market days start..end: a market day's
+    intervals end at 04:05 on that day through 04:00 the next day.
+    """
+    first = last = None
+    if start is not None:
+        first = pd.Timestamp(start).normalize() + pd.Timedelta(seconds=MARKET_DAY_START_SECONDS + INTERVAL_SECONDS)
+    if end is not None:
+        last = pd.Timestamp(end).normalize() + pd.Timedelta(days=1, seconds=MARKET_DAY_START_SECONDS)
+    return first, last
+
+
+def _pricing_run(table: str, columns: list, start, end, where=None) -> pd.DataFrame:
+    """INTERVENTION = 0 rows of a DISPATCH table within market days start..end."""
+    filters = {"SETTLEMENTDATE": dispatch_window(start, end), "INTERVENTION": 0, **(where or {})}
+    return read_table(table, columns=columns, where=filters)
+
+
+def load_requirements(bidtypes, start=None, end=None) -> pd.DataFrame:
+    """Long frame of SETTLEMENTDATE, REGIONID, BIDTYPE, REQUIREMENT_MW from DISPATCHREGIONSUM."""
+    wide = _pricing_run("DISPATCHREGIONSUM",
+                        ["SETTLEMENTDATE", "REGIONID"] + [f"{b}LOCALDISPATCH" for b in bidtypes],
+                        start, end)
+    long = wide.melt(id_vars=["SETTLEMENTDATE", "REGIONID"], var_name="BIDTYPE", value_name="REQUIREMENT_MW")
+    long["BIDTYPE"] = long["BIDTYPE"].str.removesuffix("LOCALDISPATCH")
+    return long
+
+
+def load_dispatch_prices(bidtypes, start=None, end=None) -> pd.DataFrame:
+    """Long frame of SETTLEMENTDATE, REGIONID, BIDTYPE, DISPATCH_PRICE from DISPATCHPRICE."""
+    wide = _pricing_run("DISPATCHPRICE",
+                        ["SETTLEMENTDATE", "REGIONID"] + [f"{b}RRP" for b in bidtypes],
+                        start, end)
+    long = wide.melt(id_vars=["SETTLEMENTDATE", "REGIONID"], var_name="BIDTYPE", value_name="DISPATCH_PRICE")
+    long["BIDTYPE"] = long["BIDTYPE"].str.removesuffix("RRP")
+    return long
+
+
+def load_binding_constraints(bidtypes, start=None, end=None) -> pd.DataFrame:
+    """Number of binding FCAS requirement constraints per interval, region and service (DISPATCH_FCAS_REQ)."""
+    req = _pricing_run("DISPATCH_FCAS_REQ",
+                       ["SETTLEMENTDATE", "REGIONID", "BIDTYPE", "MARGINALVALUE"],
+                       start, end, where={"BIDTYPE": list(bidtypes)})
+    req = req[req["MARGINALVALUE"] != 0]
+    return req.groupby(RESULT_KEYS).size().rename("BINDING_CONSTRAINTS").reset_index()
+
+
+# =============================================================================
+# CLEARING
+# =============================================================================
+
+def clear_stacks(stacks: dict, requirements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clear one service's stacks at the given requirements.
+
+    requirements: SETTLEMENTDATE, REGIONID, REQUIREMENT_MW rows (any order).
+    Returns them with OFFERED_MW, CLEARED_PRICE, MARGINAL_DUID,
+    MARGINAL_BAND and STATUS added (see module docstring).
+    """
+    result = requirements.reset_index(drop=True).copy()
+    n_intervals = len(stacks["intervals"])
+    region_index = pd.Index(stacks["regions"]).get_indexer(result["REGIONID"])
+    interval_index = pd.DatetimeIndex(stacks["intervals"]).get_indexer(pd.DatetimeIndex(result["SETTLEMENTDATE"]))
+    need = result["REQUIREMENT_MW"].to_numpy(dtype=float)
+
+    offsets, cum_mw = stacks["offsets"], stacks["cum_mw"]
+    in_stack = (region_index >= 0) & (interval_index >= 0)
+    groups = (region_index * n_intervals + interval_index)[in_stack]
+    in_stack[in_stack] = offsets[groups + 1] > offsets[groups]
+    groups = (region_index * n_intervals + interval_index)[in_stack]
+    first, end = offsets[groups], offsets[groups + 1]
+
+    # Position of the first step whose cumulative MW reaches the requirement
+    position = grouped_searchsorted(offsets, cum_mw, groups, need[in_stack] - CLEARING_TOLERANCE_MW)
+    missing = np.isnan(need)
+    zero = need <= CLEARING_TOLERANCE_MW
+    cleared = in_stack.copy()
+    cleared[in_stack] = position < end - first
+    cleared &= ~zero & ~missing
+    step = (first + position)[cleared[in_stack]]
+
+    offered = np.zeros(len(result))
+    offered[in_stack] = cum_mw[end - 1]
+    price = np.full(len(result), np.nan)
+    price[cleared] = stacks["price"][step]
+    duid = np.full(len(result), None, dtype=object)
+    duid[cleared] = stacks["duids"][stacks["duid"][step]]
+    band = pd.array(np.zeros(len(result), dtype=np.int8), dtype="Int8")
+    band[cleared] = stacks["band"][step]
+    band[~cleared] = pd.NA
+
+    result["OFFERED_MW"] = offered
+    result["CLEARED_PRICE"] = price
+    result["MARGINAL_DUID"] = duid
+    result["MARGINAL_BAND"] = band
+    result["STATUS"] = np.select([missing, zero, ~in_stack, cleared],
+                                 ["no requirement", "zero", "no offers", "cleared"], "short")
+    return result
+
+
+def simulate_clearing(bidtypes=None, start=None, end=None, rebuild: bool = False) -> pd.DataFrame:
+    """
+    Clear every region and interval of each service over market days
+    start..end and attach DISPATCHPRICE and the binding-constraint count.
+    """
+    bidtypes = list(bidtypes or FCAS_BIDTYPES)
+    requirements = load_requirements(bidtypes, start, end)
+    cleared = []
+    for bidtype in bidtypes:
+        stacks = load_supply_stacks(bidtype, start, end, rebuild=rebuild)
+        begin = time.time()
+        service = requirements[requirements["BIDTYPE"] == bidtype]
+        cleared.append(clear_stacks(stacks, service))
+        print(f"  {bidtype}: cleared {len(service):,} region-intervals in {time.time() - begin:.2f}s")
+    results = pd.concat(cleared, ignore_index=True)
+
+    results = results.merge(load_dispatch_prices(bidtypes, start, end), on=RESULT_KEYS, how="left")
+    results["PRICE_ERROR"] = results["CLEARED_PRICE"] - results["DISPATCH_PRICE"]
+    results = results.merge(load_binding_constraints(bidtypes, start, end), on=RESULT_KEYS, how="left")
+    results["BINDING_CONSTRAINTS"] = results["BINDING_CONSTRAINTS"].fillna(0).astype(int)
+    return results.sort_values(RESULT_KEYS, ignore_index=True)
+
+
+def accuracy_summary(results: pd.DataFrame, tolerance: float = 1.0, by=("BIDTYPE", "REGIONID")) -> pd.DataFrame:
+    """
+    How close the cleared prices get to DISPATCHPRICE, per group.
+
+    Columns: intervals, share cleared, and over the cleared intervals with a
+    published price: mean absolute error, median error, share within
+    tolerance $/MWh, and the published and cleared mean prices.
+    """
+    compared = results.assign(
+        CLEARED=results["STATUS"] == "cleared",
+        ABS_ERROR=results["PRICE_ERROR"].abs(),
+        WITHIN=results["PRICE_ERROR"].abs() <= tolerance,
+    )
+    scored = compared[compared["CLEARED"] & compared["DISPATCH_PRICE"].notna()]
+    summary = compared.groupby(list(by)).agg(intervals=("STATUS", "size"), cleared=("CLEARED", "mean"))
+    summary = summary.join(scored.groupby(list(by)).agg(
+        mae=("ABS_ERROR", "mean"),
+        median_error=("PRICE_ERROR", "median"),
+        within_tolerance=("WITHIN", "mean"),
+        dispatch_mean=("DISPATCH_PRICE", "mean"),
+        cleared_mean=("CLEARED_PRICE", "mean"),
+    ))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clear FCAS supply stacks and compare with DISPATCHPRICE.")
+    parser.add_argument("--bidtypes", nargs="+", choices=FCAS_BIDTYPES, default=FCAS_BIDTYPES,
+                        help="FCAS services to clear (default: all)")
+    parser.add_argument("--start", help="first market day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last market day (YYYY-MM-DD)")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="price difference in $/MWh counted as a match (default: 1)")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the cached supply stacks")
+    parser.add_argument("--save", action="store_true",
+                        help=f"write the interval results to {CLEARING_OUTPUT_DIR.name}/ as CSV")
+    args = parser.parse_args()
+
+    results = simulate_clearing(args.bidtypes, args.start, args.end, rebuild=args.rebuild)
+
+    print(f"\nStatus of {len(results):,} region-intervals:")
+    print(results.groupby(["BIDTYPE", "STATUS"]).size().unstack(fill_value=0).to_string())
+    print(f"\nCleared vs DISPATCHPRICE (within ${args.tolerance:g}/MWh):")
+    print(accuracy_summary(results, args.tolerance).to_string(float_format="%.2f"))
+    print("\nBy number of binding requirement constraints:")
+    print(accuracy_summary(results, args.tolerance, by=["BIDTYPE", "BINDING_CONSTRAINTS"])
+          .to_string(float_format="%.2f"))
+
+    if args.save:
+        CLEARING_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        path = CLEARING_OUTPUT_DIR / f"clearing_{args.start or 'first'}_{args.end or 'last'}.csv"
+        results.to_csv(path, index=False)
+        print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
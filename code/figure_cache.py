@@ -0,0 +1,121 @@
+"""
+Figure Cache
+============
+Skips re-rendering figures whose inputs haven't changed.
+
+Each figure is given a key: a hash of its input data slice, its plotting
+parameters and the source file(s) that draw it (so editing the styling code
+re-renders its figures). Keys are kept in one manifest under figures/,
+keyed by path relative to FIGURES_DIR. A figure is re-rendered when its key
+differs from the recorded one, when the PNG is missing, or with force=True.
+
+Usage:
+    from figure_cache import input_hash, is_current, load_manifest, save_figure, save_manifest
+
+    manifest = load_manifest()
+    key = input_hash(df[["BIDTYPE", "num_rebids"]], Path(__file__), dpi=150)
+    save_figure(fig, FIGURES_DIR / "rebids" / "boxplot.png", key, manifest, dpi=150)
+    save_manifest(manifest)
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import FIGURES_DIR
+
+MANIFEST_PATH = FIGURES_DIR / "_figure_manifest.json"
+
+
+def _update_digest(digest, value) -> None:
+    """Feed one input into the hash (type-aware, so equal data gives equal keys)."""
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, Path):
+        digest.update(value.read_bytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def input_hash(*inputs, **params) -> str:
+    """
+    Key for a figure: hash of its inputs (DataFrames, Series, arrays, source
+    file Paths, scalars) and keyword plotting parameters.
+    """
+    digest = hashlib.sha1()
+    for value in inputs:
+        _update_digest(digest, value)
+    for name in sorted(params):
+        digest.update(name.encode())
+        _update_digest(digest, params[name])
+    return digest.hexdigest()
+
+
+def _manifest_key(figure_path) -> str:
+    """Manifest entry name: path relative to FIGURES_DIR (absolute if outside it)."""
+    path = Path(figure_path).resolve()
+    try:
+        return path.relative_to(FIGURES_DIR.resolve()).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def load_manifest() -> dict:
+    """The recorded {figure: key} entries ({} if nothing has been rendered yet)."""
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)["figures"]
+
+
+def save_manifest(manifest: dict) -> None:
+    """
+    Merge manifest into the file on disk and write it atomically.
+
+    Entries are merged rather than overwritten, so scripts that render
+    different figures can update the manifest one after another.
+    """
+    merged = load_manifest()
+    merged.update(manifest)
+    tmp = MANIFEST_PATH.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"figures": merged}, f, indent=1, sort_keys=True)
+    tmp.replace(MANIFEST_PATH)
+
+
+def is_current(manifest: dict, figure_path, key: str) -> bool:
+    """True if the figure exists and was rendered from inputs with this key."""
+    return manifest.get(_manifest_key(figure_path)) == key and Path(figure_path).exists()
+
+
+def record(manifest: dict, figure_path, key: str) -> None:
+    """Remember that figure_path was rendered from inputs with this key."""
+    manifest[_manifest_key(figure_path)] = key
+
+
+def save_figure(fig, figure_path, key: str, manifest: dict, force: bool = False, **savefig_kwargs) -> bool:
+    """
+    Save fig unless the recorded figure is current, then close it.
+
+    Returns True if the figure was written.
+    """
+    import matplotlib.pyplot as plt
+
+    rendered = force or not is_current(manifest, figure_path, key)
+    if rendered:
+        fig.savefig(figure_path, **savefig_kwargs)
+        record(manifest, figure_path, key)
+    plt.close(fig)
+    return rendered
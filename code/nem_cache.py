@@ -0,0 +1,427 @@
+"""
+Parquet Cache for AEMO MMS Tables
+=================================
+Converts the raw AEMO CSV archives (the bid tables BIDDAYOFFER,
+BIDOFFERPERIOD and DISPATCHOFFERTRK, plus the DISPATCHPRICE,
+DISPATCHREGIONSUM and DISPATCH_FCAS_REQ dispatch results and the
+DUDETAILSUMMARY unit registrations) into typed,
+zstd-compressed Parquet so analysis scripts don't re-parse multi-GB CSVs on
+every run. Column types come from the schema registry in nem_schema.py.
+
+Every archive part found by nem_catalog (e.g. all 39 BIDOFFERPERIOD files
+for a month) is ingested into the same partition tree, so the parts read
+back as one logical table. Zipped parts are streamed from the archive
+(nem_schema.arrow_scan) without being extracted to disk.
+
+Layout:
+    CACHE_DIR/<TABLE>/BIDTYPE=<bidtype>/MARKETDATE=<yyyy-mm-dd>/<part>_<n>.parquet
+    CACHE_DIR/<TABLE>/MARKETDATE=<yyyy-mm-dd>/<part>_<n>.parquet   (tables without BIDTYPE)
+
+    MARKETDATE is the market day (SETTLEMENTDATE for BIDDAYOFFER, TRADINGDATE
+    for BIDOFFERPERIOD, BIDSETTLEMENTDATE for DISPATCHOFFERTRK) cast to DATE.
+    The DISPATCH tables use their interval SETTLEMENTDATE, so there it is
+    the calendar day (the 00:00-04:00 intervals of a market day land in the
+    next partition). DUDETAILSUMMARY is partitioned by the day each
+    registration starts (START_DATE). The original timestamp columns are
+    kept in the files unchanged.
+    <part> identifies the source archive part (e.g. 202510010000_FILE07).
+
+Usage:
+    from nem_cache import table_source
+
+    con.execute(f"SELECT DUID, BIDTYPE FROM {table_source('BIDDAYOFFER')}")
+
+    table_source() ingests on first use and adds any part that is new or
+    changed, so scripts read the cache transparently. The sources are
+    checked once per process (nem_db.connect() checks the sources of the
+    tables it opens again on every call).
+    Each ingested part is recorded in CACHE_DIR/<TABLE>/_manifest.json
+    (path, size, checksum, row count, min/max market day); the whole table
+    is rebuilt only when the pinned schema changes. Deleting a source file
+    after ingest does not remove it from the cache.
+
+    To build the cache ahead of time, with parts ingested in parallel:
+
+    python code/nem_cache.py                  # rebuild all stale tables that have archives
+    python code/nem_cache.py --incremental    # add newly arrived months/files only
+    python code/nem_cache.py BIDOFFERPERIOD --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import duckdb
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import CACHE_DIR
+from nem_catalog import find_table_files, is_zip, part_id
+from nem_schema import SCHEMAS, arrow_scan, check_header, csv_scan, report_rejects, schema_fingerprint
+
+# =============================================================================
+# CACHED TABLES
+# =============================================================================
+# Table name -> market-day column used for partitioning
+CACHED_TABLES = {
+    "BIDDAYOFFER": "SETTLEMENTDATE",
+    "BIDOFFERPERIOD": "TRADINGDATE",
+    "DISPATCHOFFERTRK": "BIDSETTLEMENTDATE",
+    "DISPATCHPRICE": "SETTLEMENTDATE",
+    "DISPATCHREGIONSUM": "SETTLEMENTDATE",
+    "DISPATCH_FCAS_REQ": "SETTLEMENTDATE",
+    "DUDETAILSUMMARY": "START_DATE",
+}
+
+MANIFEST_FILENAME = "_manifest.json"
+
+# Tables whose cache ensure_cached() has already checked in this process
+_checked_tables = set()
+
+# =============================================================================
+# WORKER LIMITS
+# =============================================================================
+# DuckDB memory given to each ingest worker. Partitioned COPY keeps a row
+# group open per BIDTYPE x day, so a worker needs roughly this much for a
+# month-long archive part.
+WORKER_MEMORY_BYTES = 2 * 1024**3
+
+# Share of currently available memory the workers may use between them
+MEMORY_FRACTION = 0.75
+
+
+def cache_dir(table: str) -> Path:
+    """Directory holding the Parquet partitions for a table."""
+    return CACHE_DIR / table
+
+
+def partition_columns(table: str) -> list:
+    """Hive partition columns of a table's cache (BIDTYPE only where the table has one)."""
+    return (["BIDTYPE"] if "BIDTYPE" in SCHEMAS[table] else []) + ["MARKETDATE"]
+
+
+def source_files(table: str) -> list:
+    """Archive parts for a table under DATA_DIR; raises if there are none."""
+    files = find_table_files(table)
+    if not files:
+        raise FileNotFoundError(
+            f"No PUBLIC_ARCHIVE#{table}#FILE<NN>#<YYYYMM>... files found under the data "
+            f"directory. Check NEM_DATA_PATH (python code/config.py)."
+        )
+    return files
+
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+# CACHE_DIR/<TABLE>/_manifest.json records every ingested part:
+#   {"schema": <fingerprint>,
+#    "parts": {<part id>: {path, size, mtime, sha256, rows,
+#                          date_column, min_date, max_date}}}
+
+def file_checksum(path) -> str:
+    """SHA-256 of a source file (of the ZIP itself for zipped parts)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024**2), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(table: str) -> dict:
+    """A table's manifest, or None if the cache hasn't been built."""
+    path = cache_dir(table) / MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(directory: Path, manifest: dict) -> None:
+    """Write the manifest atomically, so a crash never leaves it half-written."""
+    tmp = directory / f"{MANIFEST_FILENAME}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    tmp.replace(directory / MANIFEST_FILENAME)
+
+
+def pending_parts(table: str, manifest=None) -> list:
+    """
+    Source parts that are not in the manifest, or whose contents changed.
+
+    A part whose size/mtime changed but whose checksum didn't (e.g. re-copied
+    from Box) is not pending. Parts in the manifest whose source has since
+    been deleted stay in the cache.
+    """
+    manifest = manifest if manifest is not None else read_manifest(table)
+    recorded = manifest["parts"] if manifest else {}
+    pending = []
+    touched = False
+    for path in find_table_files(table):
+        entry = recorded.get(part_id(path))
+        if entry is None:
+            pending.append(path)
+            continue
+        stat = Path(path).stat()
+        if (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime):
+            continue
+        if file_checksum(path) != entry["sha256"]:
+            pending.append(path)
+        else:
+            # Same contents: remember the new mtime so it isn't re-hashed next time
+            entry.update(path=str(path), mtime=stat.st_mtime)
+            touched = True
+    if touched:
+        _write_manifest(cache_dir(table), manifest)
+    return pending
+
+
+def is_cache_fresh(table: str) -> bool:
+    """True if the cache exists, matches the pinned schema and has every current source part."""
+    manifest = read_manifest(table)
+    if manifest is None or manifest["schema"] != schema_fingerprint(table):
+        return False
+    return not pending_parts(table, manifest)
+
+
+# =============================================================================
+# PARALLEL INGEST
+# =============================================================================
+
+def _available_memory_bytes() -> int:
+    """Physical memory currently available (falls back to half of total RAM)."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    if "SC_AVPHYS_PAGES" in os.sysconf_names:
+        return os.sysconf("SC_AVPHYS_PAGES") * page_size
+    # macOS has no SC_AVPHYS_PAGES
+    return os.sysconf("SC_PHYS_PAGES") * page_size // 2
+
+
+def plan_workers(n_parts: int, workers=None) -> tuple:
+    """
+    Number of ingest processes and the DuckDB (memory_limit, threads) each gets.
+
+    Bounded by core count, by how many WORKER_MEMORY_BYTES slices fit in
+    available memory, and by the number of parts.
+    """
+    cores = os.cpu_count() or 1
+    budget = int(_available_memory_bytes() * MEMORY_FRACTION)
+    if workers is None:
+        workers = min(cores, max(1, budget // WORKER_MEMORY_BYTES))
+    workers = max(1, min(workers, n_parts))
+    memory_limit = max(budget // workers, 256 * 1024**2)
+    threads = max(1, cores // workers)
+    return workers, memory_limit, threads
+
+
+def _ingest_part(table: str, path: str, out_dir: str, memory_limit: int, threads: int) -> tuple:
+    """
+    Convert one archive part into Parquet under out_dir (runs in a worker process).
+
+    Returns (part id, manifest entry, rejected rows).
+    """
+    day_column = CACHED_TABLES[table]
+    select_list = ", ".join(f'"{c}"' for c in SCHEMAS[table])
+    name = part_id(path)
+
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit = '{memory_limit // 1024**2}MB'")
+    con.execute(f"SET threads = {threads}")
+    con.execute("SET preserve_insertion_order = false")
+
+    if is_zip(path):
+        # Stream-decompress the ZIP member straight into the COPY below
+        con.register("archive_stream", arrow_scan(table, path))
+        source = "archive_stream"
+    else:
+        source = csv_scan(table, path)
+
+    rows = con.execute(f"""
+    COPY (
+        SELECT {select_list}, CAST("{day_column}" AS DATE) AS MARKETDATE
+        FROM {source}
+        WHERE ROW_TYPE = 'D'
+    ) TO '{Path(out_dir) / name}' (
+        FORMAT PARQUET,
+        COMPRESSION ZSTD,
+        PARTITION_BY ({', '.join(partition_columns(table))}),
+        FILENAME_PATTERN '{name}_{{i}}'
+    )
+    """).fetchone()[0]
+
+    rejected = 0 if is_zip(path) else report_rejects(con, f"{table} {name}")
+
+    # Date range comes from the files just written (cheap: Parquet statistics)
+    min_date, max_date = con.execute(f"""
+        SELECT min("{day_column}"), max("{day_column}")
+        FROM read_parquet('{Path(out_dir) / name}/**/*.parquet')
+    """).fetchone() if rows else (None, None)
+    con.close()
+
+    stat = Path(path).stat()
+    entry = {
+        "path": str(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": file_checksum(path),
+        "rows": rows,
+        "date_column": day_column,
+        "min_date": str(min_date) if min_date is not None else None,
+        "max_date": str(max_date) if max_date is not None else None,
+    }
+    return name, entry, rejected
+
+
+def _merge_parts(staging: Path) -> None:
+    """Move each part's partition files into one shared partition tree."""
+    for part_dir in [p for p in staging.iterdir() if p.is_dir() and "=" not in p.name]:
+        for file in part_dir.rglob("*.parquet"):
+            dest = staging / file.parent.relative_to(part_dir) / file.name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            file.rename(dest)
+        shutil.rmtree(part_dir)
+
+
+def _run_parts(table: str, paths: list, staging: Path, workers) -> dict:
+    """Ingest parts into staging (in parallel if workers != 1); return {part id: manifest entry}."""
+    n_workers, memory_limit, threads = plan_workers(len(paths), workers)
+    print(f"Ingesting {table}: {len(paths)} part(s) with {n_workers} worker(s) "
+          f"({memory_limit / 1024**3:.1f} GB, {threads} thread(s) each)...")
+
+    jobs = [(table, str(path), str(staging), memory_limit, threads) for path in paths]
+    entries = {}
+    if n_workers == 1:
+        results = (_ingest_part(*job) for job in jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=n_workers)
+        results = (future.result() for future in
+                   as_completed([pool.submit(_ingest_part, *job) for job in jobs]))
+    try:
+        for done, (name, entry, _) in enumerate(results, 1):
+            entries[name] = entry
+            print(f"  [{done}/{len(jobs)}] {name}: {entry['rows']:,} rows "
+                  f"({entry['min_date']} to {entry['max_date']})")
+    finally:
+        if n_workers > 1:
+            pool.shutdown(cancel_futures=True)
+
+    _merge_parts(staging)
+    return entries
+
+
+def ingest_table(table: str, workers=1, incremental=False) -> Path:
+    """
+    Parse a table's source parts once and write them to the Parquet cache.
+
+    incremental: only ingest parts that are new or changed since the last
+             run (see pending_parts) and add their files to the existing
+             partitions; everything already cached is left alone. Falls
+             back to a full rebuild if there is no manifest or the pinned
+             schema changed.
+    workers: number of parts ingested concurrently in separate processes;
+             None sizes the pool from core count and available memory.
+             The default of 1 ingests in-process, which is what table_source()
+             uses so that analysis scripts without a __main__ guard are never
+             re-imported by a process pool.
+    """
+    target = cache_dir(table)
+    manifest = read_manifest(table)
+    if incremental and (manifest is None or manifest["schema"] != schema_fingerprint(table)):
+        print(f"{table}: no compatible manifest, rebuilding the whole table")
+        incremental = False
+
+    paths = pending_parts(table, manifest) if incremental else source_files(table)
+    if not paths:
+        print(f"{table}: nothing new to ingest")
+        return target
+
+    # Fail loudly if AEMO changed the table layout, rather than mis-typing columns
+    for path in paths:
+        check_header(table, path)
+
+    # Build in a temporary directory and move into place afterwards, so an
+    # interrupted ingest never leaves a half-written cache behind. The
+    # directory is unique per run, so concurrent ingests never share it.
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f"{table}.", suffix=".tmp", dir=CACHE_DIR))
+    staging.chmod(0o755)  # mkdtemp's 0700 would carry over to the cache
+    try:
+        entries = _run_parts(table, paths, staging, workers)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if incremental:
+        # Drop any earlier files from these parts (changed sources, or an
+        # interrupted previous run), then add the new ones
+        for name in entries:
+            for old in target.glob(f"**/{name}_*.parquet"):
+                old.unlink()
+        for file in staging.rglob("*.parquet"):
+            dest = target / file.relative_to(staging)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            file.rename(dest)
+        shutil.rmtree(staging)
+        manifest["parts"].update(entries)
+        _write_manifest(target, manifest)
+    else:
+        _write_manifest(staging, {"schema": schema_fingerprint(table), "parts": entries})
+        if target.exists():
+            shutil.rmtree(target)
+        staging.rename(target)
+
+    new_rows = sum(e["rows"] for e in entries.values())
+    size_mb = sum(p.stat().st_size for p in target.rglob("*.parquet")) / (1024**2)
+    print(f"  {'Added' if incremental else 'Wrote'} {new_rows:,} rows -> {target} "
+          f"({size_mb:.1f} MB total)")
+    return target
+
+
+def ensure_cached(table: str, refresh=False) -> Path:
+    """
+    Build a table's cache, or add newly arrived parts to it; return the cache dir.
+
+    The source parts are only checked on the first call in a process (listing
+    and stat-ing every archive part is not free); refresh=True checks again.
+    """
+    if refresh or table not in _checked_tables:
+        if not is_cache_fresh(table):
+            ingest_table(table, incremental=True)
+        _checked_tables.add(table)
+    return cache_dir(table)
+
+
+def table_source(table: str) -> str:
+    """DuckDB FROM-clause expression that scans a table's Parquet cache (all parts)."""
+    path = ensure_cached(table)
+    return f"read_parquet('{path}/**/*.parquet', hive_partitioning=true)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Parquet cache for the AEMO tables.")
+    parser.add_argument("tables", nargs="*",
+                        help="tables to ingest (default: every table with archives under DATA_DIR)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel ingest processes (default: from cores and available memory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only ingest new or changed parts, keeping existing partitions")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is fresh")
+    args = parser.parse_args()
+
+    tables = args.tables or [name for name in CACHED_TABLES if find_table_files(name)]
+    for name in tables:
+        if name not in CACHED_TABLES:
+            parser.error(f"unknown table {name!r}; expected one of {sorted(CACHED_TABLES)}")
+        if not args.force and is_cache_fresh(name):
+            print(f"{name}: cache up to date ({cache_dir(name)})")
+        else:
+            ingest_table(name, workers=args.workers, incremental=args.incremental and not args.force)
+
+
+if __name__ == "__main__":
+    main()
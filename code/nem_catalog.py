@@ -0,0 +1,125 @@
+"""
+AEMO Archive Catalog
+====================
+Finds every MMSDM archive part under DATA_DIR so large tables can be read
+as one logical table instead of a single hard-coded FILE01.
+
+File naming convention (see documentation/nemweb_data_file_catalog.md):
+    PUBLIC_ARCHIVE#<TABLE>#FILE<NN>#<YYYYMM>010000.CSV
+    PUBLIC_ARCHIVE#<TABLE>#FILE<NN>#<YYYYMM>010000.zip   (as downloaded from NEMWEB)
+
+BIDOFFERPERIOD, for example, arrives as FILE01-FILE39 for each month.
+ZIP archives don't need extracting: open_archive() streams the CSV member.
+If a part is present both extracted and zipped, the CSV is used.
+
+Usage:
+    from nem_catalog import find_table_files, summarize_catalog
+
+    parts = find_table_files("BIDOFFERPERIOD")                 # every month
+    parts = find_table_files("BIDOFFERPERIOD", months=["202510"])
+
+    python code/nem_catalog.py    # print what's available under DATA_DIR
+"""
+
+import re
+import sys
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import DATA_DIR
+
+ARCHIVE_PATTERN = re.compile(
+    r"^PUBLIC_ARCHIVE#(?P<table>[A-Z0-9_]+)#FILE(?P<part>\d+)#(?P<stamp>(?P<month>\d{6})\d*)"
+    r"\.(?P<ext>csv|zip)$",
+    re.IGNORECASE,
+)
+
+
+def parse_archive_name(path) -> dict:
+    """Split an archive file name into table/part/month; None if it doesn't match."""
+    match = ARCHIVE_PATTERN.match(Path(path).name)
+    if match is None:
+        return None
+    info = match.groupdict()
+    info["table"] = info["table"].upper()
+    info["part"] = int(info["part"])
+    info["ext"] = info["ext"].lower()
+    info["path"] = Path(path)
+    return info
+
+
+def is_zip(path) -> bool:
+    """True for a zipped archive part."""
+    return Path(path).suffix.lower() == ".zip"
+
+
+def open_archive(path):
+    """
+    Binary stream of an archive part's CSV text.
+
+    For a ZIP the single CSV member is decompressed as it is read, so
+    nothing is extracted to disk.
+    """
+    if not is_zip(path):
+        return open(path, "rb")
+    archive = zipfile.ZipFile(path)
+    members = [m for m in archive.namelist() if m.lower().endswith(".csv")]
+    if len(members) != 1:
+        archive.close()
+        raise ValueError(f"Expected one CSV member in {Path(path).name}, found {members}")
+    # The member stream keeps its own handle on the file, so the
+    # ZipFile object itself can go out of scope
+    return archive.open(members[0])
+
+
+def part_id(path) -> str:
+    """Stable, filesystem-safe identifier for one archive part (e.g. 202510010000_FILE01)."""
+    info = parse_archive_name(path)
+    return f"{info['stamp']}_FILE{info['part']:02d}"
+
+
+def find_table_files(table: str, data_dir=None, months=None) -> list:
+    """
+    All archive parts for a table under data_dir (searched recursively),
+    sorted by month then part number.
+
+    months: optional list of 'YYYYMM' strings to restrict to.
+    """
+    data_dir = Path(data_dir or DATA_DIR)
+    wanted = set(months) if months else None
+    parts = {}
+    for path in data_dir.rglob("PUBLIC_ARCHIVE#*"):
+        info = parse_archive_name(path)
+        if info is None or info["table"] != table:
+            continue
+        if wanted and info["month"] not in wanted:
+            continue
+        key = (info["stamp"], info["part"])
+        # Prefer an already-extracted CSV over its ZIP
+        if key not in parts or parts[key]["ext"] == "zip":
+            parts[key] = info
+    ordered = sorted(parts.values(), key=lambda p: (p["month"], p["part"]))
+    return [p["path"] for p in ordered]
+
+
+def summarize_catalog(data_dir=None) -> dict:
+    """{table: {month: number of parts}} for every archive file under data_dir."""
+    data_dir = Path(data_dir or DATA_DIR)
+    seen = set()
+    summary = {}
+    for path in data_dir.rglob("PUBLIC_ARCHIVE#*"):
+        info = parse_archive_name(path)
+        if info is None or (info["table"], info["stamp"], info["part"]) in seen:
+            continue
+        seen.add((info["table"], info["stamp"], info["part"]))
+        months = summary.setdefault(info["table"], {})
+        months[info["month"]] = months.get(info["month"], 0) + 1
+    return summary
+
+
+if __name__ == "__main__":
+    print(f"Archive files under {DATA_DIR}:")
+    for table, months in sorted(summarize_catalog().items()):
+        for month, count in sorted(months.items()):
+            print(f"  {table:<24} {month}  {count} part(s)")
@@ -0,0 +1,764 @@
+"""
+Persistent DuckDB Analytics Database
+====================================
+Keeps pre-joined analysis tables in a DuckDB file (config.ANALYTICS_DB_PATH)
+so scripts don't redo the BIDOFFERPERIOD x BIDDAYOFFER join for every unit.
+
+Tables:
+    offer_version_range
+        The joined offer table, run-length encoded: consecutive periods of
+        one offer version (DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION,
+        OFFERDATE) with identical MAXAVAIL and BANDAVAIL1..10 are collapsed
+        into a single row covering [PERIODID, PERIODIDTO], together with the
+        version's price bands. SETTLEMENTDATE is the market day
+        (BIDOFFERPERIOD.TRADINGDATE) and OFFERDATE the offer version
+        (BIDOFFERPERIOD.OFFERDATETIME = BIDDAYOFFER.OFFERDATE). Source rows
+        that already span a PERIODID..PERIODIDTO range are merged the same
+        way.
+
+        Per-row offer metrics (joining doc section 5B), stored so analyses
+        read them instead of recomputing them from the bands:
+            OFFER_MW     sum of BANDAVAIL1..10 (missing bands count as 0)
+            OFFER_PRICE  MW-weighted offer price,
+                         sum(PRICEBANDk * BANDAVAILk) / OFFER_MW;
+                         NULL when OFFER_MW is 0
+
+        Stored sorted by (DUID, BIDTYPE, SETTLEMENTDATE, PERIODID, OFFERDATE),
+        so DuckDB's per-row-group min/max statistics let a single-DUID (or
+        DUID + BIDTYPE) query skip almost the whole table.
+
+    offer_version_period (view)
+        offer_version_range expanded to one row per (DUID, BIDTYPE,
+        SETTLEMENTDATE, DIRECTION, PERIODID, OFFERDATE). Nothing is expanded
+        until a query reads the view, and filters on the offer version
+        columns are applied to the range table first. Every other table and
+        script reads per-period offers from here.
+
+    offer_version
+        One row per offer version (DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION,
+        OFFERDATE) with its ENTRYTYPE and price bands.
+
+    offer_delta
+        Delta-encoded quantity bands. For every (DUID, BIDTYPE,
+        SETTLEMENTDATE, DIRECTION, PERIODID) the day's first version (the
+        DAILY bid) is stored in full (IS_INITIAL = true); each later version
+        only contributes a row for the periods where its BANDAVAIL1..10
+        vector differs from the previous version's. The IS_INITIAL = false
+        rows are exactly the per-period true rebids. MAXAVAIL is not
+        delta-encoded; use offer_version_period for it.
+
+        Any version is rebuilt with an ASOF join (latest delta row at or
+        before the version's OFFERDATE); see offer_at_query().
+
+    rebid_band_change
+        One row per true rebid (the IS_INITIAL = false rows of offer_delta)
+        attributing the change to individual bands:
+            PREVIOUS_OFFERDATE   version the rebid replaced
+            CHANGED_BANDS        USMALLINT bitmask, bit i-1 set if band i changed
+            BANDDELTA1..10       MW change per band (new - previous)
+            MW_ADDED/MW_REMOVED  total MW added to / taken from bands
+            MW_MOVED             MW moved between bands (least of the two)
+            PRICE_SHIFT          MW-weighted PRICEBAND of the bands MW went to
+                                 minus that of the bands it left; NULL unless
+                                 MW was both added and removed
+            SHIFT_DIRECTION      sign of PRICE_SHIFT: 1 dearer, -1 cheaper,
+                                 0 none
+        Band 10 is normally at the market price cap, so BANDDELTA10 > 0 is
+        "capacity shifted to the price cap".
+
+    applied_offer
+        One row per dispatch interval x (DUID, BIDTYPE, DIRECTION) in
+        DISPATCHOFFERTRK: the offer version dispatch applied (BIDOFFERDATE)
+        with that version's bands for the interval's period. SETTLEMENTDATE
+        is the dispatch interval (its end time), BIDSETTLEMENTDATE the
+        market day and PERIODID the period within it (see
+        dispatch_period_sql). The bands come from an ASOF join on
+        offer_version_period: the latest version with OFFERDATE <=
+        BIDOFFERDATE, so OFFERDATE = BIDOFFERDATE except where that version
+        is missing from the bid tables; intervals with no version at all
+        keep NULL bands. OFFER_MW / OFFER_PRICE are the applied version's.
+
+    build_info
+        Fingerprint of the cache manifests, upstream tables and builder code
+        each table was built from. A table is rebuilt automatically when the
+        Parquet cache gains or changes parts, when its builder or a SQL
+        helper it uses changes, or when a table it reads is rebuilt.
+
+Usage:
+    from nem_db import read_offer_versions
+
+    df = read_offer_versions(where={"DUID": "HPR1", "BIDTYPE": "RAISEREG"})
+
+    # Bands of every version of one unit/day, rebuilt from the delta store
+    con.execute(offer_at_query(where={"DUID": "HPR1", "SETTLEMENTDATE": "2025-10-01"}))
+
+    # Compact per-version ranges, or per-period rows on demand
+    con.execute("SELECT * FROM offer_version_range WHERE DUID = 'HPR1'")
+    con.execute("SELECT * FROM offer_version_period WHERE DUID = 'HPR1' AND PERIODID = 100")
+
+    # Rebids that moved MW into the top band
+    con.execute("SELECT * FROM rebid_band_change WHERE CHANGED_BANDS & 512 != 0 AND BANDDELTA10 > 0")
+
+    # Bands dispatch actually used, per interval
+    df = read_applied_offers(where={"BIDTYPE": "RAISEREG", "SETTLEMENTDATE": ("2025-10-01 04:05", None)})
+
+    python code/nem_db.py --check-periods    # compare PERIODID offsets -1/0/+1
+
+    python code/nem_db.py            # build / refresh, print sizes, time a sample query
+    python code/nem_db.py --tables applied_offer    # also build applied_offer
+    python code/nem_db.py --rebuild
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import ANALYTICS_DB_PATH
+from nem_cache import ensure_cached, read_manifest, table_source
+from nem_reader import select_sql, table_query, where_sql
+
+BAND_RANGE = range(1, 11)
+
+# Sort order of offer_version_range (and the order offer_version_query returns)
+OFFER_VERSION_PERIOD_ORDER = ["DUID", "BIDTYPE", "SETTLEMENTDATE", "PERIODID", "OFFERDATE"]
+
+# Offer version key in offer_version / offer_delta
+OFFER_VERSION_KEY = ["DUID", "BIDTYPE", "SETTLEMENTDATE", "DIRECTION", "OFFERDATE"]
+
+# Cached tables each analytics table is built from
+TABLE_SOURCES = {
+    "offer_version_range": ["BIDDAYOFFER", "BIDOFFERPERIOD"],
+    "offer_delta": ["BIDDAYOFFER", "BIDOFFERPERIOD"],
+    "rebid_band_change": ["BIDDAYOFFER", "BIDOFFERPERIOD"],
+    "applied_offer": ["BIDDAYOFFER", "BIDOFFERPERIOD", "DISPATCHOFFERTRK"],
+}
+
+# Analytics tables each table reads; a table is rebuilt whenever one of these is
+TABLE_DEPENDENCIES = {
+    "offer_version_range": [],
+    "offer_delta": ["offer_version_range"],
+    "rebid_band_change": ["offer_version_range"],
+    # offer_version is built with offer_delta
+    "applied_offer": ["offer_version_range", "offer_delta"],
+}
+
+# Tables connect() opens by default: everything built from the bid tables
+# alone. applied_offer also needs DISPATCHOFFERTRK and is only built when
+# asked for (connect(tables=["applied_offer"])).
+BID_TABLES = ["offer_version_range", "offer_delta", "rebid_band_change"]
+
+# A market day runs 04:00-04:00 and DISPATCHOFFERTRK.SETTLEMENTDATE is the end
+# of a 5-minute interval: the interval ending 04:05 is PERIODID 1 and the one
+# ending 04:00 the next morning is PERIODID 288 (check_period_convention()).
+MARKET_DAY_START_SECONDS = 4 * 3600
+INTERVAL_SECONDS = 300
+PERIODS_PER_DAY = 288
+
+
+def required_tables(tables) -> list:
+    """The given analytics tables plus everything they are built from, in BUILDERS order."""
+    needed, pending = set(), list(tables)
+    while pending:
+        table = pending.pop()
+        if table not in TABLE_DEPENDENCIES:
+            raise KeyError(f"Unknown analytics table {table!r}; expected one of {list(TABLE_DEPENDENCIES)}")
+        if table not in needed:
+            needed.add(table)
+            pending.extend(TABLE_DEPENDENCIES[table])
+    return [table for table in TABLE_DEPENDENCIES if table in needed]
+
+
+def source_manifests(tables) -> dict:
+    """
+    Refresh the cached sources of the given analytics tables once
+    (ensure_cached) and summarise each manifest: pinned schema and per-part
+    checksums.
+    """
+    manifests = {}
+    for source in sorted({source for table in tables for source in TABLE_SOURCES[table]}):
+        ensure_cached(source, refresh=True)
+        manifest = read_manifest(source)
+        manifests[source] = {
+            "schema": manifest["schema"],
+            "parts": {name: entry["sha256"] for name, entry in manifest["parts"].items()},
+        }
+    return manifests
+
+
+def _built_fingerprints(con) -> dict:
+    """{table: fingerprint} from build_info; empty if nothing was built yet."""
+    has_info = con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'build_info'"
+    ).fetchone()[0]
+    if not has_info:
+        return {}
+    return dict(con.execute("SELECT table_name, fingerprint FROM build_info").fetchall())
+
+
+def _build_fingerprint(con, table: str, manifests: dict) -> str:
+    """
+    Hash of everything a table's contents depend on: the cache manifests
+    (parts, checksums, schema) of its sources, the fingerprints the analytics
+    tables it reads were built with, and the code of its builder and the SQL
+    helpers it uses (so adding a column rebuilds the table).
+    """
+    built = _built_fingerprints(con)
+    payload = json.dumps({
+        "builder": inspect.getsource(BUILDERS[table]),
+        "helpers": [inspect.getsource(helper) for helper in BUILDER_HELPERS.get(table, [])],
+        "sources": {source: manifests[source] for source in TABLE_SOURCES[table]},
+        "upstream": {upstream: built.get(upstream) for upstream in TABLE_DEPENDENCIES[table]},
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def is_table_fresh(con, table: str, manifests: dict) -> bool:
+    """True if the table exists and was built from the current cache contents and upstream tables."""
+    fingerprint = _built_fingerprints(con).get(table)
+    return fingerprint is not None and fingerprint == _build_fingerprint(con, table, manifests)
+
+
+def _record_build(con, table: str, manifests: dict) -> None:
+    """Remember which cache contents and upstream tables a table was built from."""
+    fingerprint = _build_fingerprint(con, table, manifests)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS build_info (
+            table_name VARCHAR PRIMARY KEY, fingerprint VARCHAR, built_at TIMESTAMP
+        )
+    """)
+    con.execute(
+        "INSERT OR REPLACE INTO build_info VALUES (?, ?, now()::TIMESTAMP)",
+        [table, fingerprint],
+    )
+
+
+# =============================================================================
+# TABLE BUILDERS
+# =============================================================================
+
+def offer_metrics_sql(quantity_alias: str, price_alias: str) -> str:
+    """
+    OFFER_MW and OFFER_PRICE select items: sum of the ten bands and the
+    MW-weighted price (a 10-term dot product evaluated column-wise).
+    """
+    offer_mw = " + ".join(f"coalesce({quantity_alias}.BANDAVAIL{i}, 0)" for i in BAND_RANGE)
+    offer_value = " + ".join(
+        f"coalesce({quantity_alias}.BANDAVAIL{i}, 0) * {price_alias}.PRICEBAND{i}" for i in BAND_RANGE
+    )
+    return (f"({offer_mw}) AS OFFER_MW,\n"
+            f"        CASE WHEN ({offer_mw}) > 0 THEN ({offer_value}) / ({offer_mw}) END AS OFFER_PRICE")
+
+
+def build_offer_version_range(con) -> int:
+    """
+    (Re)build the run-length encoded offer_version_range table and the
+    offer_version_period view over it; returns the number of ranges.
+
+    Gaps-and-islands: within each offer version, ordered by PERIODID, a new
+    range starts wherever the row's MAXAVAIL/BANDAVAIL values differ from the
+    previous row's or its PERIODID doesn't follow on from the previous row's
+    PERIODIDTO. The price bands are per version, so they are joined to the
+    ranges afterwards.
+    """
+    print("Building offer_version_range (run-length encoded BIDOFFERPERIOD x BIDDAYOFFER)...")
+    start = time.time()
+
+    price_columns = ['DUID', 'BIDTYPE', 'SETTLEMENTDATE', 'DIRECTION', 'OFFERDATE', 'ENTRYTYPE'] + \
+        [f'PRICEBAND{i}' for i in BAND_RANGE]
+    quantity_columns = {
+        'DUID': 'DUID', 'BIDTYPE': 'BIDTYPE', 'TRADINGDATE': 'SETTLEMENTDATE',
+        'DIRECTION': 'DIRECTION', 'OFFERDATETIME': 'OFFERDATE', 'PERIODID': 'PERIODID',
+        'PERIODIDTO': 'PERIODIDTO', 'MAXAVAIL': 'MAXAVAIL',
+    }
+    quantity_columns.update({f'BANDAVAIL{i}': f'BANDAVAIL{i}' for i in BAND_RANGE})
+    key = ", ".join(OFFER_VERSION_KEY)
+    values = ["MAXAVAIL"] + [f"BANDAVAIL{i}" for i in BAND_RANGE]
+    value_list = ", ".join(values)
+
+    # Databases built before the range storage hold offer_version_period as a table
+    con.execute("DROP VIEW IF EXISTS bidofferperiod_period")
+    con.execute("DROP TABLE IF EXISTS bidofferperiod_range")
+    if con.execute("""
+        SELECT count(*) FROM information_schema.tables
+        WHERE table_name = 'offer_version_period' AND table_type = 'BASE TABLE'
+    """).fetchone()[0]:
+        con.execute("DROP TABLE offer_version_period")
+
+    con.execute(f"""
+    CREATE OR REPLACE TABLE offer_version_range AS
+    WITH price_bands AS (
+        {table_query('BIDDAYOFFER', columns=price_columns)}
+    ),
+    quantity_bands AS (
+        SELECT * REPLACE (coalesce(PERIODIDTO, PERIODID) AS PERIODIDTO), ROW({value_list}) AS vals
+        FROM ({table_query('BIDOFFERPERIOD', columns=quantity_columns)})
+    ),
+    marked AS (
+        SELECT *,
+            CASE WHEN lag(PERIODIDTO) OVER w = PERIODID - 1
+                  AND lag(vals) OVER w IS NOT DISTINCT FROM vals
+                 THEN 0 ELSE 1 END AS starts_range
+        FROM quantity_bands
+        WINDOW w AS (PARTITION BY {key} ORDER BY PERIODID)
+    ),
+    islands AS (
+        SELECT *,
+            sum(starts_range) OVER (PARTITION BY {key} ORDER BY PERIODID
+                                    ROWS UNBOUNDED PRECEDING) AS range_no
+        FROM marked
+    ),
+    ranges AS (
+        SELECT {key},
+            CAST(min(PERIODID) AS INTEGER) AS PERIODID,
+            CAST(max(PERIODIDTO) AS INTEGER) AS PERIODIDTO,
+            {', '.join(f'any_value({c}) AS {c}' for c in values)}
+        FROM islands
+        GROUP BY {key}, range_no
+    )
+    SELECT
+        q.DUID,
+        q.BIDTYPE,
+        q.SETTLEMENTDATE,
+        q.PERIODID,
+        q.PERIODIDTO,
+        q.OFFERDATE,
+        q.DIRECTION,
+        p.ENTRYTYPE,
+        q.MAXAVAIL,
+        {', '.join(f'q.BANDAVAIL{i}' for i in BAND_RANGE)},
+        {', '.join(f'p.PRICEBAND{i}' for i in BAND_RANGE)},
+        {offer_metrics_sql('q', 'p')}
+    FROM ranges q
+    INNER JOIN price_bands p
+        ON q.DUID = p.DUID
+        AND q.BIDTYPE = p.BIDTYPE
+        AND q.SETTLEMENTDATE = p.SETTLEMENTDATE
+        AND q.DIRECTION = p.DIRECTION
+        AND q.OFFERDATE = p.OFFERDATE
+    ORDER BY {', '.join(f'q.{c}' for c in OFFER_VERSION_PERIOD_ORDER)}
+    """)
+
+    con.execute(f"""
+    CREATE OR REPLACE VIEW offer_version_period AS
+    SELECT DUID, BIDTYPE, SETTLEMENTDATE,
+        CAST(unnest(range(PERIODID, PERIODIDTO + 1)) AS INTEGER) AS PERIODID,
+        OFFERDATE, DIRECTION, ENTRYTYPE, MAXAVAIL,
+        {', '.join(f'BANDAVAIL{i}' for i in BAND_RANGE)},
+        {', '.join(f'PRICEBAND{i}' for i in BAND_RANGE)},
+        OFFER_MW, OFFER_PRICE
+    FROM offer_version_range
+    """)
+
+    ranges, periods = con.execute(
+        "SELECT count(*), coalesce(sum(PERIODIDTO - PERIODID + 1), 0) FROM offer_version_range"
+    ).fetchone()
+    print(f"  {periods:,} version-periods -> {ranges:,} ranges "
+          f"({periods / max(ranges, 1):.1f}x fewer rows) in {time.time() - start:.1f}s -> {ANALYTICS_DB_PATH}")
+    return ranges
+
+
+def build_offer_delta(con) -> int:
+    """
+    (Re)build offer_version and the delta-encoded offer_delta table from
+    offer_version_period; returns the number of delta rows.
+    """
+    print("Building offer_delta (initial version + changed periods only)...")
+    start = time.time()
+
+    key = ", ".join(OFFER_VERSION_KEY)
+    period_key = "DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION, PERIODID"
+    bands = ", ".join(f"BANDAVAIL{i}" for i in BAND_RANGE)
+
+    con.execute(f"""
+    CREATE OR REPLACE TABLE offer_version AS
+    SELECT DISTINCT {key}, ENTRYTYPE, {', '.join(f'PRICEBAND{i}' for i in BAND_RANGE)}
+    FROM offer_version_period
+    ORDER BY DUID, BIDTYPE, SETTLEMENTDATE, OFFERDATE
+    """)
+
+    con.execute(f"""
+    CREATE OR REPLACE TABLE offer_delta AS
+    SELECT {period_key}, OFFERDATE, IS_INITIAL, {bands}
+    FROM (
+        SELECT *,
+            row_number() OVER w = 1 AS IS_INITIAL,
+            lag(ROW({bands})) OVER w AS previous_bands
+        FROM offer_version_period
+        WINDOW w AS (PARTITION BY {period_key} ORDER BY OFFERDATE)
+    )
+    WHERE IS_INITIAL OR previous_bands IS DISTINCT FROM ROW({bands})
+    ORDER BY DUID, BIDTYPE, SETTLEMENTDATE, PERIODID, OFFERDATE
+    """)
+
+    deltas, initial = con.execute(
+        "SELECT count(*), count(*) FILTER (WHERE IS_INITIAL) FROM offer_delta"
+    ).fetchone()
+    full = con.execute("SELECT count(*) FROM offer_version_period").fetchone()[0]
+    print(f"  {full:,} version-periods -> {initial:,} initial + {deltas - initial:,} changed "
+          f"({full / max(deltas, 1):.1f}x fewer rows) in {time.time() - start:.1f}s")
+    return deltas
+
+
+def build_rebid_band_change(con) -> int:
+    """
+    (Re)build rebid_band_change from offer_version_period; returns the
+    number of true rebids.
+    """
+    print("Building rebid_band_change (per-band attribution of true rebids)...")
+    start = time.time()
+
+    period_key = "DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION, PERIODID"
+    bands = ", ".join(f"BANDAVAIL{i}" for i in BAND_RANGE)
+    previous = ", ".join(f"lag(BANDAVAIL{i}) OVER w AS PREVIOUS{i}" for i in BAND_RANGE)
+    changed_bits = " + ".join(
+        f"CASE WHEN BANDAVAIL{i} IS DISTINCT FROM PREVIOUS{i} THEN {1 << (i - 1)} ELSE 0 END"
+        for i in BAND_RANGE
+    )
+    deltas = ", ".join(
+        f"(coalesce(BANDAVAIL{i}, 0) - coalesce(PREVIOUS{i}, 0))::FLOAT AS BANDDELTA{i}"
+        for i in BAND_RANGE
+    )
+    added = " + ".join(f"greatest(BANDDELTA{i}, 0)" for i in BAND_RANGE)
+    removed = " + ".join(f"greatest(-BANDDELTA{i}, 0)" for i in BAND_RANGE)
+    added_value = " + ".join(f"greatest(BANDDELTA{i}, 0) * PRICEBAND{i}" for i in BAND_RANGE)
+    removed_value = " + ".join(f"greatest(-BANDDELTA{i}, 0) * PRICEBAND{i}" for i in BAND_RANGE)
+
+    con.execute(f"""
+    CREATE OR REPLACE TABLE rebid_band_change AS
+    WITH changes AS (
+        SELECT {period_key}, OFFERDATE, PREVIOUS_OFFERDATE,
+            ({changed_bits})::USMALLINT AS CHANGED_BANDS,
+            {deltas},
+            {', '.join(f'PRICEBAND{i}' for i in BAND_RANGE)}
+        FROM (
+            SELECT *,
+                lag(OFFERDATE) OVER w AS PREVIOUS_OFFERDATE,
+                lag(ROW({bands})) OVER w AS previous_bands,
+                {previous}
+            FROM offer_version_period
+            WINDOW w AS (PARTITION BY {period_key} ORDER BY OFFERDATE)
+        )
+        WHERE PREVIOUS_OFFERDATE IS NOT NULL AND previous_bands IS DISTINCT FROM ROW({bands})
+    ),
+    moved AS (
+        SELECT *,
+            ({added})::FLOAT AS MW_ADDED,
+            ({removed})::FLOAT AS MW_REMOVED,
+            ({added_value}) AS added_value,
+            ({removed_value}) AS removed_value
+        FROM changes
+    ),
+    shifted AS (
+        SELECT *,
+            least(MW_ADDED, MW_REMOVED) AS MW_MOVED,
+            CASE WHEN MW_ADDED > 0 AND MW_REMOVED > 0
+                 THEN (added_value / MW_ADDED - removed_value / MW_REMOVED)::FLOAT
+            END AS PRICE_SHIFT
+        FROM moved
+    )
+    SELECT {period_key}, OFFERDATE, PREVIOUS_OFFERDATE, CHANGED_BANDS,
+        {', '.join(f'BANDDELTA{i}' for i in BAND_RANGE)},
+        MW_ADDED, MW_REMOVED, MW_MOVED, PRICE_SHIFT,
+        coalesce(sign(PRICE_SHIFT), 0)::TINYINT AS SHIFT_DIRECTION
+    FROM shifted
+    ORDER BY DUID, BIDTYPE, SETTLEMENTDATE, PERIODID, OFFERDATE
+    """)
+
+    rebids = con.execute("SELECT count(*) FROM rebid_band_change").fetchone()[0]
+    print(f"  {rebids:,} true rebids in {time.time() - start:.1f}s")
+    return rebids
+
+
+def dispatch_period_sql(interval="SETTLEMENTDATE", market_day="BIDSETTLEMENTDATE", offset=0) -> str:
+    """
+    SQL expression for the PERIODID of a dispatch interval (interval-ending
+    timestamp) within its market day; offset shifts the convention by whole
+    periods (used by check_period_convention).
+    """
+    return (
+        f"(CAST((epoch({interval}) - epoch({market_day}) - {MARKET_DAY_START_SECONDS + INTERVAL_SECONDS})"
+        f" // {INTERVAL_SECONDS} AS INTEGER) + {1 + offset})"
+    )
+
+
+def build_applied_offer(con) -> int:
+    """
+    (Re)build applied_offer from DISPATCHOFFERTRK and offer_version_period;
+    returns its row count.
+
+    One pass over every tracked interval: each is expanded to the unit's
+    offer directions for the day, given its PERIODID, then ASOF-joined to
+    offer_version_period.
+    """
+    print("Building applied_offer (DISPATCHOFFERTRK x offer_version_period)...")
+    start = time.time()
+
+    con.execute(f"""
+    CREATE OR REPLACE TABLE applied_offer AS
+    WITH tracked AS (
+        SELECT SETTLEMENTDATE, DUID, BIDTYPE, BIDSETTLEMENTDATE, BIDOFFERDATE,
+               {dispatch_period_sql()} AS PERIODID
+        FROM {table_source('DISPATCHOFFERTRK')}
+    ),
+    directions AS (
+        SELECT DISTINCT DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION FROM offer_version
+    ),
+    intervals AS (
+        SELECT t.*, d.DIRECTION
+        FROM tracked t
+        LEFT JOIN directions d
+            ON t.DUID = d.DUID
+            AND t.BIDTYPE = d.BIDTYPE
+            AND t.BIDSETTLEMENTDATE = d.SETTLEMENTDATE
+    )
+    SELECT
+        i.SETTLEMENTDATE,
+        i.DUID,
+        i.BIDTYPE,
+        i.DIRECTION,
+        i.BIDSETTLEMENTDATE,
+        i.PERIODID,
+        i.BIDOFFERDATE,
+        o.OFFERDATE,
+        o.ENTRYTYPE,
+        o.MAXAVAIL,
+        {', '.join(f'o.BANDAVAIL{i}' for i in BAND_RANGE)},
+        {', '.join(f'o.PRICEBAND{i}' for i in BAND_RANGE)},
+        o.OFFER_MW,
+        o.OFFER_PRICE
+    FROM intervals i
+    ASOF LEFT JOIN offer_version_period o
+        ON i.DUID = o.DUID
+        AND i.BIDTYPE = o.BIDTYPE
+        AND i.BIDSETTLEMENTDATE = o.SETTLEMENTDATE
+        AND i.DIRECTION = o.DIRECTION
+        AND i.PERIODID = o.PERIODID
+        AND i.BIDOFFERDATE >= o.OFFERDATE
+    ORDER BY i.DUID, i.BIDTYPE, i.SETTLEMENTDATE, i.DIRECTION
+    """)
+
+    rows, exact, earlier, outside = con.execute(f"""
+        SELECT count(*),
+               count(*) FILTER (WHERE OFFERDATE = BIDOFFERDATE),
+               count(*) FILTER (WHERE OFFERDATE < BIDOFFERDATE),
+               count(*) FILTER (WHERE PERIODID NOT BETWEEN 1 AND {PERIODS_PER_DAY})
+        FROM applied_offer
+    """).fetchone()
+    print(f"  {rows:,} interval offers ({exact:,} exact version, {earlier:,} earlier version, "
+          f"{rows - exact - earlier:,} unmatched) in {time.time() - start:.1f}s")
+    if outside:
+        print(f"  WARNING: {outside:,} intervals map outside PERIODID 1-{PERIODS_PER_DAY}; "
+              f"run `python code/nem_db.py --check-periods`")
+    return rows
+
+
+def check_period_convention(con, offsets=(-1, 0, 1)):
+    """
+    Compare PERIODID conventions (dispatch_period_sql offsets) on DISPATCHOFFERTRK.
+
+    For each offset: the share of tracked intervals whose PERIODID is in
+    1..288 and the share that find their applied version's row for that
+    period in offer_version_period. The right convention scores 100% on both;
+    an off-by-one loses the first or last interval of every day.
+    Returns a DataFrame with one row per offset.
+    """
+    rows = []
+    for offset in offsets:
+        period = dispatch_period_sql("t.SETTLEMENTDATE", "t.BIDSETTLEMENTDATE", offset)
+        rows.append((offset, *con.execute(f"""
+            SELECT count(*),
+                count(*) FILTER (WHERE {period} BETWEEN 1 AND {PERIODS_PER_DAY}),
+                count(*) FILTER (WHERE EXISTS (
+                    SELECT 1 FROM offer_version_period o
+                    WHERE o.DUID = t.DUID AND o.BIDTYPE = t.BIDTYPE
+                      AND o.SETTLEMENTDATE = t.BIDSETTLEMENTDATE
+                      AND o.OFFERDATE = t.BIDOFFERDATE
+                      AND o.PERIODID = {period}))
+            FROM {table_source('DISPATCHOFFERTRK')} t
+        """).fetchone()))
+    df = pd.DataFrame(rows, columns=["OFFSET", "INTERVALS", "IN_RANGE", "MATCHED"])
+    df["IN_RANGE_PCT"] = 100 * df["IN_RANGE"] / df["INTERVALS"].clip(lower=1)
+    df["MATCHED_PCT"] = 100 * df["MATCHED"] / df["INTERVALS"].clip(lower=1)
+    return df
+
+
+BUILDERS = {
+    "offer_version_range": build_offer_version_range,
+    # Built from the offer_version_period view, so must come after it
+    "offer_delta": build_offer_delta,
+    "rebid_band_change": build_rebid_band_change,
+    # Needs offer_version (built with offer_delta)
+    "applied_offer": build_applied_offer,
+}
+
+# Shared SQL helpers whose code is part of a table's build fingerprint
+BUILDER_HELPERS = {
+    "offer_version_range": [table_query, offer_metrics_sql],
+    "applied_offer": [dispatch_period_sql],
+}
+
+
+def table_storage_bytes(con, table: str) -> int:
+    """Approximate on-disk size of a table (distinct storage blocks x block size)."""
+    block_size = con.execute(
+        "SELECT block_size FROM pragma_database_size() WHERE database_name = current_database()"
+    ).fetchone()[0]
+    blocks = con.execute(
+        f"SELECT count(DISTINCT block_id) FROM pragma_storage_info('{table}') WHERE persistent"
+    ).fetchone()[0]
+    return blocks * block_size
+
+
+def connect(read_only=True, rebuild=False, tables=None):
+    """
+    Open the analytics database, building or refreshing stale tables first.
+
+    tables: the analytics tables the caller reads (default BID_TABLES). Only
+    those and the tables they are built from are checked and (re)built, and
+    only their cached sources are refreshed.
+
+    Freshness is checked on a read-only connection, so connecting works while
+    other processes hold the file read-only. A write connection is only taken
+    when a table actually has to be (re)built.
+    """
+    tables = required_tables(BID_TABLES if tables is None else tables)
+    manifests = source_manifests(tables)
+
+    path = str(ANALYTICS_DB_PATH)
+    if not rebuild and ANALYTICS_DB_PATH.exists():
+        con = duckdb.connect(path, read_only=True)
+        if all(is_table_fresh(con, table, manifests) for table in tables):
+            if read_only:
+                return con
+            con.close()
+            return duckdb.connect(path)
+        con.close()
+
+    con = duckdb.connect(path)
+    try:
+        # In BUILDERS order, so a rebuilt table's new fingerprint makes the
+        # tables built from it stale too
+        for table in tables:
+            if rebuild or not is_table_fresh(con, table, manifests):
+                BUILDERS[table](con)
+                _record_build(con, table, manifests)
+    finally:
+        con.close()
+    return duckdb.connect(path, read_only=read_only)
+
+
+def offer_version_query(columns=None, where=None) -> str:
+    """SELECT over offer_version_period (columns/where as for nem_reader.table_query)."""
+    return f"""
+    SELECT {select_sql(columns)}
+    FROM offer_version_period
+    {where_sql(where)}
+    ORDER BY {', '.join(OFFER_VERSION_PERIOD_ORDER)}
+    """
+
+
+def offer_at_query(where=None) -> str:
+    """
+    Rebuild per-period quantity bands for offer versions from offer_delta.
+
+    where filters the versions (any offer_version column, e.g. DUID,
+    SETTLEMENTDATE, OFFERDATE); a PERIODID entry restricts the periods.
+    Returns one row per (version, PERIODID) with that version's BANDAVAIL1..10,
+    i.e. the same bands offer_version_period holds for it.
+    """
+    where = dict(where or {})
+    period_filter = {"IS_INITIAL": True}
+    if "PERIODID" in where:
+        period_filter["PERIODID"] = where.pop("PERIODID")
+    bands = ", ".join(f"d.BANDAVAIL{i}" for i in BAND_RANGE)
+    return f"""
+    WITH versions AS (
+        SELECT * FROM offer_version {where_sql(where)}
+    ),
+    periods AS (
+        SELECT DISTINCT DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION, PERIODID
+        FROM offer_delta
+        {where_sql(period_filter)}
+    )
+    SELECT v.DUID, v.BIDTYPE, v.SETTLEMENTDATE, v.DIRECTION, p.PERIODID, v.OFFERDATE,
+           v.ENTRYTYPE, {bands}
+    FROM versions v
+    JOIN periods p
+        ON p.DUID = v.DUID AND p.BIDTYPE = v.BIDTYPE
+        AND p.SETTLEMENTDATE = v.SETTLEMENTDATE AND p.DIRECTION = v.DIRECTION
+    ASOF JOIN offer_delta d
+        ON d.DUID = v.DUID AND d.BIDTYPE = v.BIDTYPE
+        AND d.SETTLEMENTDATE = v.SETTLEMENTDATE AND d.DIRECTION = v.DIRECTION
+        AND d.PERIODID = p.PERIODID
+        AND d.OFFERDATE <= v.OFFERDATE
+    ORDER BY v.DUID, v.BIDTYPE, v.SETTLEMENTDATE, p.PERIODID, v.OFFERDATE
+    """
+
+
+def read_offer_versions(columns=None, where=None, con=None):
+    """Read offer_version_period rows into a pandas DataFrame, sorted by OFFER_VERSION_PERIOD_ORDER."""
+    own_con = con is None
+    if own_con:
+        con = connect(tables=["offer_version_range"])
+    df = con.execute(offer_version_query(columns=columns, where=where)).fetchdf()
+    if own_con:
+        con.close()
+    return df
+
+
+def read_applied_offers(columns=None, where=None, con=None):
+    """Read applied_offer rows into a pandas DataFrame (columns/where as for read_offer_versions)."""
+    own_con = con is None
+    if own_con:
+        con = connect(tables=["applied_offer"])
+    df = con.execute(f"""
+    SELECT {select_sql(columns)}
+    FROM applied_offer
+    {where_sql(where)}
+    ORDER BY DUID, BIDTYPE, SETTLEMENTDATE, DIRECTION
+    """).fetchdf()
+    if own_con:
+        con.close()
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the persistent DuckDB analytics database.")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild every table")
+    parser.add_argument("--tables", nargs="+", choices=list(BUILDERS), default=BID_TABLES,
+                        help="tables to build (default: %(default)s; applied_offer needs DISPATCHOFFERTRK)")
+    parser.add_argument("--check-periods", action="store_true",
+                        help="compare DISPATCHOFFERTRK PERIODID conventions (offsets -1/0/+1)")
+    args = parser.parse_args()
+
+    if args.check_periods:
+        # Reads DISPATCHOFFERTRK, so refresh it along with applied_offer
+        args.tables = [*args.tables, "applied_offer"]
+    con = connect(rebuild=args.rebuild, tables=args.tables)
+    if args.check_periods:
+        print(check_period_convention(con).to_string(index=False, float_format="%.2f"))
+    for table in required_tables(args.tables):
+        rows = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        print(f"{table}: {rows:,} rows, ~{table_storage_bytes(con, table) / 1024**2:.1f} MB")
+
+    sample = con.execute("SELECT DUID, BIDTYPE FROM offer_version_period LIMIT 1").fetchone()
+    if sample is None:
+        print("offer_version_period is empty")
+        return
+    duid, bidtype = sample
+    start = time.time()
+    n = len(con.execute(offer_version_query(where={"DUID": duid, "BIDTYPE": bidtype})).fetchdf())
+    print(f"Sample query ({duid}, {bidtype}): {n:,} rows in {(time.time() - start) * 1000:.0f} ms")
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
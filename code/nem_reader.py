@@ -0,0 +1,294 @@
+"""
+AEMO Table Reader
+=================
+One place to read the AEMO MMS tables, replacing the per-script
+aemo_csv_query() / read_csv_auto() blocks.
+
+Only the requested columns are materialised, and filters are pushed down to
+the Parquet scan: BIDTYPE and market-day filters prune whole partitions,
+and other filters (e.g. DUID) use Parquet row-group statistics.
+
+Usage:
+    from nem_reader import read_table, table_query
+
+    # Straight to pandas
+    df = read_table(
+        "BIDOFFERPERIOD",
+        columns=["DUID", "TRADINGDATE", "PERIODID", "BANDAVAIL1"],
+        where={"DUID": ["HPR1", "HVWWBA1"], "BIDTYPE": "RAISEREG"},
+    )
+
+    # As SQL, for use inside a larger DuckDB query (joins, CTEs)
+    sql = table_query("BIDDAYOFFER", columns={"OFFERDATE": "OFFERDATE"},
+                      where={"SETTLEMENTDATE": ("2025-10-01", "2025-10-07")})
+
+    # Compact: categoricals, int16 PERIODID, int64 epoch seconds and a
+    # contiguous float32 (N x 10) band matrix instead of ten float64 columns
+    df, bands = read_table_compact(
+        "BIDOFFERPERIOD",
+        columns=["DUID", "BIDTYPE", "TRADINGDATE", "OFFERDATETIME", "PERIODID"],
+        where={"BIDTYPE": FCAS_BIDTYPES},
+        bands="BANDAVAIL",
+        order_by=["DUID", "BIDTYPE", "TRADINGDATE", "PERIODID", "OFFERDATETIME"],
+    )
+
+Filter values:
+    scalar          -> column = value
+    list / set      -> column IN (...)
+    tuple (lo, hi)  -> column BETWEEN lo AND hi (either end may be None)
+
+Memory footprint of the two loaders: documentation/bid_table_memory.md
+"""
+
+import datetime as dt
+import sys
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from nem_cache import CACHED_TABLES, table_source
+from nem_schema import SCHEMAS
+
+# FCAS services (every BIDTYPE except ENERGY)
+FCAS_BIDTYPES = [
+    'RAISE6SEC', 'RAISE60SEC', 'RAISE5MIN', 'RAISE1SEC', 'RAISEREG',
+    'LOWER6SEC', 'LOWER60SEC', 'LOWER5MIN', 'LOWER1SEC', 'LOWERREG'
+]
+
+# Partition column added by the cache (market day as DATE)
+PARTITION_DAY_COLUMN = "MARKETDATE"
+
+# Narrower SQL types used by read_table_compact(), keyed by pinned type.
+# TIMESTAMP becomes int64 seconds since the epoch (naive market time, AEST);
+# VARCHAR stays as-is in SQL and is dictionary-encoded into a categorical.
+# INTEGER columns are PERIODID/PERIODIDTO (1..288), which fit in int16.
+COMPACT_TYPES = {
+    "TIMESTAMP": "BIGINT",
+    "INTEGER": "SMALLINT",
+    "DOUBLE": "FLOAT",
+}
+
+
+def sql_literal(value) -> str:
+    """Render a Python value as a DuckDB SQL literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, dt.datetime) or hasattr(value, "to_pydatetime"):
+        return f"TIMESTAMP '{value}'"
+    if isinstance(value, dt.date):
+        return f"DATE '{value}'"
+    text = str(value).replace("'", "''")
+    return f"'{text}'"
+
+
+def _predicate(column: str, value) -> str:
+    """SQL predicate for one where-clause entry."""
+    col = f'"{column}"'
+    if isinstance(value, tuple):
+        lo, hi = value
+        parts = []
+        if lo is not None:
+            parts.append(f"{col} >= {sql_literal(lo)}")
+        if hi is not None:
+            parts.append(f"{col} <= {sql_literal(hi)}")
+        return " AND ".join(parts) if parts else "TRUE"
+    if isinstance(value, (list, set, frozenset)):
+        values = sorted(value, key=str)
+        if not values:
+            return "FALSE"
+        return f"{col} IN ({', '.join(sql_literal(v) for v in values)})"
+    if value is None:
+        return f"{col} IS NULL"
+    return f"{col} = {sql_literal(value)}"
+
+
+def _partition_predicate(value) -> str:
+    """Translate a market-day filter into a MARKETDATE (partition) filter."""
+    day = f'"{PARTITION_DAY_COLUMN}"'
+    if isinstance(value, tuple):
+        lo, hi = value
+        parts = []
+        if lo is not None:
+            parts.append(f"{day} >= CAST({sql_literal(lo)} AS DATE)")
+        if hi is not None:
+            parts.append(f"{day} <= CAST({sql_literal(hi)} AS DATE)")
+        return " AND ".join(parts) if parts else "TRUE"
+    if isinstance(value, (list, set, frozenset)):
+        values = sorted(value, key=str)
+        if not values:
+            return "FALSE"
+        return f"{day} IN ({', '.join(f'CAST({sql_literal(v)} AS DATE)' for v in values)})"
+    return f"{day} = CAST({sql_literal(value)} AS DATE)"
+
+
+def select_sql(columns) -> str:
+    """SELECT list for a column list / {source: alias} dict; '*' for None."""
+    if columns is None:
+        return "*"
+    if isinstance(columns, dict):
+        return ", ".join(
+            f'"{src}"' if src == alias else f'"{src}" AS "{alias}"'
+            for src, alias in columns.items()
+        )
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def where_sql(where) -> str:
+    """WHERE clause for a {column: value} filter dict; '' if there are no filters."""
+    predicates = [_predicate(column, value) for column, value in (where or {}).items()]
+    return f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+
+def table_query(table: str, columns=None, where=None) -> str:
+    """
+    Build a SELECT over a cached AEMO table.
+
+    columns: list of column names, or dict {source column: output name}.
+             None selects every column.
+    where:   dict {column: value}; see module docstring for value forms.
+    """
+    if table not in CACHED_TABLES:
+        raise KeyError(f"Unknown table {table!r}; expected one of {sorted(CACHED_TABLES)}")
+    day_column = CACHED_TABLES[table]
+
+    select_list = select_sql(columns)
+
+    predicates = []
+    for column, value in (where or {}).items():
+        predicates.append(_predicate(column, value))
+        # Market-day filters also prune whole MARKETDATE partitions
+        if column == day_column:
+            predicates.append(_partition_predicate(value))
+
+    where_clause = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    return f"""
+    SELECT {select_list}
+    FROM {table_source(table)}
+    {where_clause}
+    """
+
+
+def read_table(table: str, columns=None, where=None, con=None):
+    """Read a cached AEMO table into a pandas DataFrame (see table_query)."""
+    own_con = con is None
+    if own_con:
+        con = duckdb.connect()
+    df = con.execute(table_query(table, columns=columns, where=where)).fetchdf()
+    if own_con:
+        con.close()
+    return df
+
+
+def _compact_expression(column: str, sql_type: str) -> str:
+    """SQL that narrows one output column to its compact type."""
+    col = f'"{column}"'
+    if sql_type == "TIMESTAMP":
+        return f"CAST(epoch({col}) AS BIGINT) AS {col}"
+    if sql_type in COMPACT_TYPES:
+        return f"CAST({col} AS {COMPACT_TYPES[sql_type]}) AS {col}"
+    return col
+
+
+def read_table_compact(table: str, columns=None, where=None, con=None,
+                       bands=None, order_by=None, batch_rows=1_000_000,
+                       reduce_bands=None) -> tuple:
+    """
+    Read a cached AEMO table with a small in-memory footprint.
+
+    Returns (df, band_matrix):
+      df           VARCHAR columns as pandas categoricals, PERIODID as int16,
+                   timestamps as int64 epoch seconds, other numbers as float32
+      band_matrix  C-contiguous float32 array of shape (len(df), 10) holding
+                   <bands>1..<bands>10 (e.g. bands="BANDAVAIL" or "PRICEBAND"),
+                   in the same row order as df; None if bands is None
+
+    columns/where are as for read_table(); the band columns are added
+    automatically and are not repeated in df. order_by is a list of output
+    column names; sorting happens in DuckDB, so the band matrix never has to
+    be reordered in Python. Rows are streamed from DuckDB in Arrow batches of
+    batch_rows, so no full-width float64 copy of the table is ever built.
+
+    reduce_bands: optional function mapping an (n, 10) float32 block to a
+    length-n array (e.g. rebids.band_hash). It is applied to each batch as it
+    arrives and its concatenated output is returned in place of the band
+    matrix, so the matrix itself is never held in memory.
+    Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = SCHEMAS[table]
+    if columns is None:
+        columns = {c: c for c in schema}
+    elif not isinstance(columns, dict):
+        columns = {c: c for c in columns}
+    band_columns = [f"{bands}{i}" for i in range(1, 11)] if bands else []
+    columns = {src: alias for src, alias in columns.items() if src not in band_columns}
+    selected = {**columns, **{c: c for c in band_columns}}
+
+    select_list = ", ".join(
+        _compact_expression(alias, schema.get(src, "")) for src, alias in selected.items()
+    )
+    order_clause = ""
+    if order_by:
+        order_clause = "ORDER BY " + ", ".join(f'"{c}"' for c in order_by)
+
+    own_con = con is None
+    if own_con:
+        con = duckdb.connect()
+    source = table_query(table, columns=selected, where=where)
+
+    # Count first (cheap: no columns are decoded) so the band matrix is
+    # allocated once at its final size
+    n_rows = con.execute(f"SELECT count(*) FROM ({source})").fetchone()[0]
+    band_matrix = None
+    if bands and reduce_bands is None:
+        band_matrix = np.empty((n_rows, len(band_columns)), dtype=np.float32)
+
+    reader = con.execute(f"""
+    SELECT {select_list}
+    FROM ({source})
+    {order_clause}
+    """).fetch_record_batch(batch_rows)
+
+    # Bands are copied into the matrix as batches arrive; the remaining
+    # (narrow) columns are kept as Arrow batches until the end
+    filled = 0
+    other_batches = []
+    reduced = []
+    for batch in reader:
+        if bands and reduce_bands is not None:
+            block = np.empty((batch.num_rows, len(band_columns)), dtype=np.float32)
+            for i, name in enumerate(band_columns):
+                block[:, i] = batch.column(name).to_numpy(zero_copy_only=False)
+            reduced.append(reduce_bands(block))
+        elif bands:
+            end = filled + batch.num_rows
+            for i, name in enumerate(band_columns):
+                band_matrix[filled:end, i] = batch.column(name).to_numpy(zero_copy_only=False)
+            filled = end
+        other_batches.append(batch.select(list(columns.values())))
+    if own_con:
+        con.close()
+    if reduced:
+        band_matrix = np.concatenate(reduced)
+    elif bands and reduce_bands is not None:
+        band_matrix = reduce_bands(np.empty((0, len(band_columns)), dtype=np.float32))
+
+    arrow_schema = pa.schema([reader.schema.field(alias) for alias in columns.values()])
+    arrow_table = pa.Table.from_batches(other_batches, schema=arrow_schema)
+    data = {}
+    for alias in columns.values():
+        column = arrow_table.column(alias)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.dictionary_encode(column.combine_chunks())
+        data[alias] = column.to_pandas()
+    return pd.DataFrame(data), band_matrix
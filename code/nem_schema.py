@@ -0,0 +1,340 @@
+"""
+Schema Registry for AEMO MMS Tables
+===================================
+Explicit column types for the MMS tables we ingest, so CSV readers never
+have to sniff types and malformed values are reported instead of being
+silently dropped by ignore_errors=true.
+
+AEMO CSV layout (MMSDM SQLLoader archives):
+    C,...                               <- comment/header row (skipped)
+    I,<REPORT>,<TABLE>,<VERSION>,COL1,COL2,...   <- column names
+    D,<REPORT>,<TABLE>,<VERSION>,val1,val2,...   <- data rows
+    C,"END OF REPORT",<n>               <- trailer (ignored)
+
+Timestamps appear as '%Y/%m/%d %H:%M:%S' and '%Y/%m/%d %H:%M:%S.000'
+(OFFERDATE / OFFERDATETIME carry the millisecond suffix). DuckDB's TIMESTAMP
+parser accepts both, so timestamp columns are declared as TIMESTAMP and read
+without a format string; TIMESTAMP_FORMATS is used by readers (e.g. Arrow)
+that need explicit formats.
+
+Usage:
+    from nem_schema import csv_scan, check_header, report_rejects
+
+    check_header("BIDOFFERPERIOD", path)   # raises if the file's columns drifted
+    con.execute(f"SELECT ... FROM {csv_scan('BIDOFFERPERIOD', path)} WHERE ROW_TYPE = 'D'")
+    report_rejects(con, "BIDOFFERPERIOD")  # prints values that failed to parse
+
+    # Zipped archives: stream record batches with the same types (needs pyarrow)
+    con.register("archive", arrow_scan("BIDOFFERPERIOD", zip_path))
+    con.execute("SELECT ... FROM archive WHERE ROW_TYPE = 'D'")
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from nem_catalog import open_archive
+
+TIMESTAMP_FORMATS = ['%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M:%S.000']
+
+# Leading control columns on every AEMO CSV row
+CONTROL_COLUMNS = {
+    "ROW_TYPE": "VARCHAR",        # C / I / D
+    "REPORT_GROUP": "VARCHAR",    # e.g. BIDS, DISPATCH
+    "REPORT_TABLE": "VARCHAR",    # e.g. BIDDAYOFFER, OFFERTRK
+    "REPORT_VERSION": "VARCHAR",  # table version number
+}
+
+
+def _bands(prefix: str, sql_type: str) -> dict:
+    """PRICEBAND1..10 / BANDAVAIL1..10 column definitions."""
+    return {f"{prefix}{i}": sql_type for i in range(1, 11)}
+
+
+# =============================================================================
+# TABLE SCHEMAS (column order matches the MMSDM archive files)
+# =============================================================================
+
+BIDDAYOFFER_SCHEMA = {
+    "DUID": "VARCHAR",
+    "BIDTYPE": "VARCHAR",
+    "SETTLEMENTDATE": "TIMESTAMP",
+    "OFFERDATE": "TIMESTAMP",
+    "DIRECTION": "VARCHAR",
+    "VERSIONNO": "BIGINT",
+    "PARTICIPANTID": "VARCHAR",
+    "DAILYENERGYCONSTRAINT": "DOUBLE",
+    "REBIDEXPLANATION": "VARCHAR",
+    **_bands("PRICEBAND", "DOUBLE"),
+    "MINIMUMLOAD": "DOUBLE",
+    "T1": "DOUBLE",
+    "T2": "DOUBLE",
+    "T3": "DOUBLE",
+    "T4": "DOUBLE",
+    "NORMALSTATUS": "VARCHAR",
+    "LASTCHANGED": "TIMESTAMP",
+    "MR_FACTOR": "DOUBLE",
+    "ENTRYTYPE": "VARCHAR",
+    "REBID_EVENT_TIME": "VARCHAR",
+    "REBID_AWARE_TIME": "VARCHAR",
+    "REBID_DECISION_TIME": "VARCHAR",
+    "REBID_CATEGORY": "VARCHAR",
+    "REFERENCE_ID": "VARCHAR",
+}
+
+BIDOFFERPERIOD_SCHEMA = {
+    "DUID": "VARCHAR",
+    "BIDTYPE": "VARCHAR",
+    "TRADINGDATE": "TIMESTAMP",
+    "OFFERDATETIME": "TIMESTAMP",
+    "DIRECTION": "VARCHAR",
+    "PERIODID": "INTEGER",
+    "MAXAVAIL": "DOUBLE",
+    "FIXEDLOAD": "DOUBLE",
+    "RAMPUPRATE": "DOUBLE",
+    "RAMPDOWNRATE": "DOUBLE",
+    "ENABLEMENTMIN": "DOUBLE",
+    "ENABLEMENTMAX": "DOUBLE",
+    "LOWBREAKPOINT": "DOUBLE",
+    "HIGHBREAKPOINT": "DOUBLE",
+    **_bands("BANDAVAIL", "DOUBLE"),
+    "PASAAVAILABILITY": "DOUBLE",
+    "ENERGYLIMIT": "DOUBLE",
+    "PERIODIDTO": "INTEGER",
+    "RECALL_PERIOD": "DOUBLE",
+}
+
+DISPATCHOFFERTRK_SCHEMA = {
+    "SETTLEMENTDATE": "TIMESTAMP",
+    "DUID": "VARCHAR",
+    "BIDTYPE": "VARCHAR",
+    "BIDSETTLEMENTDATE": "TIMESTAMP",
+    "BIDOFFERDATE": "TIMESTAMP",
+    "LASTCHANGED": "TIMESTAMP",
+}
+
+# FCAS services as they appear in DISPATCH column names (e.g. RAISEREGRRP)
+FCAS_SERVICES = [
+    "RAISE6SEC", "RAISE60SEC", "RAISE5MIN", "RAISEREG",
+    "LOWER6SEC", "LOWER60SEC", "LOWER5MIN", "LOWERREG",
+    "RAISE1SEC", "LOWER1SEC",
+]
+
+
+def _services(suffix: str, sql_type: str) -> dict:
+    """<SERVICE><suffix> column definitions for every FCAS service (e.g. RAISEREGRRP)."""
+    return {f"{service}{suffix}": sql_type for service in FCAS_SERVICES}
+
+
+# The DISPATCH tables are wide (DISPATCHREGIONSUM has well over 100 columns)
+# and grow a column most data-model releases, so only the columns we use are
+# pinned; see SUBSET_TABLES.
+
+DISPATCHPRICE_SCHEMA = {
+    "SETTLEMENTDATE": "TIMESTAMP",
+    "RUNNO": "BIGINT",
+    "REGIONID": "VARCHAR",
+    "DISPATCHINTERVAL": "BIGINT",
+    "INTERVENTION": "BIGINT",
+    "RRP": "DOUBLE",
+    **_services("RRP", "DOUBLE"),
+    "PRICE_STATUS": "VARCHAR",
+}
+
+DISPATCHREGIONSUM_SCHEMA = {
+    "SETTLEMENTDATE": "TIMESTAMP",
+    "RUNNO": "BIGINT",
+    "REGIONID": "VARCHAR",
+    "DISPATCHINTERVAL": "BIGINT",
+    "INTERVENTION": "BIGINT",
+    "TOTALDEMAND": "DOUBLE",
+    **_services("LOCALDISPATCH", "DOUBLE"),
+}
+
+DISPATCH_FCAS_REQ_SCHEMA = {
+    "SETTLEMENTDATE": "TIMESTAMP",
+    "RUNNO": "BIGINT",
+    "INTERVENTION": "BIGINT",
+    "GENCONID": "VARCHAR",
+    "REGIONID": "VARCHAR",
+    "BIDTYPE": "VARCHAR",
+    "MARGINALVALUE": "DOUBLE",
+}
+
+# Unit registrations. Only the columns we use are pinned; see SUBSET_TABLES.
+DUDETAILSUMMARY_SCHEMA = {
+    "DUID": "VARCHAR",
+    "START_DATE": "TIMESTAMP",
+    "END_DATE": "TIMESTAMP",
+    "DISPATCHTYPE": "VARCHAR",
+    "REGIONID": "VARCHAR",
+    "STATIONID": "VARCHAR",
+    "PARTICIPANTID": "VARCHAR",
+    "LASTCHANGED": "TIMESTAMP",
+}
+
+SCHEMAS = {
+    "BIDDAYOFFER": BIDDAYOFFER_SCHEMA,
+    "BIDOFFERPERIOD": BIDOFFERPERIOD_SCHEMA,
+    "DISPATCHOFFERTRK": DISPATCHOFFERTRK_SCHEMA,
+    "DISPATCHPRICE": DISPATCHPRICE_SCHEMA,
+    "DISPATCHREGIONSUM": DISPATCHREGIONSUM_SCHEMA,
+    "DISPATCH_FCAS_REQ": DISPATCH_FCAS_REQ_SCHEMA,
+    "DUDETAILSUMMARY": DUDETAILSUMMARY_SCHEMA,
+}
+
+# Tables whose schema pins a subset of the file's columns. Their files may
+# carry other columns in any order: those are read as VARCHAR and dropped at
+# ingest, and only a missing pinned column counts as drift.
+SUBSET_TABLES = {"DISPATCHPRICE", "DISPATCHREGIONSUM", "DISPATCH_FCAS_REQ", "DUDETAILSUMMARY"}
+
+
+def schema_fingerprint(table: str) -> str:
+    """Short hash of a table's schema; caches built under another schema are stale."""
+    payload = json.dumps(list(SCHEMAS[table].items()))
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def read_header(path) -> list:
+    """Column names from the file's I row (without the control columns); reads ZIPs too."""
+    with open_archive(path) as f:
+        for line in f:
+            if line.startswith(b"I,"):
+                fields = line.decode().rstrip("\r\n").split(",")
+                return fields[len(CONTROL_COLUMNS):]
+    raise ValueError(f"No 'I' header row found in {path}")
+
+
+def check_header(table: str, path, header=None) -> None:
+    """Raise ValueError if the file's columns don't match the pinned schema."""
+    expected = list(SCHEMAS[table])
+    actual = header if header is not None else read_header(path)
+    missing = [c for c in expected if c not in actual]
+    if actual == expected or (table in SUBSET_TABLES and not missing):
+        return
+    extra = [c for c in actual if c not in expected]
+    raise ValueError(
+        f"{table} schema drift in {Path(path).name}: "
+        f"missing={missing or '-'}, unexpected={extra or '-'}"
+        + ("" if missing or extra else ", columns reordered")
+        + ". Update SCHEMAS in nem_schema.py."
+    )
+
+
+def scan_columns(table: str, path) -> dict:
+    """
+    Every column of an archive part with its type: the pinned schema, or for
+    SUBSET_TABLES the file's own header with unpinned columns as VARCHAR.
+    """
+    schema = SCHEMAS[table]
+    if table not in SUBSET_TABLES:
+        return {**CONTROL_COLUMNS, **schema}
+    return {**CONTROL_COLUMNS, **{name: schema.get(name, "VARCHAR") for name in read_header(path)}}
+
+
+def csv_scan(table: str, path) -> str:
+    """
+    DuckDB read_csv() expression with the table's pinned column types.
+
+    Type detection is disabled, so the scan runs in parallel from the first
+    byte. Values that fail to parse are collected in DuckDB's reject_errors
+    table (see report_rejects) rather than hidden.
+    """
+    columns = scan_columns(table, path)
+    columns_sql = "{" + ", ".join(f"'{name}': '{sql_type}'" for name, sql_type in columns.items()) + "}"
+    return f"""
+    read_csv(
+        '{path}',
+        header=false,
+        skip=2,
+        delim=',',
+        quote='"',
+        auto_detect=false,
+        columns={columns_sql},
+        store_rejects=true
+    )
+    """
+
+
+# DuckDB type -> Arrow type, for arrow_scan(). Timestamps are microsecond
+# so Arrow-read parts land in the cache with the same types as DuckDB-read ones.
+ARROW_TYPES = {
+    "VARCHAR": "string",
+    "TIMESTAMP": "timestamp[us]",
+    "DOUBLE": "float64",
+    "BIGINT": "int64",
+    "INTEGER": "int32",
+}
+
+# Read block size for arrow_scan(); bounds memory per stream
+ARROW_BLOCK_SIZE = 16 * 1024**2
+
+
+def arrow_scan(table: str, path):
+    """
+    Stream an archive part (CSV or ZIP) as Arrow record batches with the table's pinned types.
+
+    The ZIP member is decompressed as it is read and parsed one block at a
+    time, so memory stays bounded regardless of file size. The leading C and
+    I rows are skipped (check the I row first with check_header), and the C
+    trailer row is dropped as a short row. Unlike csv_scan(), a value that
+    fails to parse raises rather than being collected as a reject.
+
+    Returns a pyarrow RecordBatchReader that DuckDB can scan directly.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    columns = scan_columns(table, path)
+
+    def skip_short_rows(row):
+        # Only the 'C,"END OF REPORT",<n>' trailer is expected here
+        if row.text.startswith('C,'):
+            return "skip"
+        return "error"
+
+    return pv.open_csv(
+        open_archive(path),
+        read_options=pv.ReadOptions(
+            column_names=list(columns),
+            skip_rows=2,
+            block_size=ARROW_BLOCK_SIZE,
+        ),
+        parse_options=pv.ParseOptions(invalid_row_handler=skip_short_rows),
+        convert_options=pv.ConvertOptions(
+            column_types={name: pa.type_for_alias(ARROW_TYPES[sql_type])
+                          for name, sql_type in columns.items()},
+            timestamp_parsers=TIMESTAMP_FORMATS,
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def report_rejects(con, table: str) -> int:
+    """
+    Print a summary of values that failed to parse in the last csv_scan().
+
+    The 'C' trailer rows are expected to be rejected (they have fewer
+    columns) and are not reported. Returns the number of rejected D rows.
+    """
+    rejects = con.execute("""
+        SELECT column_name, error_type, count(DISTINCT line) AS n_rows,
+               any_value(csv_line) AS example
+        FROM reject_errors
+        WHERE NOT starts_with(csv_line, 'C,')
+        GROUP BY column_name, error_type
+        ORDER BY n_rows DESC
+    """).fetchdf()
+    if len(rejects) == 0:
+        return 0
+
+    n_rows = con.execute(
+        "SELECT count(DISTINCT line) FROM reject_errors WHERE NOT starts_with(csv_line, 'C,')"
+    ).fetchone()[0]
+    print(f"  WARNING: {n_rows:,} {table} rows did not match the pinned schema and were skipped:")
+    for _, row in rejects.iterrows():
+        print(f"    {row['column_name']} ({row['error_type']}): {row['n_rows']:,} rows, "
+              f"e.g. {row['example'][:120]}")
+    return n_rows
@@ -0,0 +1,348 @@
+"""
+FCAS Supply Stacks
+==================
+Merges every unit's applied offer (applied_offer in nem_db.py: the bands
+dispatch actually used in each 5-minute interval) for one BIDTYPE into a
+merit-order stack per (region, dispatch interval).
+
+How it works:
+    1. All applied (PRICEBAND, BANDAVAIL) steps of the month are flattened
+       into one step list. Each unit's bands are capped at its MAXAVAIL,
+       cheapest band first.
+    2. One np.lexsort orders the steps by (region, interval, price); a
+       cumsum with the group starts subtracted gives cumulative MW within
+       each stack.
+    3. The stacks are stored CSR-style: offsets[g]:offsets[g + 1] are the
+       steps of group g = region_index * n_intervals + interval_index.
+       Queries against every stack at once ("MW available at or below $X",
+       "price at which R MW is reached") are single searchsorted calls
+       (see grouped_searchsorted).
+
+Stacks are cached in OUTPUT_DIR/supply_stacks/ (one .npz per BIDTYPE and
+date range) and rebuilt when applied_offer, the unit regions or this
+module changes.
+
+Units are placed in regions by their latest DUDETAILSUMMARY registration
+(read through the Parquet cache); units without one are left out (and
+counted).
+
+Usage:
+    from supply_stack import load_supply_stacks, mw_below
+
+    stacks = load_supply_stacks("RAISEREG", start="2025-10-01", end="2025-10-31")
+    available = mw_below(stacks, 100.0)   # DataFrame: interval x region, MW offered <= $100/MWh
+
+    # The same stacks without HPR1, re-sorting only HPR1's region
+    without, regions = restack(stacks, ["HPR1"])
+
+    python code/supply_stack.py RAISEREG --below 100 --start 2025-10-01 --end 2025-10-31
+
+Stack arrays (dict of NumPy arrays, as saved in the .npz):
+    bidtype      0-d str
+    regions      (n_regions,) str
+    intervals    (n_intervals,) datetime64[s], dispatch interval end times
+    duids        (n_duids,) str
+    offsets      (n_regions * n_intervals + 1,) int64
+    price, mw, cum_mw   (n_steps,) float64, price-ascending within a stack
+    duid         (n_steps,) int32 index into duids
+    band         (n_steps,) int8 band number 1..10
+"""
+
+import argparse
+import hashlib
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import OUTPUT_DIR
+from nem_db import connect, read_applied_offers
+from nem_reader import FCAS_BIDTYPES, read_table
+
+BAND_RANGE = range(1, 11)
+
+STACK_CACHE_DIR = OUTPUT_DIR / "supply_stacks"
+
+# Arrays making up a stack (see module docstring)
+STACK_ARRAYS = ["bidtype", "regions", "intervals", "duids", "offsets",
+                "price", "mw", "cum_mw", "duid", "band"]
+
+
+def unit_regions() -> pd.Series:
+    """Series DUID -> REGIONID from each unit's latest DUDETAILSUMMARY registration."""
+    registrations = read_table("DUDETAILSUMMARY", ["DUID", "START_DATE", "REGIONID"])
+    latest = registrations.sort_values("START_DATE").drop_duplicates("DUID", keep="last")
+    return latest.set_index("DUID")["REGIONID"].sort_index()
+
+
+def capped_bands(bands: np.ndarray, max_avail: np.ndarray) -> np.ndarray:
+    """
+    Cap each row's bands at its MAXAVAIL, filling the cheapest bands first
+    (NaN bands count as 0, NaN MAXAVAIL leaves the row uncapped).
+    """
+    bands = np.nan_to_num(bands.astype(float), nan=0.0)
+    cap = np.where(np.isnan(max_avail), np.inf, max_avail)[:, None]
+    cumulative = np.minimum(np.cumsum(bands, axis=1), cap)
+    return np.diff(cumulative, axis=1, prepend=0.0).clip(min=0.0)
+
+
+def build_supply_stacks(applied: pd.DataFrame, bidtype: str, regions: pd.Series = None) -> dict:
+    """
+    Build the stacks from applied_offer rows (one BIDTYPE) with SETTLEMENTDATE,
+    DUID, MAXAVAIL, BANDAVAIL1..10 and PRICEBAND1..10.
+    """
+    regions = unit_regions() if regions is None else regions
+    region_of = applied["DUID"].map(regions)
+    unmapped = region_of.isna()
+    if unmapped.any():
+        missing = sorted(applied.loc[unmapped, "DUID"].unique())
+        print(f"  {len(missing)} DUID(s) without a region left out: {', '.join(missing[:10])}"
+              f"{' ...' if len(missing) > 10 else ''}")
+        applied, region_of = applied[~unmapped], region_of[~unmapped]
+
+    region_codes, region_names = pd.factorize(region_of, sort=True)
+    interval_codes, interval_values = pd.factorize(applied["SETTLEMENTDATE"], sort=True)
+    duid_codes, duid_names = pd.factorize(applied["DUID"], sort=True)
+    n_regions, n_intervals = len(region_names), len(interval_values)
+
+    rows, bands, step_price, step_mw = offer_steps(applied)
+    group = region_codes.astype(np.int64) * n_intervals + interval_codes
+    offsets, order, cum_mw = _sort_steps(group[rows], step_price, step_mw, n_regions * n_intervals)
+
+    return {
+        "bidtype": np.array(bidtype),
+        "regions": np.asarray(region_names, dtype=str),
+        "intervals": np.asarray(interval_values, dtype="datetime64[s]"),
+        "duids": np.asarray(duid_names, dtype=str),
+        "offsets": offsets,
+        "price": step_price[order],
+        "mw": step_mw[order],
+        "cum_mw": cum_mw,
+        "duid": duid_codes[rows[order]].astype(np.int32),
+        "band": (bands[order] + 1).astype(np.int8),
+    }
+
+
+def offer_steps(applied: pd.DataFrame) -> tuple:
+    """
+    Flatten applied offers to their offered steps (MW > 0, bands capped at
+    MAXAVAIL): (row, band index 0..9, price, mw) arrays.
+    """
+    mw = capped_bands(applied[[f"BANDAVAIL{i}" for i in BAND_RANGE]].to_numpy(),
+                      applied["MAXAVAIL"].to_numpy(dtype=float))
+    price = applied[[f"PRICEBAND{i}" for i in BAND_RANGE]].to_numpy(dtype=float)
+    rows, bands = np.nonzero((mw > 0) & np.isfinite(price))
+    return rows, bands, price[rows, bands], mw[rows, bands]
+
+
+def _sort_steps(group: np.ndarray, price: np.ndarray, mw: np.ndarray, n_groups: int) -> tuple:
+    """
+    Order steps by (group, price); returns (offsets, order, cumulative MW
+    within each group in that order).
+    """
+    order = np.lexsort((price, group))
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(group, minlength=n_groups))
+    running = np.cumsum(mw[order])
+    start_total = np.concatenate([[0.0], running])[offsets[:-1]]
+    return offsets, order, running - np.repeat(start_total, np.diff(offsets))
+
+
+def restack(stacks: dict, duids, replacement: pd.DataFrame = None, regions: pd.Series = None) -> tuple:
+    """
+    Stacks with the steps of duids removed and, optionally, replacement
+    applied-offer rows (same columns as build_supply_stacks takes, for those
+    DUIDs) stacked in their place.
+
+    Only the regions the DUIDs belong to are re-sorted; every other
+    region's slice is carried over as-is. Returns (stacks, names of the
+    affected regions).
+    """
+    regions = unit_regions() if regions is None else regions
+    n_intervals = len(stacks["intervals"])
+    offsets = stacks["offsets"]
+    affected = sorted(set(regions.reindex(list(duids)).dropna()) & set(stacks["regions"]))
+    dropped = np.isin(stacks["duid"], np.flatnonzero(np.isin(stacks["duids"], list(duids))))
+
+    if replacement is not None and len(replacement):
+        replacement = replacement[replacement["DUID"].map(regions).isin(affected)]
+        rows, bands, new_price, new_mw = offer_steps(replacement)
+        new_region = pd.Index(stacks["regions"]).get_indexer(replacement["DUID"].map(regions))[rows]
+        new_interval = pd.DatetimeIndex(stacks["intervals"]).get_indexer(
+            pd.DatetimeIndex(replacement["SETTLEMENTDATE"]))[rows]
+        new_duid = pd.Index(stacks["duids"]).get_indexer(replacement["DUID"])[rows]
+        known = (new_interval >= 0) & (new_duid >= 0)
+        new = {"region": new_region[known], "interval": new_interval[known], "price": new_price[known],
+               "mw": new_mw[known], "duid": new_duid[known], "band": bands[known] + 1}
+    else:
+        new = None
+
+    step_arrays = ["price", "mw", "cum_mw", "duid", "band"]
+    pieces = {name: [] for name in step_arrays}
+    counts = []
+    for r, region in enumerate(stacks["regions"]):
+        lo, hi = offsets[r * n_intervals], offsets[(r + 1) * n_intervals]
+        if region not in affected:
+            for name in step_arrays:
+                pieces[name].append(stacks[name][lo:hi])
+            counts.append(np.diff(offsets[r * n_intervals:(r + 1) * n_intervals + 1]))
+            continue
+
+        keep = ~dropped[lo:hi]
+        interval = np.repeat(np.arange(n_intervals), np.diff(offsets[r * n_intervals:(r + 1) * n_intervals + 1]))
+        step = {"interval": interval[keep], **{name: stacks[name][lo:hi][keep] for name in ["price", "mw", "duid", "band"]}}
+        if new is not None:
+            mine = new["region"] == r
+            step = {name: np.concatenate([values, new[name][mine].astype(values.dtype)])
+                    for name, values in step.items()}
+        local_offsets, order, cum_mw = _sort_steps(step["interval"], step["price"], step["mw"], n_intervals)
+        for name in ["price", "mw", "duid", "band"]:
+            pieces[name].append(step[name][order])
+        pieces["cum_mw"].append(cum_mw)
+        counts.append(np.diff(local_offsets))
+
+    result = dict(stacks)
+    for name in step_arrays:
+        result[name] = np.concatenate(pieces[name]) if pieces[name] else stacks[name][:0]
+    result["offsets"] = np.concatenate([[0], np.cumsum(np.concatenate(counts))]) if counts else offsets
+    return result, affected
+
+
+def _cache_key(con, bidtype: str, start, end, regions: pd.Series) -> str:
+    """Hash of everything a cached stack depends on."""
+    digest = hashlib.sha1()
+    fingerprint = con.execute(
+        "SELECT fingerprint FROM build_info WHERE table_name = 'applied_offer'"
+    ).fetchone()
+    digest.update(repr((fingerprint, bidtype, str(start), str(end))).encode())
+    digest.update(regions.to_csv().encode())
+    digest.update(Path(__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def stack_cache_path(bidtype: str, start=None, end=None) -> Path:
+    """Cache file for one BIDTYPE and date range."""
+    first = pd.Timestamp(start).strftime("%Y%m%d") if start is not None else "first"
+    last = pd.Timestamp(end).strftime("%Y%m%d") if end is not None else "last"
+    return STACK_CACHE_DIR / f"{bidtype}_{first}_{last}.npz"
+
+
+def load_supply_stacks(bidtype: str, start=None, end=None, con=None, rebuild: bool = False) -> dict:
+    """
+    Stacks for one BIDTYPE over market days start..end (inclusive, None =
+    open), from the cache when it is current, otherwise built and cached.
+    """
+    if bidtype not in FCAS_BIDTYPES:
+        raise ValueError(f"Supply stacks are built for FCAS services; got {bidtype!r}, "
+                         f"expected one of {FCAS_BIDTYPES}")
+    own_con = con is None
+    if own_con:
+        con = connect(tables=["applied_offer"])
+    try:
+        regions = unit_regions()
+        key = _cache_key(con, bidtype, start, end, regions)
+        path = stack_cache_path(bidtype, start, end)
+        if not rebuild and path.exists():
+            with np.load(path) as cached:
+                if str(cached["key"]) == key:
+                    return {name: cached[name] for name in STACK_ARRAYS}
+
+        print(f"Building {bidtype} supply stacks...")
+        begin = time.time()
+        where = {"BIDTYPE": bidtype}
+        if start is not None or end is not None:
+            where["BIDSETTLEMENTDATE"] = (start, end)
+        columns = ["SETTLEMENTDATE", "DUID", "MAXAVAIL"] + \
+            [f"BANDAVAIL{i}" for i in BAND_RANGE] + [f"PRICEBAND{i}" for i in BAND_RANGE]
+        applied = read_applied_offers(columns=columns, where=where, con=con)
+        stacks = build_supply_stacks(applied, bidtype, regions)
+    finally:
+        if own_con:
+            con.close()
+
+    STACK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, key=np.array(key), **stacks)
+    tmp.replace(path)
+    print(f"  {len(applied):,} applied offers -> {len(stacks['price']):,} steps in "
+          f"{len(stacks['offsets']) - 1:,} stacks in {time.time() - begin:.1f}s -> {path}")
+    return stacks
+
+
+def grouped_searchsorted(offsets: np.ndarray, values: np.ndarray, groups: np.ndarray,
+                         queries: np.ndarray, side: str = "left") -> np.ndarray:
+    """
+    np.searchsorted within groups, for many (group, query) pairs at once.
+
+    values must be ascending within each group (offsets as in a stack).
+    Returns, for each pair, the insertion position counted from the start of
+    its group. Values are replaced by their exact ranks, so the combined
+    (group, rank) int64 key is globally sorted and one searchsorted serves
+    every group.
+    """
+    unique = np.unique(values)
+    n_ranks = len(unique) + 1
+    step_groups = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+    keys = step_groups * n_ranks + np.searchsorted(unique, values)
+    groups = np.asarray(groups, dtype=np.int64)
+    query_keys = groups * n_ranks + np.searchsorted(unique, queries, side=side)
+    return np.searchsorted(keys, query_keys, side="left") - offsets[groups]
+
+
+def stack_frame(stacks: dict, values: np.ndarray) -> pd.DataFrame:
+    """Per-stack values (length n_regions * n_intervals) as an interval x region DataFrame."""
+    n_regions, n_intervals = len(stacks["regions"]), len(stacks["intervals"])
+    return pd.DataFrame(
+        np.asarray(values).reshape(n_regions, n_intervals).T,
+        index=pd.DatetimeIndex(stacks["intervals"], name="SETTLEMENTDATE"),
+        columns=pd.Index(stacks["regions"], name="REGIONID"),
+    )
+
+
+def mw_below(stacks: dict, price: float, inclusive: bool = True) -> pd.DataFrame:
+    """MW offered at or below price (strictly below if not inclusive), per interval and region."""
+    offsets = stacks["offsets"]
+    groups = np.arange(len(offsets) - 1)
+    count = grouped_searchsorted(offsets, stacks["price"], groups, np.full(len(groups), price),
+                                 side="right" if inclusive else "left")
+    cum_mw = np.concatenate([[0.0], stacks["cum_mw"]])
+    return stack_frame(stacks, np.where(count > 0, cum_mw[offsets[:-1] + count], 0.0))
+
+
+def stack_steps(stacks: dict, region: str, interval) -> pd.DataFrame:
+    """One stack's steps (price order) as a DataFrame, for inspection and plots."""
+    region_index = int(np.flatnonzero(stacks["regions"] == region)[0])
+    interval_index = int(np.flatnonzero(stacks["intervals"] == np.datetime64(pd.Timestamp(interval), "s"))[0])
+    g = region_index * len(stacks["intervals"]) + interval_index
+    lo, hi = stacks["offsets"][g], stacks["offsets"][g + 1]
+    return pd.DataFrame({
+        "DUID": stacks["duids"][stacks["duid"][lo:hi]],
+        "BAND": stacks["band"][lo:hi],
+        "PRICE": stacks["price"][lo:hi],
+        "MW": stacks["mw"][lo:hi],
+        "CUMULATIVE_MW": stacks["cum_mw"][lo:hi],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build FCAS supply stacks and report MW offered below a price.")
+    parser.add_argument("bidtype", choices=FCAS_BIDTYPES, help="FCAS service, e.g. RAISEREG")
+    parser.add_argument("--below", type=float, default=100.0, help="price threshold in $/MWh (default: 100)")
+    parser.add_argument("--start", help="first market day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last market day (YYYY-MM-DD)")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the cached stacks")
+    args = parser.parse_args()
+
+    stacks = load_supply_stacks(args.bidtype, args.start, args.end, rebuild=args.rebuild)
+    start = time.time()
+    available = mw_below(stacks, args.below)
+    print(f"MW offered at or below ${args.below:,.2f}/MWh for {len(available):,} intervals "
+          f"x {available.shape[1]} region(s) in {time.time() - start:.2f}s:")
+    print(available.describe().T[["mean", "min", "max"]].to_string(float_format="%.1f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from bid_curves import curve_density
+
+MW_EDGES = np.array([0.0, 10, 20, 30, 40])
+PRICE_EDGES = np.array([0.0, 10, 20, 30])
+
+
+def test_curve_density_rising_curve():
+    # 10 MW at $5, 10 MW at $15, 10 MW at $25: steps plus the risers between them
+    counts = curve_density(np.array([[10.0, 10, 10]]), np.array([[5.0, 15, 25]]), MW_EDGES, PRICE_EDGES)
+    assert counts.tolist() == [
+        [1, 1, 0, 0],
+        [0, 1, 1, 0],
+        [0, 0, 1, 1],
+    ]
+
+
+def test_curve_density_sums_curves():
+    quantities = np.array([[10.0, 10, 10], [10.0, 10, 10]])
+    prices = np.array([[5.0, 15, 25], [5.0, 15, 25]])
+    single = curve_density(quantities[:1], prices[:1], MW_EDGES, PRICE_EDGES)
+    assert (curve_density(quantities, prices, MW_EDGES, PRICE_EDGES) == 2 * single).all()
+
+
+def test_curve_density_skips_missing_prices():
+    # The first band has no priced next band, so it covers its end cell itself
+    counts = curve_density(np.array([[10.0, 10, 10]]), np.array([[5.0, np.nan, 25]]), MW_EDGES, PRICE_EDGES)
+    assert counts.tolist() == [
+        [1, 1, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 1, 1],
+    ]
+
+
+def test_curve_density_counts_band_narrower_than_a_cell():
+    # The 2 MW band at $15 starts and ends inside the 10-20 MW cell
+    rising = curve_density(np.array([[10.0, 2, 10]]), np.array([[5.0, 15, 25]]), MW_EDGES, PRICE_EDGES)
+    assert rising.tolist() == [
+        [1, 1, 0, 0],
+        [0, 1, 0, 0],
+        [0, 1, 1, 0],
+    ]
+    # ... also when no riser leaves it
+    unpriced_next = curve_density(np.array([[10.0, 2, 10]]), np.array([[5.0, 15, np.nan]]), MW_EDGES, PRICE_EDGES)
+    assert unpriced_next.tolist() == [
+        [1, 1, 0, 0],
+        [0, 1, 0, 0],
+        [0, 0, 0, 0],
+    ]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from counterfactual import summarize_scenario
+
+INTERVALS = pd.date_range("2025-10-01 04:05", periods=4, freq="5min")
+
+
+def test_summarize_scenario():
+    # 12 MW for 5 minutes is 1 MWh, so costs equal prices. The last interval
+    # has no baseline price (STATUS zero) and is left out altogether.
+    baseline = pd.DataFrame({
+        "SETTLEMENTDATE": INTERVALS,
+        "REGIONID": "SA1",
+        "BIDTYPE": "RAISEREG",
+        "REQUIREMENT_MW": 12.0,
+        "CLEARED_PRICE": [10.0, 20.0, 1000.0, np.nan],
+    })
+    cleared = pd.DataFrame({
+        "SETTLEMENTDATE": INTERVALS,
+        "REGIONID": "SA1",
+        "BIDTYPE": "RAISEREG",
+        "SCENARIO": "no autobidders",
+        "MODE": "remove",
+        "CLEARED_PRICE": [15.0, 20.0, np.nan, np.nan],
+        "STATUS": ["cleared", "cleared", "short", "zero"],
+    })
+
+    summary = summarize_scenario(baseline, cleared)
+
+    assert len(summary) == 1
+    row = summary.iloc[0]
+    assert (row["SCENARIO"], row["MODE"], row["BIDTYPE"], row["REGIONID"]) == \
+        ("no autobidders", "remove", "RAISEREG", "SA1")
+    assert row["intervals"] == 3
+    assert row["short"] == 1
+    # Prices and costs compare the two intervals both sides priced; the
+    # baseline's $1000 interval the scenario can't cover only counts as short
+    assert row["baseline_price"] == pytest.approx(15.0)
+    assert row["scenario_price"] == pytest.approx(17.5)
+    assert row["price_change"] == pytest.approx(2.5)
+    assert row["changed"] == pytest.approx(0.5)
+    assert row["baseline_cost"] == pytest.approx(30.0)
+    assert row["scenario_cost"] == pytest.approx(35.0)
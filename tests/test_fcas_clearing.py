@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from fcas_clearing import clear_stacks
+
+T1 = pd.Timestamp("2025-10-01 04:05")
+
+# SA1: A offers 10 MW at $1 (band 1), then B 10 MW at $5 (band 3); VIC1 has no offers
+STACKS = {
+    "bidtype": np.array("RAISEREG"),
+    "regions": np.array(["SA1", "VIC1"]),
+    "intervals": np.array([T1], dtype="datetime64[s]"),
+    "duids": np.array(["A", "B"]),
+    "offsets": np.array([0, 2, 2]),
+    "price": np.array([1.0, 5.0]),
+    "mw": np.array([10.0, 10.0]),
+    "cum_mw": np.array([10.0, 20.0]),
+    "duid": np.array([0, 1], dtype=np.int32),
+    "band": np.array([1, 3], dtype=np.int8),
+}
+
+
+def test_clear_stacks():
+    requirements = pd.DataFrame({
+        "SETTLEMENTDATE": [T1] * 8,
+        "REGIONID": ["SA1", "SA1", "SA1", "SA1", "SA1", "SA1", "VIC1", "NSW1"],
+        "REQUIREMENT_MW": [5.0, 10.0, 15.0, 25.0, 0.0, np.nan, 5.0, 5.0],
+    })
+
+    result = clear_stacks(STACKS, requirements)
+
+    assert result["STATUS"].tolist() == [
+        "cleared", "cleared", "cleared", "short", "zero", "no requirement", "no offers", "no offers",
+    ]
+    # Exactly 10 MW is covered by the first step
+    assert result["CLEARED_PRICE"].tolist()[:3] == [1.0, 1.0, 5.0]
+    assert result["CLEARED_PRICE"].iloc[3:].isna().all()
+    assert result["MARGINAL_DUID"].tolist()[:4] == ["A", "A", "B", None]
+    assert result["MARGINAL_BAND"].tolist()[:3] == [1, 1, 3]
+    assert result["MARGINAL_BAND"].iloc[3:].isna().all()
+    assert result["OFFERED_MW"].tolist() == [20.0] * 6 + [0.0, 0.0]
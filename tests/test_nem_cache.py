@@ -0,0 +1,45 @@
+import os
+
+import nem_cache
+from nem_catalog import part_id
+
+
+def _write(path, text):
+    path.write_text(text)
+    return path
+
+
+def _entry(path):
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime": stat.st_mtime,
+            "sha256": nem_cache.file_checksum(path)}
+
+
+def test_pending_parts(tmp_path, monkeypatch):
+    unchanged = _write(tmp_path / "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE01#202510010000.CSV", "a,b\n1,2\n")
+    touched = _write(tmp_path / "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE02#202510010000.CSV", "a,b\n3,4\n")
+    edited = _write(tmp_path / "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE03#202510010000.CSV", "a,b\n5,6\n")
+    new = _write(tmp_path / "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE01#202511010000.CSV", "a,b\n7,8\n")
+    manifest = {"schema": "x", "parts": {part_id(p): _entry(p) for p in (unchanged, touched, edited)}}
+
+    # Same contents with a new mtime (e.g. re-synced), and changed contents
+    os.utime(touched, (1_000_000_000, 1_000_000_000))
+    _write(edited, "a,b\n5,67\n")
+
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    monkeypatch.setattr(nem_cache, "find_table_files", lambda table: [unchanged, touched, edited, new])
+    monkeypatch.setattr(nem_cache, "cache_dir", lambda table: cache)
+
+    assert nem_cache.pending_parts("BIDOFFERPERIOD", manifest) == [edited, new]
+    # The re-synced part's new mtime is remembered so it isn't re-hashed next time
+    assert manifest["parts"][part_id(touched)]["mtime"] == 1_000_000_000
+    assert (cache / nem_cache.MANIFEST_FILENAME).exists()
+
+
+def test_pending_parts_without_manifest(tmp_path, monkeypatch):
+    part = _write(tmp_path / "PUBLIC_ARCHIVE#BIDOFFERPERIOD#FILE01#202510010000.CSV", "a,b\n1,2\n")
+    monkeypatch.setattr(nem_cache, "find_table_files", lambda table: [part])
+    monkeypatch.setattr(nem_cache, "cache_dir", lambda table: tmp_path / "missing")
+
+    assert nem_cache.pending_parts("BIDOFFERPERIOD") == [part]
@@ -0,0 +1,28 @@
+import duckdb
+import pytest
+
+from nem_db import PERIODS_PER_DAY, dispatch_period_sql
+
+
+@pytest.mark.parametrize("interval, period", [
+    ("2025-10-01 04:05:00", 1),                 # first interval of the market day
+    ("2025-10-01 12:00:00", 96),
+    ("2025-10-02 00:00:00", 240),               # midnight still belongs to 1 October
+    ("2025-10-02 04:00:00", PERIODS_PER_DAY),   # last interval ends 04:00 next morning
+])
+def test_dispatch_period_sql(interval, period):
+    con = duckdb.connect()
+    got = con.execute(f"""
+        SELECT {dispatch_period_sql('i', 'd')}
+        FROM (SELECT TIMESTAMP '{interval}' AS i, TIMESTAMP '2025-10-01' AS d)
+    """).fetchone()[0]
+    assert got == period
+
+
+def test_dispatch_period_sql_offset():
+    con = duckdb.connect()
+    got = con.execute(f"""
+        SELECT {dispatch_period_sql('i', 'd', offset=-1)}
+        FROM (SELECT TIMESTAMP '2025-10-01 04:05:00' AS i, TIMESTAMP '2025-10-01' AS d)
+    """).fetchone()[0]
+    assert got == 0
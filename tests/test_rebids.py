@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from rebids import band_hash, flag_true_rebids
+
+
+def test_band_hash_equal_rows():
+    bands = np.array([
+        [0.0, 10.0, 5.0, 0, 0, 0, 0, 0, 0, 0],
+        [-0.0, 10.0, 5.0, 0, 0, 0, 0, 0, 0, 0],     # -0.0 is the same offer as 0.0
+        [0.0, 10.0, 5.0, 0, 0, 0, 0, 0, 0, 1],
+        [np.nan, 10.0, 5.0, 0, 0, 0, 0, 0, 0, 0],
+        [np.nan, 10.0, 5.0, 0, 0, 0, 0, 0, 0, 0],
+        [0.0, 5.0, 10.0, 0, 0, 0, 0, 0, 0, 0],      # same values in other bands
+    ])
+    h = band_hash(bands)
+    assert h.dtype == np.uint64
+    assert h[0] == h[1]
+    assert h[3] == h[4]
+    assert len({h[0], h[2], h[3], h[5]}) == 4
+
+
+def test_band_hash_matches_float32_input():
+    bands = np.arange(30, dtype=float).reshape(3, 10) / 3
+    assert (band_hash(bands) == band_hash(bands.astype(np.float32))).all()
+
+
+def test_flag_true_rebids():
+    # Two auctions (GEN and LOAD of one period), rows sorted by key then OFFERDATE
+    df = pd.DataFrame({
+        "DUID": ["U1"] * 6,
+        "DIRECTION": ["GEN", "GEN", "GEN", "LOAD", "LOAD", "LOAD"],
+        "PERIODID": [1] * 6,
+        "BANDAVAIL1": [5, 5, 7, 7, 7, 5],
+    })
+    bands = np.zeros((len(df), 10))
+    bands[:, 0] = df["BANDAVAIL1"]
+
+    mask, starts = flag_true_rebids([df[c] for c in ["DUID", "DIRECTION", "PERIODID"]], band_hash(bands))
+
+    assert starts.tolist() == [True, False, False, True, False, False]
+    # The LOAD auction's first row differs from the GEN row above it but is
+    # its auction's initial offer, not a rebid
+    assert mask.tolist() == [False, False, True, False, False, True]
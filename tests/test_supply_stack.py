@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from supply_stack import build_supply_stacks, grouped_searchsorted, restack
+
+T1, T2 = pd.Timestamp("2025-10-01 04:05"), pd.Timestamp("2025-10-01 04:10")
+REGIONS = pd.Series({"A": "SA1", "B": "SA1", "C": "VIC1"})
+
+# A offers 10 MW at $1 and 15 MW at $5 but MAXAVAIL caps it at 20 MW in the
+# first interval and 0 MW in the second; B has no MAXAVAIL
+APPLIED = pd.DataFrame({
+    "SETTLEMENTDATE": [T1, T1, T1, T2, T2, T2],
+    "DUID": ["A", "B", "C", "A", "B", "C"],
+    "MAXAVAIL": [20.0, np.nan, 100.0, 0.0, np.nan, 100.0],
+    "BANDAVAIL1": [10.0, 5.0, 8.0, 10.0, 5.0, 8.0],
+    "BANDAVAIL2": [15.0, 0.0, 0.0, 15.0, 0.0, 0.0],
+    **{f"BANDAVAIL{i}": [0.0] * 6 for i in range(3, 11)},
+    "PRICEBAND1": [1.0, 3.0, 2.0, 1.0, 3.0, 2.0],
+    "PRICEBAND2": [5.0, 9.0, 9.0, 5.0, 9.0, 9.0],
+    **{f"PRICEBAND{i}": [100.0 * i] * 6 for i in range(3, 11)},
+})
+
+
+def test_build_supply_stacks():
+    stacks = build_supply_stacks(APPLIED, "RAISEREG", regions=REGIONS)
+
+    assert stacks["regions"].tolist() == ["SA1", "VIC1"]
+    assert stacks["duids"].tolist() == ["A", "B", "C"]
+    # Stacks are region-major: SA1 T1, SA1 T2, VIC1 T1, VIC1 T2
+    assert stacks["offsets"].tolist() == [0, 3, 4, 5, 6]
+    assert stacks["price"].tolist() == [1, 3, 5, 3, 2, 2]
+    assert stacks["mw"].tolist() == [10, 5, 10, 5, 8, 8]
+    assert stacks["cum_mw"].tolist() == [10, 15, 25, 5, 8, 8]
+    assert stacks["duid"].tolist() == [0, 1, 0, 1, 2, 2]
+    assert stacks["band"].tolist() == [1, 1, 2, 1, 1, 1]
+
+
+def test_grouped_searchsorted():
+    # Group 1 is empty
+    offsets = np.array([0, 3, 3, 5])
+    values = np.array([1.0, 2.0, 2.0, 5.0, 7.0])
+    groups = np.array([0, 0, 0, 0, 1, 2, 2, 2])
+    queries = np.array([2.0, 0.0, 9.0, 1.5, 4.0, 6.0, 7.0, 1.0])
+
+    for side in ("left", "right"):
+        expected = [np.searchsorted(values[offsets[g]:offsets[g + 1]], q, side=side)
+                    for g, q in zip(groups, queries)]
+        assert grouped_searchsorted(offsets, values, groups, queries, side).tolist() == expected
+    assert grouped_searchsorted(offsets, values, groups[:1], queries[:1], "right").tolist() == [3]
+
+
+def test_restack_remove():
+    stacks = build_supply_stacks(APPLIED, "RAISEREG", regions=REGIONS)
+    removed, affected = restack(stacks, ["A"], regions=REGIONS)
+
+    assert affected == ["SA1"]
+    assert removed["offsets"].tolist() == [0, 1, 2, 3, 4]
+    assert removed["price"].tolist() == [3, 3, 2, 2]
+    assert removed["cum_mw"].tolist() == [5, 5, 8, 8]
+    assert removed["duid"].tolist() == [1, 1, 2, 2]
+
+
+def test_restack_replace_matches_rebuild():
+    # A's first-interval offer replaced by 4 MW at $0.50
+    replacement = APPLIED[APPLIED["DUID"] == "A"].head(1).assign(
+        BANDAVAIL1=4.0, BANDAVAIL2=0.0, PRICEBAND1=0.5)
+    stacks = build_supply_stacks(APPLIED, "RAISEREG", regions=REGIONS)
+    replaced, affected = restack(stacks, ["A"], replacement, regions=REGIONS)
+
+    rebuilt = build_supply_stacks(
+        pd.concat([APPLIED[APPLIED["DUID"] != "A"], replacement]), "RAISEREG", regions=REGIONS)
+    assert affected == ["SA1"]
+    assert replaced["price"].tolist() == [0.5, 3, 3, 2, 2]
+    for name in ["offsets", "price", "mw", "cum_mw", "band"]:
+        assert replaced[name].tolist() == rebuilt[name].tolist(), name
+    # DUID codes refer to the original stacks' duids
+    assert replaced["duids"][replaced["duid"]].tolist() == rebuilt["duids"][rebuilt["duid"]].tolist()